@@ -0,0 +1,229 @@
+"""
+Generate synthetic tools for the benchmarks.
+
+The size and shape of the tools is controlled by
+
+- params: the number of (leaf) parameters
+- depth: the nesting depth of the parameters, the nested containers
+  alternate between Section, Conditional (the params go into a When) and
+  Repeat
+- options: the number of options of select parameters
+- tests: the number of tests
+
+make_spec gives the specification (see galaxyxml.tool.spec) of the same
+tool.
+"""
+import galaxyxml.tool as gxt
+import galaxyxml.tool.parameters as gxtp
+
+CONTAINERS = ("section", "conditional", "repeat")
+
+
+def make_param(i, options):
+    """
+    Create the i-th leaf parameter, cycling through the parameter types.
+    """
+    name = "param_%d" % i
+    kind = i % 6
+    if kind == 0:
+        return gxtp.IntegerParam(name, value=i, num_dashes=2, label="Integer %d" % i)
+    elif kind == 1:
+        return gxtp.FloatParam(name, value=i / 2, num_dashes=2, label="Float %d" % i)
+    elif kind == 2:
+        return gxtp.TextParam(name, value="text", num_dashes=2, label="Text %d" % i)
+    elif kind == 3:
+        return gxtp.BooleanParam(
+            name, truevalue="--%s" % name, falsevalue="", label="Boolean %d" % i
+        )
+    elif kind == 4:
+        return gxtp.SelectParam(
+            name,
+            options={"option_%d" % j: "Option %d" % j for j in range(options)},
+            default="option_0" if options else None,
+            num_dashes=2,
+            label="Select %d" % i,
+        )
+    else:
+        return gxtp.DataParam(name, format="txt", num_dashes=2, label="Data %d" % i)
+
+
+def make_container(level):
+    """
+    Create the container at the given nesting level (1 based).
+
+    Returns the container and the node the parameters go into.
+    """
+    kind = CONTAINERS[(level - 1) % len(CONTAINERS)]
+    name = "%s_%d" % (kind, level)
+    if kind == "section":
+        container = gxtp.Section(name, "Section %d" % level)
+        return container, container
+    elif kind == "repeat":
+        container = gxtp.Repeat(name, "Repeat %d" % level)
+        return container, container
+    container = gxtp.Conditional(name)
+    container.append(
+        gxtp.SelectParam("select_%d" % level, options={"yes": "Yes", "no": "No"})
+    )
+    when = gxtp.When("yes")
+    container.append(when)
+    container.append(gxtp.When("no"))
+    return container, when
+
+
+def make_tool(params=50, depth=2, options=10, tests=5, cls=gxt.Tool):
+    """
+    Create a synthetic tool.
+
+    The params are distributed evenly over the nesting levels 0 (top level
+    inputs) to depth.
+    """
+    tool = cls(
+        "Synthetic tool",
+        "synthetic",
+        "1.0",
+        "Synthetic tool for benchmarking",
+        "synthetic.py",
+        version_command="synthetic.py --version",
+    )
+    if cls is gxt.Tool:
+        tool.requirements = gxtp.Requirements()
+        tool.requirements.append(gxtp.Requirement("package", "synthetic", "1.0"))
+
+    targets = [tool.inputs]
+    for level in range(1, depth + 1):
+        container, target = make_container(level)
+        targets[-1].append(container)
+        targets.append(target)
+    for i in range(params):
+        targets[i * len(targets) // max(params, 1)].append(make_param(i, options))
+
+    tool.outputs.append(gxtp.OutputData("output", format="txt", num_dashes=2))
+
+    if cls is gxt.Tool:
+        tool.tests = gxtp.Tests()
+        for i in range(tests):
+            test = gxtp.Test()
+            test.append(gxtp.TestParam("param_0", value=i))
+            test.append(gxtp.TestOutput(name="output", file="output_%d.txt" % i))
+            tool.tests.append(test)
+        tool.help = "Synthetic tool with %d params." % params
+    return tool
+
+
+def make_param_spec(i, options):
+    """
+    Get the spec of the i-th leaf parameter (see make_param).
+    """
+    name = "param_%d" % i
+    kind = i % 6
+    if kind == 0:
+        return {
+            "type": "integer",
+            "name": name,
+            "value": i,
+            "num_dashes": 2,
+            "label": "Integer %d" % i,
+        }
+    elif kind == 1:
+        return {
+            "type": "float",
+            "name": name,
+            "value": i / 2,
+            "num_dashes": 2,
+            "label": "Float %d" % i,
+        }
+    elif kind == 2:
+        return {
+            "type": "text",
+            "name": name,
+            "value": "text",
+            "num_dashes": 2,
+            "label": "Text %d" % i,
+        }
+    elif kind == 3:
+        return {
+            "type": "boolean",
+            "name": name,
+            "truevalue": "--%s" % name,
+            "falsevalue": "",
+            "label": "Boolean %d" % i,
+        }
+    elif kind == 4:
+        return {
+            "type": "select",
+            "name": name,
+            "options": {"option_%d" % j: "Option %d" % j for j in range(options)},
+            "default": "option_0" if options else None,
+            "num_dashes": 2,
+            "label": "Select %d" % i,
+        }
+    return {
+        "type": "data",
+        "name": name,
+        "format": "txt",
+        "num_dashes": 2,
+        "label": "Data %d" % i,
+    }
+
+
+def make_container_spec(level):
+    """
+    Get the spec of the container at the given nesting level (see
+    make_container) and the list the parameters go into.
+    """
+    kind = CONTAINERS[(level - 1) % len(CONTAINERS)]
+    name = "%s_%d" % (kind, level)
+    if kind in ("section", "repeat"):
+        container = {
+            "type": kind,
+            "name": name,
+            "title": "%s %d" % (kind.capitalize(), level),
+            "inputs": [],
+        }
+        return container, container["inputs"]
+    when = {"value": "yes", "inputs": []}
+    container = {
+        "type": "conditional",
+        "name": name,
+        "param": {
+            "type": "select",
+            "name": "select_%d" % level,
+            "options": {"yes": "Yes", "no": "No"},
+        },
+        "whens": [when, {"value": "no"}],
+    }
+    return container, when["inputs"]
+
+
+def make_spec(params=50, depth=2, options=10, tests=5):
+    """
+    Get the spec of the synthetic tool created by make_tool.
+    """
+    spec = {
+        "name": "Synthetic tool",
+        "id": "synthetic",
+        "version": "1.0",
+        "description": "Synthetic tool for benchmarking",
+        "executable": "synthetic.py",
+        "version_command": "synthetic.py --version",
+        "requirements": [{"type": "package", "value": "synthetic", "version": "1.0"}],
+        "inputs": [],
+        "outputs": [{"name": "output", "format": "txt", "num_dashes": 2}],
+        "tests": [
+            {
+                "params": [{"name": "param_0", "value": i}],
+                "outputs": [{"name": "output", "file": "output_%d.txt" % i}],
+            }
+            for i in range(tests)
+        ],
+        "help": "Synthetic tool with %d params." % params,
+    }
+    targets = [spec["inputs"]]
+    for level in range(1, depth + 1):
+        container, target = make_container_spec(level)
+        targets[-1].append(container)
+        targets.append(target)
+    for i in range(params):
+        targets[i * len(targets) // max(params, 1)].append(make_param_spec(i, options))
+    return spec
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""
+Measure the memory used by parameters.
+
+Reports the memory allocated by Python objects (traced with tracemalloc)
+and the growth of the resident set size, which also includes the memory
+allocated by libxml2 for lxml elements (Linux only).
+
+The attributes of a parameter are kept in a Python dict until its lxml
+element is created, e.g. with Python 3.11 an IntegerParam takes about 480
+Python bytes and 500 resident bytes (test_memory in
+test/unit_test_parameters.py guards the Python bytes).
+
+usage: python benchmarks/param_memory.py [NUMBER_OF_PARAMS]
+"""
+import gc
+import sys
+import tracemalloc
+
+import galaxyxml.tool.parameters as gxtp
+
+
+def build_inputs(n):
+    inputs = gxtp.Inputs()
+    for i in range(n):
+        inputs.append(
+            gxtp.IntegerParam(
+                "param_%d" % i, value=i, num_dashes=2, label="label", help="help"
+            )
+        )
+    return inputs
+
+
+def rss():
+    with open("/proc/self/statm") as fh:
+        return int(fh.read().split()[1]) * 4096
+
+
+def bytes_per_param(n):
+    """
+    Get the number of Python bytes and resident bytes per param.
+    """
+    build_inputs(10)
+    gc.collect()
+    rss_before = rss()
+    inputs = build_inputs(n)
+    gc.collect()
+    rss_after = rss()
+    del inputs
+    gc.collect()
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    inputs = build_inputs(n)  # noqa: F841
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    traced = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return traced / n, (rss_after - rss_before) / n
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    traced, resident = bytes_per_param(n)
+    print("%d params: %.1f Python bytes per param" % (n, traced))
+    print("%d params: %.1f resident bytes per param" % (n, resident))
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+"""
+Benchmark building, rendering, exporting and importing tools.
+
+For each benchmark the best time per call (of several repeats) and the
+peak of the memory allocated by Python during one call (traced with
+tracemalloc) are measured on synthetic tools (see generate.py).
+
+Results can be stored as a baseline and compared against a baseline:
+
+    python benchmarks/run.py --save benchmarks/baselines/reference.json
+    python benchmarks/run.py --compare benchmarks/baselines/reference.json
+
+When comparing, a report is printed and the exit status is 1 if any
+benchmark got slower (or uses more memory) than the baseline by more than
+the threshold.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import timeit
+import tracemalloc
+
+from generate import make_spec, make_tool
+from lxml import etree
+
+import galaxyxml.tool as gxt
+from galaxyxml.tool.import_xml import GalaxyXmlParser
+from galaxyxml.tool.spec import compile_spec
+
+# tool shapes the benchmarks are run for
+SCENARIOS = {
+    "small": {"params": 10, "depth": 1, "options": 5, "tests": 2},
+    "medium": {"params": 100, "depth": 3, "options": 20, "tests": 10},
+    "large": {"params": 1000, "depth": 6, "options": 100, "tests": 50},
+}
+
+
+def benchmarks(scenario, tmpdir):
+    """
+    Get the benchmarks for a scenario as (name, setup, function) tuples,
+    setup() prepares the argument of function() outside of the measurement.
+    """
+    shape = SCENARIOS[scenario]
+    path = os.path.join(tmpdir, "%s.xml" % scenario)
+    with open(path, "w") as fh:
+        fh.write(make_tool(**shape).export())
+
+    def fresh_tool():
+        return make_tool(**shape)
+
+    def fresh_macros_tool():
+        return make_tool(cls=gxt.MacrosTool, **shape)
+
+    builder = compile_spec(make_spec(**shape))
+
+    return [
+        ("Tool()", lambda: None, lambda _: make_tool(**shape)),
+        ("ToolBuilder.build()", lambda: None, lambda _: builder.build()),
+        ("Inputs.cli()", fresh_tool, lambda tool: tool.inputs.cli()),
+        ("Tool.export()", fresh_tool, lambda tool: tool.export()),
+        ("MacrosTool.export()", fresh_macros_tool, lambda tool: tool.export()),
+        (
+            "GalaxyXmlParser.import_xml()",
+            lambda: None,
+            lambda _: GalaxyXmlParser().import_xml(path),
+        ),
+        (
+            "GalaxyXmlParser.import_xml(stream=True)",
+            lambda: None,
+            lambda _: GalaxyXmlParser().import_xml(path, stream=True),
+        ),
+        (
+            "GalaxyXmlParser.import_xml(adopt=True)",
+            lambda: None,
+            lambda _: GalaxyXmlParser().import_xml(path, adopt=True),
+        ),
+        (
+            "GalaxyXmlParser.import_xml(lazy=True)",
+            lambda: None,
+            lambda _: GalaxyXmlParser().import_xml(path, lazy=True),
+        ),
+    ]
+
+
+def measure(setup, function, repeat):
+    """
+    Get the best time of a call of function and the peak of the memory
+    allocated during a call.
+
+    The argument is prepared by setup() freshly for every call, so that
+    caches do not carry over between calls.
+    """
+    times = []
+    for _ in range(repeat):
+        arg = setup()
+        start = timeit.default_timer()
+        function(arg)
+        times.append(timeit.default_timer() - start)
+    arg = setup()
+    tracemalloc.start()
+    function(arg)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times), peak
+
+
+def run(scenarios, repeat):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for scenario in scenarios:
+            for name, setup, function in benchmarks(scenario, tmpdir):
+                time, memory = measure(setup, function, repeat)
+                results["%s %s" % (scenario, name)] = {"time": time, "memory": memory}
+    return results
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "lxml": ".".join(str(v) for v in etree.LXML_VERSION),
+        "machine": platform.machine(),
+    }
+
+
+def format_time(seconds):
+    for unit, factor in (("s", 1), ("ms", 1e3), ("us", 1e6)):
+        if seconds * factor >= 1:
+            return "%.2f%s" % (seconds * factor, unit)
+    return "%.2fns" % (seconds * 1e9)
+
+
+def format_memory(size):
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return "%.1f%s" % (size, unit)
+        size /= 1024
+    return "%.1fGiB" % size
+
+
+def report(results, baseline=None, threshold=0.1):
+    """
+    Print the results (compared to the baseline).
+
+    Returns the names of the benchmarks that regressed by more than the
+    threshold (a fraction of the baseline).
+    """
+    regressions = []
+    width = max(len(name) for name in results)
+    if baseline is None:
+        print("%-*s %12s %12s" % (width, "benchmark", "time", "memory"))
+        for name, result in results.items():
+            print(
+                "%-*s %12s %12s"
+                % (
+                    width,
+                    name,
+                    format_time(result["time"]),
+                    format_memory(result["memory"]),
+                )
+            )
+        return regressions
+
+    print(
+        "%-*s %12s %12s %7s %12s %12s %7s"
+        % (
+            width,
+            "benchmark",
+            "time",
+            "baseline",
+            "ratio",
+            "memory",
+            "baseline",
+            "ratio",
+        )
+    )
+    for name, result in results.items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(
+                "%-*s %12s (no baseline)" % (width, name, format_time(result["time"]))
+            )
+            continue
+        time_ratio = result["time"] / base["time"]
+        memory_ratio = result["memory"] / max(base["memory"], 1)
+        regressed = max(time_ratio, memory_ratio) > 1 + threshold
+        if regressed:
+            regressions.append(name)
+        print(
+            "%-*s %12s %12s %6.2fx %12s %12s %6.2fx%s"
+            % (
+                width,
+                name,
+                format_time(result["time"]),
+                format_time(base["time"]),
+                time_ratio,
+                format_memory(result["memory"]),
+                format_memory(base["memory"]),
+                memory_ratio,
+                "  REGRESSION" if regressed else "",
+            )
+        )
+    if baseline.get("environment") != environment():
+        print(
+            "\nwarning: the baseline was measured in a different environment %s"
+            % baseline.get("environment")
+        )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=sorted(SCENARIOS),
+        help="scenario to run, can be given multiple times (default: all)",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="number of timed calls (default: 5)"
+    )
+    parser.add_argument("--save", metavar="JSON", help="store the results as baseline")
+    parser.add_argument("--compare", metavar="JSON", help="compare to the baseline")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="fraction by which a benchmark may exceed the baseline (default: 0.1)",
+    )
+    args = parser.parse_args(argv)
+    # the importer logs every tag it does not process
+    logging.getLogger("galaxyxml").setLevel(logging.ERROR)
+
+    scenarios = args.scenario or list(SCENARIOS)
+    results = run(scenarios, args.repeat)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+    regressions = report(results, baseline, args.threshold)
+
+    if args.save:
+        with open(args.save, "w") as fh:
+            json.dump(
+                {"environment": environment(), "results": results},
+                fh,
+                indent=2,
+                sort_keys=True,
+            )
+            fh.write("\n")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
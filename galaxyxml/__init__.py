@@ -2,13 +2,42 @@ from builtins import object, str
 
 from lxml import etree
 
+__version__ = "0.5.5"
+
+# parser for restoring pickled elements, CDATA sections are kept
+PICKLE_PARSER = etree.XMLParser(strip_cdata=False, huge_tree=True)
+
 
 class GalaxyXML(object):
     def __init__(self):
         self.root = etree.Element("root")
 
-    def export(self):
-        return etree.tostring(self.root, pretty_print=True, encoding="unicode")
+    def __getstate__(self):
+        # lxml elements can not be pickled, the root is pickled as XML
+        state = dict(vars(self))
+        state["root"] = etree.tostring(self.root)
+        return state
+
+    def __setstate__(self, state):
+        state = dict(state)
+        state["root"] = etree.fromstring(state["root"], PICKLE_PARSER)
+        vars(self).update(state)
+
+    def export(self, encoding="unicode", pretty_print=True, xml_declaration=False):
+        """
+        Serialise the XML.
+
+        :param encoding: "unicode" to get a str, or the name of an (ASCII
+            compatible) encoding, e.g. "utf-8", to get bytes.
+        :param pretty_print: indent the XML, otherwise it is written compactly.
+        :param xml_declaration: prepend an XML declaration (only for bytes).
+        """
+        return etree.tostring(
+            self.root,
+            encoding=encoding,
+            pretty_print=pretty_print,
+            xml_declaration=xml_declaration,
+        )
 
 
 class Util(object):
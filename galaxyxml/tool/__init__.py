@@ -1,10 +1,19 @@
-import copy
+import asyncio
+import functools
+import itertools
 import logging
+import os
+import stat
+import tempfile
+import time
+import traceback
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Optional
 
 from lxml import etree
 
-from galaxyxml import GalaxyXML, Util
+from galaxyxml import PICKLE_PARSER, GalaxyXML, Util
 from galaxyxml.tool.parameters import (
     Command,
     Expand,
@@ -18,12 +27,123 @@ from galaxyxml.tool.parameters import (
 
 VALID_TOOL_TYPES = ("data_source", "data_source_async")
 VALID_URL_METHODS = ("get", "post")
+# order of the children of <tool>, TAG_ORDER of
+# lib/galaxy/tool_util/linters/xml_order.py
+TAG_ORDER = (
+    "description",
+    "macros",
+    "options",
+    "edam_topics",
+    "edam_operations",
+    "xrefs",
+    "parallelism",
+    "requirements",
+    "required_files",
+    "code",
+    "stdio",
+    "version_command",
+    "command",
+    "environment_variables",
+    "configfiles",
+    "inputs",
+    "outputs",
+    "tests",
+    "help",
+    "citations",
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def _write_pretty(xf, node, level):
+    """
+    Write node indented by level to the incremental writer xf.
+
+    Mimics the pretty printing of libxml2 (which :meth:`lxml.etree.xmlfile.write`
+    only applies relative to the written node): children are indented only
+    if the element does not contain text, i.e. mixed content is written as is.
+    """
+    indent = "  " * level
+    xf.write(indent)
+    if (
+        len(node) == 0
+        or node.text is not None
+        or not isinstance(node.tag, str)
+        or any(child.tail is not None for child in node)
+    ):
+        xf.write(node, with_tail=False)
+    else:
+        with xf.element(node.tag, node.attrib):
+            xf.write("\n")
+            for child in node:
+                _write_pretty(xf, child, level + 1)
+            xf.write(indent)
+    xf.write("\n")
+
+
+def _markup(text, encoding):
+    """
+    Get literal markup as str or bytes depending on the serialisation encoding.
+    """
+    if encoding == "unicode":
+        return text
+    return text.encode(encoding)
+
+
+def _serialize_fragment(node, encoding="unicode", pretty_print=True):
+    """
+    Serialise node as a child of the root element, i.e. indented by one
+    level if pretty printed.
+
+    The node is only borrowed by a wrapper element during serialisation and
+    put back to its original position afterwards.
+    """
+    parent = node.getparent()
+    if parent is not None:
+        index = parent.index(node)
+    wrapper = etree.Element("fragment")
+    wrapper.append(node)
+    try:
+        xml = etree.tostring(
+            wrapper,
+            encoding=encoding,
+            pretty_print=pretty_print,
+            xml_declaration=False,
+        )
+    finally:
+        wrapper.remove(node)
+        if parent is not None:
+            parent.insert(index, node)
+    newline = "\n" if pretty_print else ""
+    start = len(_markup("<fragment>" + newline, encoding))
+    end = len(xml) - len(_markup("</fragment>" + newline, encoding))
+    return xml[start:end]
+
+
 class Tool(GalaxyXML):
+    # The sections of the tool in the order of TAG_ORDER in
+    # lib/galaxy/tool_util/linters/xml_order.py as tuples of
+    # - the name of the attribute holding the section
+    # - the name of the method computing the section node or None if the
+    #   attribute is exported as is
+    # - the macro to expand if the tool does not have the section or None
+    sections = (
+        ("macros", None, None),
+        ("edam_topics", None, None),
+        ("edam_operations", None, None),
+        ("requirements", None, "requirements"),
+        ("stdios", None, None),
+        ("version_command", "_version_command_node", None),
+        ("command", "_command_node", None),
+        ("configfiles", None, None),
+        ("inputs", None, None),
+        ("outputs", None, None),
+        ("tests", None, "{id}_tests"),
+        ("help", "_help_node", None),
+        ("citations", None, "citations"),
+    )
+
     def __init__(
         self,
         name,
@@ -92,6 +212,56 @@ class Tool(GalaxyXML):
         self.outputs = Outputs()
         self.help = "TODO"
         self.command = Command()
+        # (rank, element) of the children without a section attribute, see
+        # append_extra
+        self._extras = []
+        # serialisations of the sections of the last export
+        self._fragments = {}
+        # name -> function setting the section, for sections that are
+        # loaded on first access (see GalaxyXmlParser.import_xml)
+        self._lazy_sections = {}
+
+    def __getattr__(self, name):
+        lazy_sections = vars(self).get("_lazy_sections")
+        if lazy_sections and name in lazy_sections:
+            lazy_sections.pop(name)()
+            return vars(self)[name]
+        raise AttributeError(
+            "'%s' object has no attribute '%s'" % (type(self).__name__, name)
+        )
+
+    def __setattr__(self, name, value):
+        # an assigned section replaces the one that is still to be loaded
+        lazy_sections = vars(self).get("_lazy_sections")
+        if lazy_sections:
+            lazy_sections.pop(name, None)
+        super(Tool, self).__setattr__(name, value)
+
+    def __getstate__(self):
+        for name in list(vars(self).get("_lazy_sections", ())):
+            getattr(self, name)
+        state = super(Tool, self).__getstate__()
+        state["_extras"] = [
+            (rank, etree.tostring(element)) for rank, element in self._extras
+        ]
+        return state
+
+    def __setstate__(self, state):
+        state = dict(state)
+        state["_extras"] = [
+            (rank, etree.fromstring(xml, PICKLE_PARSER))
+            for rank, xml in state.get("_extras", ())
+        ]
+        super(Tool, self).__setstate__(state)
+
+    def _section(self, name):
+        """
+        Get the section stored in the attribute name or None if the tool
+        does not have the section.
+        """
+        if name not in vars(self) and name in vars(self).get("_lazy_sections", ()):
+            getattr(self, name)
+        return vars(self).get(name)
 
     def add_comment(self, comment_txt):
         comment = etree.Comment(comment_txt)
@@ -110,6 +280,27 @@ class Tool(GalaxyXML):
         else:
             self.root.append(sub_node)
 
+    def append_extra(self, element, after=None):
+        """
+        Add a child of the <tool> tag that is not held by one of the
+        :attr:`sections` (e.g. <code> or <environment_variables>).
+
+        It is exported at the position of its tag in :data:`TAG_ORDER`,
+        other tags follow the tag given by after (or the description).
+
+        :param element: the child of the <tool> tag.
+        :type element: :class:`lxml.etree._Element`
+        :param after: tag of the preceding child of the <tool> tag.
+        :type after: STRING
+        """
+        if element.tag in TAG_ORDER:
+            rank = (TAG_ORDER.index(element.tag), 0)
+        elif after in TAG_ORDER:
+            rank = (TAG_ORDER.index(after), 1)
+        else:
+            rank = (0, 1)
+        self._extras.append((rank, element))
+
     def clean_command_string(self, command_line: List[str]) -> str:
         clean = []
         for x in command_line:
@@ -117,114 +308,227 @@ class Tool(GalaxyXML):
                 clean.append(x)
         return "\n".join(clean)
 
-    def export(self, keep_old_command=False):
-        # see lib/galaxy/tool_util/linters/xml_order.py
-        export_xml = copy.deepcopy(self)
-        try:
-            export_xml.append(export_xml.macros)
-        except Exception:
-            pass
-
-        try:
-            export_xml.append(export_xml.edam_operations)
-        except Exception:
-            pass
-
-        try:
-            export_xml.append(export_xml.edam_topics)
-        except Exception:
-            pass
-
-        try:
-            export_xml.append(export_xml.requirements)
-        except Exception:
-            export_xml.append(Expand(macro="requirements"))
-
-        # Add stdio section - now an XMLParameter
-        try:
-            stdio_element = export_xml.stdios
-        except Exception:
-            stdio_element = None
-        if stdio_element:
-            try:
-                export_xml.append(stdio_element)
-            except Exception:
-                export_xml.append(Expand(macro="stdio"))
-
-        # Append version command
-        export_xml.append_version_command()
-
-        if self.command_override:
-            command_line = self.command_override
+    def _header(self, encoding="unicode", pretty_print=True, xml_declaration=False):
+        """
+        Serialise the start tag of the root together with its own children
+        (description, comments, ...).
+        """
+        xml = etree.tostring(
+            self.root,
+            encoding=encoding,
+            pretty_print=pretty_print,
+            xml_declaration=xml_declaration,
+        )
+        newline = "\n" if pretty_print else ""
+        if len(self.root) == 0:
+            end = len(xml) - len(_markup("/>" + newline, encoding))
+            return xml[:end] + _markup(">" + newline, encoding)
+        return xml[: xml.rindex(_markup("</", encoding))]
+
+    def _fragment(self, name, node, encoding="unicode", pretty_print=True):
+        """
+        Get the serialisation of a section node, reusing the one of the
+        previous export if the section did not change in the meantime.
+
+        XMLParam sections are identified by the object and its revision,
+        nodes computed during export by their content. Elements with
+        children (see :meth:`append_extra`) and sections whose elements
+        were handed out (see :attr:`XMLParam.node`) are always serialised.
+        """
+        if isinstance(node, XMLParam):
+            if not node._cacheable():
+                return _serialize_fragment(node._element(), encoding, pretty_print)
+            key = (node, node._revision)
+            element = node._element()
+        elif len(node):
+            return _serialize_fragment(node, encoding, pretty_print)
         else:
-            command_line = []
-            try:
-                command_line.append(export_xml.inputs.cli())
-            except Exception as e:
-                logger.warning(str(e))
-                raise
-            try:
-                command_line.append(export_xml.outputs.cli())
-            except Exception:
-                pass
-        # Add command section
-        command_node_text = None
+            key = (node.tag, tuple(node.attrib.items()), node.text)
+            element = node
+        cached = self._fragments.get((name, encoding, pretty_print))
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        fragment = _serialize_fragment(element, encoding, pretty_print)
+        self._fragments[(name, encoding, pretty_print)] = (key, fragment)
+        return fragment
+
+    def _version_command_node(self, keep_old_command=False):
+        version_command = etree.Element("version_command")
+        if self.version_command is not None:
+            version_command.text = etree.CDATA(self.version_command)
+        return version_command
+
+    def _command_node(self, keep_old_command=False):
+        command = self._section("command")
         if keep_old_command:
-            if getattr(self, "command", None):
-                command_node_text = etree.CDATA(export_xml.command)
+            if command is not None:
+                command_node_text = command.get_text()
             else:
                 logger.warning(
                     "The tool does not have any old command stored. Only the command line is written."
                 )
-                command_node_text = export_xml.executable
+                command_node_text = self.executable
+        elif self.command_override:
+            command_node_text = self.clean_command_string(self.command_override).strip()
         else:
-            if self.command_override:
-                actual_cli = export_xml.clean_command_string(command_line)
+            command_line = []
+            for name in ("inputs", "outputs"):
+                section = self._section(name)
+                if section is not None:
+                    command_line.append(section.cli())
+            command_node_text = "%s %s" % (
+                self.executable,
+                self.clean_command_string(command_line),
+            )
+            command_node_text = command_node_text.strip()
+        command_node = etree.Element(
+            "command", command.attrib if command is not None else {}
+        )
+        if command_node_text is not None:
+            command_node.text = etree.CDATA(command_node_text)
+        return command_node
+
+    def _help_node(self, keep_old_command=False):
+        help_node = etree.Element("help")
+        if self.help is not None:
+            help_node.text = etree.CDATA(self.help)
+        return help_node
+
+    def _export_nodes(self, keep_old_command=False):
+        """
+        Generate (name, node) pairs of the sections of the tool in the order
+        given by :attr:`sections`.
+
+        Nodes of the tool's sections are yielded as they are, nodes that are
+        computed during export (command, help, ...) are created freshly, so
+        that the tool itself is left untouched. The elements added with
+        :meth:`append_extra` are placed between the sections by their tag.
+        """
+        extras = enumerate(sorted(self._extras, key=lambda extra: extra[0]))
+        extra = next(extras, None)
+        for name, render, default_macro in self.sections:
+            tag = "stdio" if name == "stdios" else name
+            if tag in TAG_ORDER:
+                rank = (TAG_ORDER.index(tag), 0)
+                while extra is not None and extra[1][0] < rank:
+                    yield ("extra", extra[0]), extra[1][1]
+                    extra = next(extras, None)
+            if render is not None:
+                node = getattr(self, render)(keep_old_command)
             else:
-                actual_cli = "%s %s" % (
-                    export_xml.executable,
-                    export_xml.clean_command_string(command_line),
+                node = self._section(name)
+            if node is None and default_macro is not None:
+                node = Expand(macro=default_macro.format(id=self.id))._element()
+            if node is not None:
+                yield name, node
+        while extra is not None:
+            yield ("extra", extra[0]), extra[1][1]
+            extra = next(extras, None)
+
+    def export(
+        self,
+        keep_old_command=False,
+        encoding="unicode",
+        pretty_print=True,
+        xml_declaration=False,
+    ):
+        """
+        Export the tool XML.
+
+        The XML document is assembled from the live section nodes, i.e. the
+        tool is neither copied nor modified. The serialisation of sections
+        that did not change since the last export is reused.
+
+        :param keep_old_command: write the command that is stored in the tool
+            (e.g. from an imported XML) instead of generating it.
+        :param encoding: "unicode" to get a str, or the name of an (ASCII
+            compatible) encoding, e.g. "utf-8", to get bytes.
+        :param pretty_print: indent the XML, otherwise it is written compactly.
+        :param xml_declaration: prepend an XML declaration (only for bytes).
+        """
+        header = self._header(encoding, pretty_print, xml_declaration)
+        fragments = [
+            self._fragment(name, node, encoding, pretty_print)
+            for name, node in self._export_nodes(keep_old_command)
+        ]
+        footer = _markup(
+            "</%s>%s" % (self.root.tag, "\n" if pretty_print else ""), encoding
+        )
+        return header + header[:0].join(fragments) + footer
+
+    def export_to(
+        self,
+        target,
+        keep_old_command=False,
+        encoding="utf-8",
+        pretty_print=True,
+        xml_declaration=False,
+    ):
+        """
+        Write the tool XML section by section to a file.
+
+        The document is written incrementally with :class:`lxml.etree.xmlfile`,
+        i.e. neither the complete XML tree nor the complete serialised string
+        are built.
+
+        :param target: path or binary file object to write to.
+        :param keep_old_command: see :meth:`export`.
+        :param encoding: encoding of the written XML.
+        :param pretty_print: indent the XML, otherwise it is written compactly.
+        :param xml_declaration: write an XML declaration.
+        """
+        if isinstance(target, (str, os.PathLike)):
+            with open(target, "wb") as fh:
+                self.export_to(
+                    fh, keep_old_command, encoding, pretty_print, xml_declaration
                 )
-            command_node_text = actual_cli.strip()
-        export_xml.command_line = command_node_text
-        try:
-            command_element = export_xml.command
-        except Exception:
-            command_element = etree.SubElement(
-                export_xml.root, "command", detect_errors=None
+            return
+        with etree.xmlfile(target, encoding=encoding) as xf:
+            if xml_declaration:
+                xf.write_declaration()
+            with xf.element(self.root.tag, self.root.attrib):
+                nodes = itertools.chain(
+                    self.root,
+                    (
+                        node._element() if isinstance(node, XMLParam) else node
+                        for _, node in self._export_nodes(keep_old_command)
+                    ),
+                )
+                if pretty_print:
+                    xf.write("\n")
+                for node in nodes:
+                    if pretty_print:
+                        _write_pretty(xf, node, 1)
+                    else:
+                        xf.write(node, with_tail=False)
+        # like export(), the document ends with a newline if pretty printed
+        if pretty_print:
+            target.write(_markup("\n", encoding))
+
+    async def aexport_to(self, target, executor=None, **kwargs):
+        """
+        Write the tool XML to a file without blocking the event loop.
+
+        The serialisation and the writing run in the executor. A path is
+        written atomically (see :func:`generate_many`). The tool must not be
+        modified until the export is done.
+
+        :param target: path or binary file object to write to.
+        :param executor: :class:`concurrent.futures.Executor` to run the
+            export in, defaults to the default executor of the event loop
+            (a thread pool). With a process pool the tool is pickled and
+            target needs to be a path.
+        :param kwargs: Passed to :meth:`export_to` (e.g. pretty_print).
+        """
+        loop = asyncio.get_running_loop()
+        if isinstance(target, (str, os.PathLike)):
+            await loop.run_in_executor(
+                executor, _write_atomic, self, os.fspath(target), kwargs
+            )
+        else:
+            await loop.run_in_executor(
+                executor, functools.partial(self.export_to, target, **kwargs)
             )
-        command_element.node.text = etree.CDATA(command_node_text)
-        export_xml.append(command_element)
-
-        try:
-            export_xml.append(export_xml.configfiles)
-        except Exception:
-            pass
-
-        try:
-            export_xml.append(export_xml.inputs)
-        except Exception:
-            pass
-        try:
-            export_xml.append(export_xml.outputs)
-        except Exception:
-            pass
-
-        try:
-            export_xml.append(export_xml.tests)
-        except Exception:
-            export_xml.append(Expand(macro="%s_tests" % self.id))
-
-        help_element = etree.SubElement(export_xml.root, "help")
-        help_element.text = etree.CDATA(export_xml.help)
-        export_xml.append(help_element)
-
-        try:
-            export_xml.append(export_xml.citations)
-        except Exception:
-            export_xml.append(Expand(macro="citations"))
-
-        return super(Tool, export_xml).export()
 
 
 class MacrosTool(Tool):
@@ -251,48 +555,260 @@ class MacrosTool(Tool):
         self.inputs = Macro("%s_inmacro" % self.id)
         self.outputs = Macro("%s_outmacro" % self.id)
 
-    def export(self, keep_old_command=False):  # noqa
-        export_xml = copy.deepcopy(self)
-
-        try:
-            for child in export_xml.macros:
-                export_xml.append(child)
-        except Exception:
-            pass
+    sections = (
+        ("inmacro_token", "_inmacro_token_node", None),
+        ("outmacro_token", "_outmacro_token_node", None),
+        ("inputs", None, None),
+        ("outputs", None, None),
+    )
 
+    def _token_node(self, name, section):
+        token_node = etree.Element("token", {"name": name})
         command_line = []
-        try:
-            command_line.append(export_xml.inputs.cli())
-        except Exception as e:
-            logger.warning(str(e))
-            raise
-
-        # Add command section
-        command_node = etree.SubElement(
-            export_xml.root, "token", {"name": "%s_INMACRO" % self.id.upper()}
+        if section is not None:
+            command_line.append(section.cli())
+        actual_cli = "%s" % (self.clean_command_string(command_line))
+        token_node.text = etree.CDATA(actual_cli.strip())
+        return token_node
+
+    def _inmacro_token_node(self, keep_old_command=False):
+        return self._token_node("%s_INMACRO" % self.id.upper(), self._section("inputs"))
+
+    def _outmacro_token_node(self, keep_old_command=False):
+        return self._token_node(
+            "%s_OUTMACRO" % self.id.upper(), self._section("outputs")
         )
-        actual_cli = "%s" % (export_xml.clean_command_string(command_line))
-        command_node.text = etree.CDATA(actual_cli.strip())
 
-        command_line = []
+    def _export_nodes(self, keep_old_command=False):
+        macros = self._section("macros")
+        if macros is not None:
+            # each child has its own entry in the cache of the fragments
+            for index, child in enumerate(macros.children):
+                yield ("macros", index), child
+        yield from super(MacrosTool, self)._export_nodes(keep_old_command)
+
+
+# result of generate_many for one spec: the path of the written file, the
+# time to build, export and write the tool in seconds and, if that failed,
+# the error message
+GenerateResult = namedtuple("GenerateResult", ["path", "time", "error"])
+
+
+def _umask():
+    """
+    Get the umask of the process, without changing it where possible (i.e.
+    without affecting files created by other threads meanwhile).
+    """
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except OSError:
+        pass
+    umask = os.umask(0o022)
+    os.umask(umask)
+    return umask
+
+
+def _write_atomic(tool, path, export_kwargs, rename=True):
+    """
+    Export the tool to a temporary file next to path and rename it, such
+    that path is either the previous or the complete new XML.
+
+    The file gets the permissions of the file it replaces or, for new
+    files, the default permissions (and not the 0600 of temporary files).
+
+    With rename=False the temporary file is left for the caller to rename
+    and its path is returned.
+    """
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=".%s." % os.path.basename(path), dir=os.path.dirname(path)
+    )
+    fh = None
+    try:
         try:
-            command_line.append(export_xml.outputs.cli())
-        except Exception:
-            pass
-        command_node = etree.SubElement(
-            export_xml.root, "token", {"name": "%s_OUTMACRO" % self.id.upper()}
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+        except FileNotFoundError:
+            mode = 0o666 & ~_umask()
+        os.fchmod(fd, mode)
+        fh = os.fdopen(fd, "wb")
+        with fh:
+            tool.export_to(fh, **export_kwargs)
+        if not rename:
+            return tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        # the descriptor is closed by the file object once there is one
+        if fh is None:
+            os.close(fd)
+        os.remove(tmp_path)
+        raise
+
+
+def _error(e):
+    """
+    Get the message of an exception reported in a GenerateResult.
+    """
+    return "".join(traceback.format_exception_only(type(e), e)).strip()
+
+
+def _generate(args):
+    """
+    Build, export and write the tool of one spec of generate_many (in a
+    worker process), or export and write a tool of export_stream.
+
+    Returns the GenerateResult and, with rename=False, the path of the
+    temporary file that still needs to be renamed to the path of the result.
+    """
+    spec, out_dir, export_kwargs, rename = args
+    start = time.perf_counter()
+    try:
+        tool = spec if isinstance(spec, Tool) else spec()
+        path = os.path.join(out_dir, "%s.xml" % tool.id)
+        tmp_path = _write_atomic(tool, path, export_kwargs, rename)
+    except Exception as e:
+        return GenerateResult(None, time.perf_counter() - start, _error(e)), None
+    return GenerateResult(path, time.perf_counter() - start, None), tmp_path
+
+
+def generate_many(specs, out_dir, workers=None, **kwargs):
+    """
+    Build and export many tools in parallel.
+
+    Each tool is written to OUT_DIR/ID.xml atomically, i.e. via a temporary
+    file that is renamed. Errors are reported per spec and do not abort the
+    generation of the other tools. A spec building a tool with the id of a
+    tool of a preceding spec fails, i.e. the first tool of an id is written.
+
+    :param specs: Functions building a :class:`Tool` (or
+        :class:`MacrosTool`), for workers > 1 they need to be picklable,
+        e.g. module level functions or :func:`functools.partial` of them.
+    :param out_dir: Directory to write the tools to, created if needed.
+    :type out_dir: STRING
+    :param workers: Number of worker processes, defaults to the number of
+        CPUs. With 1 the tools are generated in the current process.
+    :type workers: INTEGER
+    :param kwargs: Passed to :meth:`Tool.export_to` (e.g. pretty_print).
+    :return: :class:`GenerateResult` (path, time, error) per spec, in the
+        order of the specs.
+    :rtype: LIST
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    # the files are renamed here, once the ids of all tools are known
+    jobs = [(spec, out_dir, kwargs, False) for spec in specs]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    start = time.perf_counter()
+    if workers == 1 or len(jobs) <= 1:
+        generated = list(map(_generate, jobs))
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            # a few chunks per worker, to balance the load
+            chunksize = max(1, len(jobs) // (4 * workers))
+            generated = list(executor.map(_generate, jobs, chunksize=chunksize))
+    results = []
+    # path -> index of the spec whose tool is written there
+    written = {}
+    try:
+        for index, (result, tmp_path) in enumerate(generated):
+            if tmp_path is not None:
+                try:
+                    if result.path in written:
+                        raise ValueError(
+                            "%s is already written for spec %d"
+                            % (result.path, written[result.path])
+                        )
+                    os.replace(tmp_path, result.path)
+                    written[result.path] = index
+                except Exception as e:
+                    result = GenerateResult(None, result.time, _error(e))
+            results.append(result)
+    finally:
+        for _, tmp_path in generated:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    elapsed = time.perf_counter() - start
+    logger.info(
+        "generated %d tools (%d failed) in %.2fs (%.1f tools/s)"
+        % (
+            len(results),
+            sum(result.error is not None for result in results),
+            elapsed,
+            len(results) / elapsed if elapsed else 0.0,
         )
-        actual_cli = "%s" % (export_xml.clean_command_string(command_line))
-        command_node.text = etree.CDATA(actual_cli.strip())
+    )
+    return results
 
-        try:
-            export_xml.append(export_xml.inputs)
-        except Exception:
-            pass
 
-        try:
-            export_xml.append(export_xml.outputs)
-        except Exception:
-            pass
+async def _iterate(tools):
+    if hasattr(tools, "__aiter__"):
+        async for tool in tools:
+            yield tool
+    else:
+        for tool in tools:
+            yield tool
 
-        return super(Tool, export_xml).export()
+
+async def export_stream(tools, out_dir, concurrency=4, executor=None, **kwargs):
+    """
+    Export tools without blocking the event loop, yielding a
+    :class:`GenerateResult` per tool as soon as it is written.
+
+    The tools are written to OUT_DIR/ID.xml like by :func:`generate_many`,
+    a tool with the id of a preceding tool is not written (its result
+    reports the error).
+    At most concurrency tools are exported at the same time, the next tool
+    is only taken from tools when an export finished and, once concurrency
+    results are waiting, when the consumer takes a result. I.e. a producer
+    (e.g. an async generator building the tools) is slowed down to the
+    speed of the export.
+
+    :param tools: iterable or async iterable of :class:`Tool`.
+    :param out_dir: Directory to write the tools to, created if needed.
+    :type out_dir: STRING
+    :param concurrency: Maximum number of concurrent exports.
+    :type concurrency: INTEGER
+    :param executor: :class:`concurrent.futures.Executor` to run the exports
+        in, defaults to the default executor of the event loop (a thread
+        pool). With a process pool the tools are pickled.
+    :param kwargs: Passed to :meth:`Tool.export_to` (e.g. pretty_print).
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    loop = asyncio.get_running_loop()
+    os.makedirs(out_dir, exist_ok=True)
+    tools = _iterate(tools)
+    pending = set()
+    exhausted = False
+    ids = set()
+    try:
+        while True:
+            while not exhausted and len(pending) < concurrency:
+                try:
+                    tool = await tools.__anext__()
+                except StopAsyncIteration:
+                    exhausted = True
+                    break
+                if tool.id in ids:
+                    error = _error(ValueError("duplicate tool id %s" % tool.id))
+                    yield GenerateResult(None, 0.0, error)
+                    continue
+                ids.add(tool.id)
+                pending.add(
+                    loop.run_in_executor(
+                        executor, _generate, (tool, out_dir, kwargs, True)
+                    )
+                )
+            if not pending:
+                break
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for future in done:
+                yield future.result()[0]
+    finally:
+        # exports that already run finish (atomically) in the executor
+        for future in pending:
+            future.cancel()
+        await tools.aclose()
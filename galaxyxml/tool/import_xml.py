@@ -1,18 +1,435 @@
+import functools
+import hashlib
+import io
 import logging
+import os
+import pickle
+import tarfile
+import tempfile
+import time
+import traceback
 import xml.etree.ElementTree as ET
+import zipfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 
+from lxml import etree
+
+import galaxyxml
 import galaxyxml.tool as gxt
 import galaxyxml.tool.parameters as gxtp
+from galaxyxml.tool.macros import (
+    MACRO_PARSER,
+    MacroExpander,
+    expand_macros,
+    load_macro_file,
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# parser of import_xml(adopt=True): blank text is dropped (the export is
+# indented anyway), entities are not resolved and CDATA sections are kept
+ADOPT_PARSER = etree.XMLParser(
+    remove_blank_text=True, resolve_entities=False, strip_cdata=False
+)
+
+# The classes wrapping the parsed elements for import_xml(adopt=True) as
+# tag -> (class, schema of the children). For <param> the class is looked up
+# by the type attribute. Elements without a class are kept in the XML (and
+# exported as they are) but are not wrapped.
+_EXPAND_SCHEMA = {"expand": (gxtp.Expand, {})}
+
+_PARAM_TYPES = {
+    "text": gxtp.TextParam,
+    "data": gxtp.DataParam,
+    "boolean": gxtp.BooleanParam,
+    "integer": gxtp.IntegerParam,
+    "float": gxtp.FloatParam,
+    "select": gxtp.SelectParam,
+    "hidden": gxtp.HiddenParam,
+    "hidden_data": gxtp.HiddenDataParam,
+}
+
+_PARAM_SCHEMA = {
+    "option": (gxtp.SelectOption, {}),
+    "options": (
+        gxtp.Options,
+        {"column": (gxtp.Column, {}), "filter": (gxtp.Filter, {})},
+    ),
+    "validator": (gxtp.ValidatorParam, {}),
+    **_EXPAND_SCHEMA,
+}
+
+_INPUTS_SCHEMA = {"param": (_PARAM_TYPES, _PARAM_SCHEMA), **_EXPAND_SCHEMA}
+_INPUTS_SCHEMA.update(
+    section=(gxtp.Section, _INPUTS_SCHEMA),
+    repeat=(gxtp.Repeat, _INPUTS_SCHEMA),
+    conditional=(gxtp.Conditional, _INPUTS_SCHEMA),
+    when=(gxtp.When, _INPUTS_SCHEMA),
+)
+
+_OUTPUTS_SCHEMA = {
+    "filter": (gxtp.OutputFilter, {}),
+    "discover_datasets": (gxtp.DiscoverDatasets, {}),
+    "change_format": (gxtp.ChangeFormat, {"when": (gxtp.ChangeFormatWhen, {})}),
+    **_EXPAND_SCHEMA,
+}
+_OUTPUTS_SCHEMA.update(
+    data=(gxtp.OutputData, _OUTPUTS_SCHEMA),
+    collection=(gxtp.OutputCollection, _OUTPUTS_SCHEMA),
+)
+
+_TEST_SCHEMA = {
+    "param": (gxtp.TestParam, {}),
+    "output": (gxtp.TestOutput, {}),
+    "output_collection": (
+        gxtp.TestOutputCollection,
+        {"element": (gxtp.TestOCElement, {})},
+    ),
+}
+_TEST_SCHEMA.update(repeat=(gxtp.TestRepeat, _TEST_SCHEMA))
+
+# tag of a section -> (attribute of the tool, class, schema of the children)
+_SECTIONS = {
+    "macros": (
+        "macros",
+        gxtp.Macros,
+        {"import": (gxtp.Import, {}), "xml": (gxtp.Macro, {})},
+    ),
+    "edam_topics": (
+        "edam_topics",
+        gxtp.EdamTopics,
+        {"edam_topic": (gxtp.EdamTopic, {}), **_EXPAND_SCHEMA},
+    ),
+    "edam_operations": (
+        "edam_operations",
+        gxtp.EdamOperations,
+        {"edam_operation": (gxtp.EdamOperation, {}), **_EXPAND_SCHEMA},
+    ),
+    "requirements": (
+        "requirements",
+        gxtp.Requirements,
+        {
+            "requirement": (gxtp.Requirement, {}),
+            "container": (gxtp.Container, {}),
+            **_EXPAND_SCHEMA,
+        },
+    ),
+    "stdio": ("stdios", gxtp.Stdios, {"exit_code": (gxtp.Stdio, {})}),
+    "command": ("command", gxtp.Command, {}),
+    "configfiles": (
+        "configfiles",
+        gxtp.Configfiles,
+        {
+            "configfile": (gxtp.Configfile, {}),
+            "inputs": (gxtp.ConfigfileDefaultInputs, {}),
+            **_EXPAND_SCHEMA,
+        },
+    ),
+    "inputs": ("inputs", gxtp.Inputs, _INPUTS_SCHEMA),
+    "outputs": ("outputs", gxtp.Outputs, _OUTPUTS_SCHEMA),
+    "tests": ("tests", gxtp.Tests, {"test": (gxtp.Test, _TEST_SCHEMA)}),
+    "citations": (
+        "citations",
+        gxtp.Citations,
+        {"citation": (gxtp.Citation, {}), **_EXPAND_SCHEMA},
+    ),
+}
+
+
+def _adopt(element, cls, schema):
+    """
+    Wrap the element and its descendants (as far as they are described by
+    the schema) in objects of galaxyxml.tool.parameters.
+    """
+    param = cls.from_node(element)
+    _adopt_children(param, schema)
+    return param
+
+
+def _adopt_children(param, schema):
+    # children are attached before their own children are wrapped, so
+    # that the mako path is propagated only once
+    for child in param._element():
+        entry = schema.get(child.tag)
+        if entry is None:
+            continue
+        child_cls, child_schema = entry
+        if isinstance(child_cls, dict):
+            child_cls = child_cls.get(child.get("type"))
+            if child_cls is None:
+                continue
+        sub_param = child_cls.from_node(child)
+        if param.acceptable_child(sub_param):
+            param.append(sub_param)
+            _adopt_children(sub_param, child_schema)
+
+
+# sections of the tool that import_xml(lazy=True) loads on first access
+LAZY_SECTIONS = ("inputs", "outputs", "tests")
+
+
+def _defer(tool, name, load):
+    """
+    Defer loading a section of the tool to the first access of the
+    attribute name. load() has to set the attribute.
+    """
+    vars(tool).pop(name, None)
+    tool._lazy_sections[name] = load
+
+
+def _adopt_section(tool, element):
+    name, cls, schema = _SECTIONS[element.tag]
+    setattr(tool, name, _adopt(element, cls, schema))
+
+
+# result of GalaxyXmlParser.import_directory for one file: the tool or, if
+# the import failed, the error message
+ImportResult = namedtuple("ImportResult", ["path", "tool", "error"])
+
+
+def _root_tag(source):
+    """
+    Get the root tag of an XML file (path or binary file object), reading
+    only the first start tag.
+    """
+    if not hasattr(source, "read"):
+        # opened here, such that the file is closed when the parsing stops
+        # at the first tag
+        with open(source, "rb") as fh:
+            return _root_tag(fh)
+    for _, element in ET.iterparse(source, events=("start",)):
+        return element.tag
+    return None
+
+
+def _import_file(args):
+    """
+    Import one file of GalaxyXmlParser.import_directory (in a worker
+    process). Returns None for files that are not tools.
+    """
+    parser, xml_path, kwargs = args
+    try:
+        if _root_tag(xml_path) != "tool":
+            return None
+        tool = parser.import_xml(xml_path, **kwargs)
+    except Exception as e:
+        error = "".join(traceback.format_exception_only(type(e), e)).strip()
+        return ImportResult(xml_path, None, error)
+    return ImportResult(xml_path, tool, None)
+
+
+# size of the chunks the XML is hashed in for the cache key
+_CHUNK_SIZE = 1 << 16
+
+
+def _chunks(source):
+    """
+    Read a source of :func:`_source` in chunks. File objects are moved back
+    to their position afterwards.
+    """
+    if isinstance(source, _BufferReader):
+        for start in range(0, len(source.buffer), _CHUNK_SIZE):
+            end = start + _CHUNK_SIZE
+            yield source.buffer[start:end].tobytes()
+    elif hasattr(source, "read"):
+        position = source.tell()
+        for chunk in iter(functools.partial(source.read, _CHUNK_SIZE), b""):
+            yield chunk
+        source.seek(position)
+    else:
+        with open(source, "rb") as fh:
+            for chunk in iter(functools.partial(fh.read, _CHUNK_SIZE), b""):
+                yield chunk
+
+
+def _digest_xml(digest, chunks):
+    """
+    Feed the chunks of an XML document to digest and get the macro files it
+    imports (the <import> children of <macros>, in tools and in macro files).
+
+    The document is parsed incrementally, i.e. comments, CDATA sections and
+    entities are read like in the import, and each child of the root is
+    dropped once it is parsed. Imports are not collected beyond a syntax
+    error.
+    """
+    parser = etree.XMLPullParser(
+        events=("start", "end"), remove_comments=True, huge_tree=True
+    )
+    imports = []
+    depth = 0
+    for chunk in chunks:
+        digest.update(chunk)
+        if parser is None:
+            continue
+        try:
+            parser.feed(chunk)
+            for event, element in parser.read_events():
+                if event == "start":
+                    depth += 1
+                    continue
+                depth -= 1
+                parent = element.getparent()
+                if element.tag == "import" and parent.tag == "macros":
+                    imports.append((element.text or "").strip())
+                if depth == 1:
+                    parent.remove(element)
+        except etree.XMLSyntaxError:
+            parser = None
+    return imports
+
+
+def _cache_key(parser, source, base_dir, options):
+    """
+    Get the key of an import in the cache of GalaxyXmlParser: a hash of the
+    XML (a source of :func:`_source`), the macro files it imports (also
+    indirectly), the options of the import, the parser class and the
+    galaxyxml version.
+    """
+    cls = type(parser)
+    digest = hashlib.sha256(
+        (
+            "%s %s.%s %r"
+            % (galaxyxml.__version__, cls.__module__, cls.__qualname__, options)
+        ).encode()
+    )
+    pending = _digest_xml(digest, _chunks(source))
+    # macro files are imported relative to the tool, also in macro files
+    seen = set()
+    while pending:
+        path = os.path.join(base_dir, pending.pop(0))
+        if path in seen:
+            continue
+        seen.add(path)
+        digest.update(b"\0%s\0" % path.encode())
+        try:
+            pending.extend(_digest_xml(digest, _chunks(path)))
+        except OSError:
+            pass
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class _BufferReader(object):
+    """
+    Minimal binary file object reading a buffer (bytes, mmap, ...) in
+    chunks, such that the parsers do not need a copy of the whole buffer.
+    """
+
+    def __init__(self, buffer):
+        self.buffer = memoryview(buffer).cast("B")
+        self.pos = 0
+
+    def read(self, size=-1):
+        start = self.pos
+        end = len(self.buffer)
+        if size is not None and size >= 0:
+            end = min(start + size, end)
+        self.pos = end
+        return self.buffer[start:end].tobytes()
+
+    def close(self):
+        self.buffer.release()
+
 
-class GalaxyXmlParser(object):
+def _source(xml):
+    """
+    Get the source of import_xml as (file name or object for the parsers,
+    directory the macro files are imported from).
+    """
+    if isinstance(xml, (str, os.PathLike)):
+        return xml, os.path.dirname(os.path.abspath(xml))
+    name = getattr(xml, "name", None)
+    if isinstance(name, str):
+        return xml, os.path.dirname(os.path.abspath(name))
+    return xml, os.getcwd()
+
+
+class HandlerRegistry(object):
+    """
+    Base class of the parsers dispatching XML elements to handlers.
+
+    :attr:`handlers` maps a context (e.g. "inputs" for the children of
+    <inputs>, <section>, ...) to a dict key -> handler, where the key is the
+    tag of the element (or the type of a <param>) and the handler is a
+    function handler(parser, root, element) adding the element to root.
+    """
+
+    handlers = {}
+
+    @classmethod
+    def register_handler(cls, context, key, handler):
+        """
+        Register a handler for the elements with the given key in the
+        context, e.g. for custom tags. Registering a handler on a subclass
+        does not affect the base class.
+
+        :param context: context of the element, see :attr:`handlers`.
+        :type context: STRING
+        :param key: tag of the element (type for <param>).
+        :type key: STRING
+        :param handler: function handler(parser, root, element).
+        """
+        if "handlers" not in vars(cls):
+            cls.handlers = {c: dict(h) for c, h in cls.handlers.items()}
+        cls.handlers.setdefault(context, {})[key] = handler
+
+    def _dispatch(self, context, key, root, element):
+        """
+        Call the handler registered for the key in the context.
+
+        :return: False if there is no handler.
+        """
+        handler = self.handlers[context].get(key)
+        if handler is None:
+            return False
+        handler(self, root, element)
+        return True
+
+    def _pass_through(self, root, element):
+        """
+        Attach an element without a handler unchanged to root, it is
+        exported as it is.
+
+        :param root: object to attach the element to.
+        :type root: :class:`galaxyxml.tool.parameters.XMLParam`
+        :param element: the element (moved from the parsed tree).
+        :type element: :class:`lxml.etree._Element`
+        """
+        root._element().append(element)
+        root.invalidate()
+
+    def _pass_through_children(self, root, element):
+        """
+        Attach the children of an element whose handler does not process
+        them unchanged to root.
+        """
+        for child in element:
+            self._pass_through(root, child)
+
+
+class GalaxyXmlParser(HandlerRegistry):
     """
     Class to import content from an existing Galaxy XML wrapper.
     """
 
+    def __init__(self, cache_dir=None):
+        """
+        :param cache_dir: Directory to store the imported tools in. A tool is
+            loaded from there as long as its XML, the macro files it
+            imports, the options of the import and the galaxyxml version
+            are unchanged. The XML is hashed in chunks before it is
+            imported, i.e. it is read twice if it is not in the cache and
+            fields only shortens the second pass. Only file objects that
+            are not seekable are read into memory. The cached tools are
+            loaded with :mod:`pickle`, i.e. the directory must be trusted.
+        :type cache_dir: STRING
+        """
+        self.cache_dir = cache_dir
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
     def _init_tool(self, xml_root):
         """
         Init tool from existing xml tool.
@@ -22,6 +439,7 @@ class GalaxyXmlParser(object):
         """
         version_cmd = None
         description = None
+        executable = None
         for child in xml_root:
             if child.tag == "description":
                 description = child.text
@@ -29,17 +447,25 @@ class GalaxyXmlParser(object):
                 executable = child.text.split()[0]
             elif child.tag == "version_command":
                 version_cmd = child.text
+        return self._create_tool(xml_root.attrib, description, executable, version_cmd)
 
+    def _create_tool(self, attrib, description, executable, version_cmd):
+        """
+        Create the tool object.
+
+        :param attrib: attributes of the <tool> tag.
+        :type attrib: DICT
+        """
         tool = gxt.Tool(
-            xml_root.attrib["name"],
-            xml_root.attrib["id"],
-            xml_root.attrib.get("version", None),
+            attrib["name"],
+            attrib["id"],
+            attrib.get("version", None),
             description,
             executable,
-            hidden=xml_root.attrib.get("hidden", False),
-            tool_type=xml_root.attrib.get("tool_type", None),
-            URL_method=xml_root.attrib.get("URL_method", None),
-            workflow_compatible=xml_root.attrib.get("workflow_compatible", True),
+            hidden=attrib.get("hidden", False),
+            tool_type=attrib.get("tool_type", None),
+            URL_method=attrib.get("URL_method", None),
+            workflow_compatible=attrib.get("workflow_compatible", True),
             version_command=version_cmd,
         )
         return tool
@@ -93,7 +519,7 @@ class GalaxyXmlParser(object):
             detect_errors = None
         ctext = command_root.text
         command = gxtp.Command(detect_errors=detect_errors)
-        command.node.text = ctext
+        command._element().text = ctext
         tool.command_line = ctext
         tool.command = command
         tool.executable = ctext.split()[0]
@@ -120,17 +546,16 @@ class GalaxyXmlParser(object):
         """
         tool.requirements = gxtp.Requirements()
         for req in requirements_root:
-            req_type = req.attrib["type"]
-            value = req.text
             if req.tag == "requirement":
                 version = req.attrib.get("version", None)
                 tool.requirements.append(
-                    gxtp.Requirement(req_type, value, version=version)
+                    gxtp.Requirement(req.attrib["type"], req.text, version=version)
                 )
             elif req.tag == "container":
-                tool.requirements.append(gxtp.Container(req_type, value))
+                tool.requirements.append(gxtp.Container(req.attrib["type"], req.text))
             else:
                 logger.warning(req.tag + " is not a valid tag for requirements child")
+                self._pass_through(tool.requirements, req)
 
     def _load_edam_topics(self, tool, topics_root):
         """
@@ -227,27 +652,462 @@ class GalaxyXmlParser(object):
         tests_parser = TestsParser()
         tests_parser.load_tests(tool.tests, tests_root)
 
-    def import_xml(self, xml_path):
+    def _adopt_xml(self, source, base_dir, expand=False, lazy=False):
+        """
+        Load existing xml into the :class:`galaxyxml.tool.Tool` object by
+        wrapping the elements parsed by lxml.
+
+        :param source: Path or binary file object of the XML to be loaded.
+        :param base_dir: Directory the macro files are imported from.
+        :type base_dir: STRING
+        :param expand: expand the macros before wrapping the elements.
+        :type expand: BOOLEAN
+        :param lazy: wrap the elements of the LAZY_SECTIONS on first access.
+        :type lazy: BOOLEAN
+        :return: XML content in the galaxyxml model.
+        :rtype: :class:`galaxyxml.tool.Tool`
+        """
+        if expand:
+            xml_root = etree.parse(source, MACRO_PARSER).getroot()
+            expand_macros(xml_root, base_dir)
+        else:
+            xml_root = etree.parse(source, ADOPT_PARSER).getroot()
+        tool = self._init_tool(xml_root)
+        previous = None
+        for child in xml_root:
+            if lazy and child.tag in LAZY_SECTIONS:
+                _defer(tool, child.tag, functools.partial(_adopt_section, tool, child))
+            elif child.tag in _SECTIONS:
+                _adopt_section(tool, child)
+            elif child.tag == "help":
+                tool.help = child.text
+            elif child.tag not in ("description", "version_command"):
+                logger.warning("%s tag is not processed." % child.tag)
+                tool.append_extra(child, previous)
+            previous = child.tag
+        command_text = tool.command.get_text()
+        if command_text is not None:
+            tool.command_line = command_text
+            tool.executable = command_text.split()[0]
+        return tool
+
+    def _load_section(self, tool, section_root, previous=None):
+        """
+        Load a child of the <tool> tag with the registered handler.
+
+        :param tool: Tool object from galaxyxml.
+        :type tool: :class:`galaxyxml.tool.Tool`
+        :param section_root: child of the <tool> tag.
+        :type section_root: :class:`xml.etree._Element`
+        :param previous: tag of the preceding child of the <tool> tag.
+        :type previous: STRING
+        """
+        if not self._dispatch("tool", section_root.tag, tool, section_root):
+            logger.warning(section_root.tag + " tag is not processed.")
+            # sections of the tool are wrapped, other tags are passed
+            # through as they are (see Tool.append_extra)
+            if section_root.tag in _SECTIONS:
+                _adopt_section(tool, section_root)
+            else:
+                tool.append_extra(section_root, previous)
+
+    def _stream_xml(self, source, base_dir, expand=False, fields=None):
+        """
+        Load existing xml into the :class:`galaxyxml.tool.Tool` object section
+        by section while it is parsed. Each section is dropped from the
+        parsed tree once it is loaded.
+
+        :param source: Path or binary file object of the XML to be loaded.
+        :param base_dir: Directory the macro files are imported from.
+        :type base_dir: STRING
+        :param expand: expand the macros of each section before loading it,
+            the <macros> section has to precede the sections using them.
+        :type expand: BOOLEAN
+        :param fields: tags of the sections to load, the parsing stops once
+            all of them have been loaded. All sections if None.
+        :type fields: SET
+        :return: XML content in the galaxyxml model.
+        :rtype: :class:`galaxyxml.tool.Tool`
+        """
+        if not hasattr(source, "read"):
+            # opened here, such that the file is closed when the parsing
+            # stops early (fields)
+            with open(source, "rb") as fh:
+                return self._stream_xml(fh, base_dir, expand, fields)
+        tool = None
+        depth = 0
+        expander = None
+        if expand:
+            expander = MacroExpander(etree.Element("macros"), base_dir)
+        missing = None if fields is None else set(fields)
+        previous = None
+        for event, element in etree.iterparse(
+            source,
+            events=("start", "end"),
+            remove_blank_text=True,
+            remove_comments=True,
+            resolve_entities=False,
+            strip_cdata=False,
+        ):
+            if missing is not None and not missing:
+                break
+            if event == "start":
+                if depth == 0:
+                    xml_root = element
+                    # the executable is set by the command, if it is loaded
+                    tool = self._create_tool(element.attrib, None, "", None)
+                depth += 1
+                continue
+            depth -= 1
+            if depth != 1:
+                continue
+            if expander is None:
+                sections = [element]
+            elif element.tag == "macros":
+                expander = MacroExpander(element, base_dir)
+                # the attributes of the tool (e.g. the version) may use tokens
+                expander.expand(tool.root)
+                tool.id = tool.root.get("id")
+                sections = []
+            else:
+                sections = expander.expand(element)
+            for section in sections:
+                if missing is not None:
+                    if section.tag not in fields:
+                        xml_root.remove(section)
+                        continue
+                    missing.discard(section.tag)
+                # the description and version command are passed to the
+                # constructor by import_xml, here they are set afterwards
+                if section.tag == "description":
+                    tool.root.find("description").text = section.text
+                elif section.tag == "version_command":
+                    tool.version_command = section.text
+                else:
+                    self._load_section(tool, section, previous)
+                previous = section.tag
+                if section.getparent() is xml_root:
+                    xml_root.remove(section)
+            if element.getparent() is xml_root:
+                xml_root.remove(element)
+        return tool
+
+    def import_xml(
+        self,
+        xml_path,
+        adopt=False,
+        stream=False,
+        expand=False,
+        lazy=False,
+        fields=None,
+    ):
         """
         Load existing xml into the :class:`galaxyxml.tool.Tool` object.
 
-        :param xml_path: Path of the XML to be loaded.
-        :type xml_path: STRING
+        :param xml_path: Path or binary file object (e.g. a member of an
+            archive) of the XML to be loaded. Macro files are imported
+            relative to the path (or the name of the file object).
+        :param adopt: parse the XML with lxml and wrap the parsed elements
+            instead of rebuilding them. All attributes and unknown elements
+            are kept as they are, no defaults (e.g. labels) are added.
+        :type adopt: BOOLEAN
+        :param stream: load the sections while the XML is parsed, such that
+            only the section being loaded is held in memory besides the
+            tool. Not possible with adopt, where the parsed tree is kept.
+        :type stream: BOOLEAN
+        :param expand: resolve the imported macro files and expand the
+            macros and tokens, the tool is imported without <macros>.
+            Imported macro files are parsed once and cached (see
+            :mod:`galaxyxml.tool.macros`).
+        :type expand: BOOLEAN
+        :param lazy: load the sections in LAZY_SECTIONS (inputs, outputs and
+            tests) on first access of the attribute of the tool, the
+            parsed elements are kept until then. Not possible with stream.
+            With a cache directory a lazy import uses a tool found in the
+            cache (which is loaded completely) but does not store one.
+        :type lazy: BOOLEAN
+        :param fields: tags of the sections to load (e.g. {"requirements",
+            "edam_topics"}), the other sections keep the defaults of
+            :class:`galaxyxml.tool.Tool`. The XML is parsed incrementally
+            (as with stream) and only until all the sections were found.
+            Not possible with adopt and lazy.
+        :type fields: SET
+        :return: XML content in the galaxyxml model (loaded from the cache
+            directory if possible).
+        :rtype: :class:`galaxyxml.tool.Tool`
+        """
+        source, base_dir = _source(xml_path)
+        return self._import(source, base_dir, adopt, stream, expand, lazy, fields)
+
+    def import_string(self, xml, base_dir=None, **kwargs):
+        """
+        Load xml held in memory into the :class:`galaxyxml.tool.Tool` object.
+
+        :param xml: The XML as bytes, str (which must not declare an encoding
+            other than UTF-8) or any other buffer, e.g. a :class:`mmap.mmap`
+            of a file. Buffers are parsed in place, without a copy.
+        :param base_dir: Directory the macro files are imported from,
+            defaults to the current directory.
+        :type base_dir: STRING
+        :param kwargs: Options of :meth:`import_xml` (e.g. adopt=True).
         :return: XML content in the galaxyxml model.
         :rtype: :class:`galaxyxml.tool.Tool`
         """
-        xml_root = ET.parse(xml_path).getroot()
+        if isinstance(xml, str):
+            xml = xml.encode("utf-8")
+        source = _BufferReader(xml)
+        try:
+            return self._import(source, base_dir or os.getcwd(), **kwargs)
+        finally:
+            source.close()
+
+    def import_archive(self, archive, **kwargs):
+        """
+        Import all tool XMLs in a tar (optionally compressed) or zip archive.
+        The members are read in place, i.e. without extracting them to
+        files. Members that are not tools (e.g. macro files) are skipped.
+
+        :param archive: Path or (seekable) binary file object of the archive.
+        :param kwargs: Options of :meth:`import_xml` (e.g. adopt=True),
+            except expand, macro files are only imported from files.
+        :return: Generator of :class:`ImportResult` (path, tool, error) where
+            the path is the path of the member within the archive.
+        """
+        if kwargs.get("expand"):
+            raise ValueError("macros can not be expanded in archives")
+        if zipfile.is_zipfile(archive):
+            with zipfile.ZipFile(archive) as zf:
+                for info in zf.infolist():
+                    if not info.is_dir() and info.filename.endswith(".xml"):
+                        result = self._import_member(
+                            info.filename, zf.read(info), kwargs
+                        )
+                        if result is not None:
+                            yield result
+            return
+        if hasattr(archive, "read"):
+            # is_zipfile moved to the end of the file
+            archive.seek(0)
+            tf = tarfile.open(fileobj=archive)
+        else:
+            tf = tarfile.open(archive)
+        with tf:
+            for member in tf:
+                if member.isfile() and member.name.endswith(".xml"):
+                    content = tf.extractfile(member).read()
+                    result = self._import_member(member.name, content, kwargs)
+                    if result is not None:
+                        yield result
+
+    def _import_member(self, name, content, kwargs):
+        """
+        Import one member of :meth:`import_archive`, returns None if it is
+        not a tool.
+        """
+        try:
+            if _root_tag(io.BytesIO(content)) != "tool":
+                return None
+            tool = self.import_string(content, **kwargs)
+        except Exception as e:
+            error = "".join(traceback.format_exception_only(type(e), e)).strip()
+            return ImportResult(name, None, error)
+        return ImportResult(name, tool, None)
+
+    def _import(
+        self,
+        source,
+        base_dir,
+        adopt=False,
+        stream=False,
+        expand=False,
+        lazy=False,
+        fields=None,
+    ):
+        """
+        Import the XML from a source of :func:`_source`, using the cache
+        directory if there is one.
+        """
+        if adopt and stream:
+            raise ValueError("stream can not be combined with adopt")
+        if lazy and stream:
+            raise ValueError("stream can not be combined with lazy")
+        if fields is not None and (adopt or lazy):
+            raise ValueError("fields can not be combined with adopt or lazy")
+        if self.cache_dir is None:
+            return self._import_xml(
+                source, base_dir, adopt, stream, expand, lazy, fields
+            )
+        if hasattr(source, "read") and not (
+            isinstance(source, _BufferReader)
+            or getattr(source, "seekable", lambda: False)()
+        ):
+            # read once, for the key and for the import
+            source = _BufferReader(source.read())
+        # the streamed import gives the same tool as the default import
+        options = {
+            "adopt": adopt,
+            "expand": expand,
+            "fields": None if fields is None else sorted(fields),
+        }
+        key = _cache_key(self, source, base_dir, options)
+        cache_path = os.path.join(self.cache_dir, key + ".pickle")
+        try:
+            with open(cache_path, "rb") as fh:
+                return pickle.load(fh)
+        except FileNotFoundError:
+            pass
+        except Exception:
+            logger.warning("ignoring the broken cache file %s" % cache_path)
+        tool = self._import_xml(source, base_dir, adopt, stream, expand, lazy, fields)
+        if lazy:
+            # storing the tool would load all its sections
+            return tool
+        # written to a temporary file first, such that concurrent imports
+        # never read a partially written file
+        try:
+            fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.cache_dir)
+        except OSError as e:
+            logger.warning("can not write the cache file %s: %s" % (cache_path, e))
+            return tool
+        try:
+            try:
+                fh = os.fdopen(fd, "wb")
+            except Exception:
+                os.close(fd)
+                raise
+            with fh:
+                pickle.dump(tool, fh, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            # e.g. a tool holding objects that can not be pickled, the
+            # import itself succeeded
+            logger.warning("can not write the cache file %s: %s" % (cache_path, e))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return tool
+
+    def _import_xml(self, source, base_dir, adopt, stream, expand, lazy, fields):
+        """
+        Import the XML, see :meth:`import_xml`.
+        """
+        if adopt:
+            return self._adopt_xml(source, base_dir, expand, lazy)
+        if stream or fields is not None:
+            return self._stream_xml(source, base_dir, expand, fields)
+        # parsed with lxml, such that elements without a handler can be
+        # attached to the tool as they are
+        xml_root = etree.parse(source, MACRO_PARSER).getroot()
+        if expand:
+            expand_macros(xml_root, base_dir)
         tool = self._init_tool(xml_root)
         # Now we import each tag's field
+        previous = None
         for child in xml_root:
-            try:
-                getattr(self, "_load_{}".format(child.tag))(tool, child)
-            except AttributeError:
-                logger.warning(child.tag + " tag is not processed.")
+            if lazy and child.tag in LAZY_SECTIONS:
+                _defer(
+                    tool, child.tag, functools.partial(self._load_section, tool, child)
+                )
+            else:
+                self._load_section(tool, child, previous)
+            previous = child.tag
         return tool
 
+    def import_directory(self, path, workers=None, **kwargs):
+        """
+        Import all tool XMLs in a directory tree in parallel. Files that are
+        not tools (e.g. macro files) are skipped.
+
+        The results are generated in the order of the (sorted) paths as
+        soon as they are available. Errors are reported per file and do not
+        abort the import of the other files.
+
+        :param path: Directory to search for .xml files.
+        :type path: STRING
+        :param workers: Number of worker processes, defaults to the number of
+            CPUs. With 1 the files are imported in the current process.
+        :type workers: INTEGER
+        :param kwargs: Passed to :meth:`import_xml` (e.g. adopt=True).
+        :return: Generator of :class:`ImportResult` (path, tool, error).
+        """
+        xml_paths = []
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            xml_paths.extend(
+                os.path.join(dirpath, f)
+                for f in sorted(filenames)
+                if f.endswith(".xml")
+            )
+        jobs = [(self, xml_path, kwargs) for xml_path in xml_paths]
+        if kwargs.get("expand"):
+            # parse the macro files before the workers are started, which
+            # then share the cache (if they are forked)
+            for xml_path in xml_paths:
+                try:
+                    if _root_tag(xml_path) == "macros":
+                        load_macro_file(xml_path)
+                except Exception:
+                    # reported by the import of the tools using it
+                    pass
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+        start = time.perf_counter()
+        count = 0
+        errors = 0
+        if workers == 1:
+            results = map(_import_file, jobs)
+            executor = None
+        else:
+            executor = ProcessPoolExecutor(workers)
+            # a few chunks per worker, to balance the load
+            chunksize = max(1, len(jobs) // (4 * workers))
+            results = executor.map(_import_file, jobs, chunksize=chunksize)
+        try:
+            for result in results:
+                if result is not None:
+                    count += 1
+                    errors += result.error is not None
+                    yield result
+        finally:
+            if executor is not None:
+                # on early exit the jobs that did not start are cancelled,
+                # closing the generator of Executor.map cancels its futures
+                # (cancel_futures of shutdown needs Python 3.9)
+                results.close()
+                executor.shutdown()
+        elapsed = time.perf_counter() - start
+        logger.info(
+            "imported %d tools (%d failed) of %d files in %.2fs (%.1f files/s)"
+            % (
+                count,
+                errors,
+                len(jobs),
+                elapsed,
+                len(jobs) / elapsed if elapsed else 0.0,
+            )
+        )
 
-class InputsParser(object):
+    handlers = {
+        "tool": {
+            "description": _load_description,
+            "version_command": _load_version_command,
+            "stdio": _load_stdio,
+            "command": _load_command,
+            "help": _load_help,
+            "requirements": _load_requirements,
+            "edam_topics": _load_edam_topics,
+            "edam_operations": _load_edam_operations,
+            "configfiles": _load_configfiles,
+            "citations": _load_citations,
+            "inputs": _load_inputs,
+            "outputs": _load_outputs,
+            "tests": _load_tests,
+        }
+    }
+
+
+class InputsParser(HandlerRegistry):
     """
     Class to parse content of the <inputs> tag from a Galaxy XML wrapper.
     """
@@ -260,15 +1120,15 @@ class InputsParser(object):
         :param text_param: root of <param> tag.
         :type text_param: :class:`xml.etree._Element`
         """
-        root.append(
-            gxtp.TextParam(
-                text_param.attrib["name"],
-                optional=text_param.get("optional", None),
-                label=text_param.get("label", None),
-                help=text_param.get("help", None),
-                value=text_param.get("value", None),
-            )
+        param = gxtp.TextParam(
+            text_param.attrib["name"],
+            optional=text_param.get("optional", None),
+            label=text_param.get("label", None),
+            help=text_param.get("help", None),
+            value=text_param.get("value", None),
         )
+        self._pass_through_children(param, text_param)
+        root.append(param)
 
     def _load_data_param(self, root, data_param):
         """
@@ -278,16 +1138,16 @@ class InputsParser(object):
         :param data_param: root of <param> tag.
         :type data_param: :class:`xml.etree._Element`
         """
-        root.append(
-            gxtp.DataParam(
-                data_param.attrib["name"],
-                optional=data_param.attrib.get("optional", None),
-                label=data_param.attrib.get("label", None),
-                help=data_param.attrib.get("help", None),
-                format=data_param.attrib.get("format", None),
-                multiple=data_param.attrib.get("multiple", None),
-            )
+        param = gxtp.DataParam(
+            data_param.attrib["name"],
+            optional=data_param.attrib.get("optional", None),
+            label=data_param.attrib.get("label", None),
+            help=data_param.attrib.get("help", None),
+            format=data_param.attrib.get("format", None),
+            multiple=data_param.attrib.get("multiple", None),
         )
+        self._pass_through_children(param, data_param)
+        root.append(param)
 
     def _load_boolean_param(self, root, bool_param):
         """
@@ -297,17 +1157,17 @@ class InputsParser(object):
         :param bool_param: root of <param> tag.
         :type bool_param: :class:`xml.etree._Element`
         """
-        root.append(
-            gxtp.BooleanParam(
-                bool_param.attrib["name"],
-                optional=bool_param.attrib.get("optional", None),
-                label=bool_param.attrib.get("label", None),
-                help=bool_param.attrib.get("help", None),
-                checked=bool_param.attrib.get("checked", False),
-                truevalue=bool_param.attrib.get("truevalue", None),
-                falsevalue=bool_param.attrib.get("falsevalue", None),
-            )
+        param = gxtp.BooleanParam(
+            bool_param.attrib["name"],
+            optional=bool_param.attrib.get("optional", None),
+            label=bool_param.attrib.get("label", None),
+            help=bool_param.attrib.get("help", None),
+            checked=bool_param.attrib.get("checked", False),
+            truevalue=bool_param.attrib.get("truevalue", None),
+            falsevalue=bool_param.attrib.get("falsevalue", None),
         )
+        self._pass_through_children(param, bool_param)
+        root.append(param)
 
     def _load_integer_param(self, root, int_param):
         """
@@ -317,17 +1177,17 @@ class InputsParser(object):
         :param int_param: root of <param> tag.
         :type int_param: :class:`xml.etree._Element`
         """
-        root.append(
-            gxtp.IntegerParam(
-                int_param.attrib["name"],
-                int_param.attrib.get("value", None),
-                optional=int_param.attrib.get("optional", None),
-                label=int_param.attrib.get("label", None),
-                help=int_param.attrib.get("help", None),
-                min=int_param.attrib.get("min", None),
-                max=int_param.attrib.get("max", None),
-            )
+        param = gxtp.IntegerParam(
+            int_param.attrib["name"],
+            int_param.attrib.get("value", None),
+            optional=int_param.attrib.get("optional", None),
+            label=int_param.attrib.get("label", None),
+            help=int_param.attrib.get("help", None),
+            min=int_param.attrib.get("min", None),
+            max=int_param.attrib.get("max", None),
         )
+        self._pass_through_children(param, int_param)
+        root.append(param)
 
     def _load_float_param(self, root, float_param):
         """
@@ -337,17 +1197,17 @@ class InputsParser(object):
         :param float_param: root of <param> tag.
         :type float_param: :class:`xml.etree._Element`
         """
-        root.append(
-            gxtp.FloatParam(
-                float_param.attrib["name"],
-                float_param.attrib.get("value", None),
-                optional=float_param.attrib.get("optional", None),
-                label=float_param.attrib.get("label", None),
-                help=float_param.attrib.get("help", None),
-                min=float_param.attrib.get("min", None),
-                max=float_param.attrib.get("max", None),
-            )
+        param = gxtp.FloatParam(
+            float_param.attrib["name"],
+            float_param.attrib.get("value", None),
+            optional=float_param.attrib.get("optional", None),
+            label=float_param.attrib.get("label", None),
+            help=float_param.attrib.get("help", None),
+            min=float_param.attrib.get("min", None),
+            max=float_param.attrib.get("max", None),
         )
+        self._pass_through_children(param, float_param)
+        root.append(param)
 
     def _load_option_select(self, root, option):
         """
@@ -415,10 +1275,9 @@ class InputsParser(object):
         )
         # Deal with child nodes (usually filter and column)
         for opt_child in options:
-            try:
-                getattr(self, "_load_{}_options".format(opt_child.tag))(opts, opt_child)
-            except AttributeError:
+            if not self._dispatch("options", opt_child.tag, opts, opt_child):
                 logger.warning(opt_child.tag + " tag is not processed for <options>.")
+                self._pass_through(opts, opt_child)
         root.append(opts)
 
     def _load_select_param(self, root, sel_param):
@@ -440,14 +1299,11 @@ class InputsParser(object):
         )
         # Deal with child nodes (usually option and options)
         for sel_child in sel_param:
-            try:
-                getattr(self, "_load_{}_select".format(sel_child.tag))(
-                    select_param, sel_child
-                )
-            except AttributeError:
+            if not self._dispatch("select", sel_child.tag, select_param, sel_child):
                 logger.warning(
                     sel_child.tag + " tag is not processed for <param type='select'>."
                 )
+                self._pass_through(select_param, sel_child)
         root.append(select_param)
 
     def _load_param(self, root, param_root):
@@ -459,10 +1315,9 @@ class InputsParser(object):
         :type param_root: :class:`xml.etree._Element`
         """
         param_type = param_root.attrib["type"]
-        try:
-            getattr(self, "_load_{}_param".format(param_type))(root, param_root)
-        except AttributeError:
+        if not self._dispatch("param", param_type, root, param_root):
             logger.warning(param_type + " tag is not processed for <param>.")
+            self._pass_through(root, param_root)
 
     def _load_when(self, root, when_root):
         """
@@ -545,18 +1400,41 @@ class InputsParser(object):
         :type inputs_root: :class:`xml.etree._Element`
         """
         for inp_child in inputs_root:
-            try:
-                getattr(self, "_load_{}".format(inp_child.tag))(root, inp_child)
-            except AttributeError:
+            if not self._dispatch("inputs", inp_child.tag, root, inp_child):
                 logger.warning(
                     inp_child.tag
                     + " tag is not processed for <"
                     + inputs_root.tag
                     + "> tag."
                 )
-
-
-class OutputsParser(object):
+                self._pass_through(root, inp_child)
+
+    handlers = {
+        # children of <inputs>, <section>, <repeat>, <conditional> and <when>
+        "inputs": {
+            "param": _load_param,
+            "when": _load_when,
+            "conditional": _load_conditional,
+            "section": _load_section,
+            "repeat": _load_repeat,
+        },
+        # <param> by type
+        "param": {
+            "text": _load_text_param,
+            "data": _load_data_param,
+            "boolean": _load_boolean_param,
+            "integer": _load_integer_param,
+            "float": _load_float_param,
+            "select": _load_select_param,
+        },
+        # children of <param type="select">
+        "select": {"option": _load_option_select, "options": _load_options_select},
+        # children of <options>
+        "options": {"column": _load_column_options, "filter": _load_filter_options},
+    }
+
+
+class OutputsParser(HandlerRegistry):
     """
     Class to parse content of the <outputs> tag from a Galaxy XML wrapper.
     """
@@ -580,10 +1458,9 @@ class OutputsParser(object):
         )
         # Deal with child nodes
         for data_child in data_root:
-            try:
-                getattr(self, "_load_{}".format(data_child.tag))(data, data_child)
-            except AttributeError:
+            if not self._dispatch("outputs", data_child.tag, data, data_child):
                 logger.warning(data_child.tag + " tag is not processed for <data>.")
+                self._pass_through(data, data_child)
         outputs_root.append(data)
 
     def _load_change_format(self, root, chfmt_root):
@@ -624,12 +1501,11 @@ class OutputsParser(object):
         )
         # Deal with child nodes
         for coll_child in coll_root:
-            try:
-                getattr(self, "_load_{}".format(coll_child.tag))(collection, coll_child)
-            except AttributeError:
+            if not self._dispatch("outputs", coll_child.tag, collection, coll_child):
                 logger.warning(
                     coll_child.tag + " tag is not processed for <collection>."
                 )
+                self._pass_through(collection, coll_child)
         outputs_root.append(collection)
 
     def _load_discover_datasets(self, root, disc_root):
@@ -669,13 +1545,23 @@ class OutputsParser(object):
         :type tests_root: :class:`xml.etree._Element`
         """
         for out_child in outputs_root:
-            try:
-                getattr(self, "_load_{}".format(out_child.tag))(root, out_child)
-            except AttributeError:
+            if not self._dispatch("outputs", out_child.tag, root, out_child):
                 logger.warning(out_child.tag + " tag is not processed for <outputs>.")
+                self._pass_through(root, out_child)
+
+    handlers = {
+        # children of <outputs>, <data> and <collection>
+        "outputs": {
+            "data": _load_data,
+            "change_format": _load_change_format,
+            "collection": _load_collection,
+            "discover_datasets": _load_discover_datasets,
+            "filter": _load_filter,
+        }
+    }
 
 
-class TestsParser(object):
+class TestsParser(HandlerRegistry):
     """
     Class to parse content of the <tests> tag from a Galaxy XML wrapper.
     """
@@ -688,14 +1574,14 @@ class TestsParser(object):
         :param repeat_root: root of <param> tag.
         :param repeat_root: :class:`xml.etree._Element`
         """
-        test_root.append(
-            gxtp.TestParam(
-                param_root.attrib["name"],
-                value=param_root.attrib.get("value", None),
-                ftype=param_root.attrib.get("ftype", None),
-                dbkey=param_root.attrib.get("dbkey", None),
-            )
+        param = gxtp.TestParam(
+            param_root.attrib["name"],
+            value=param_root.attrib.get("value", None),
+            ftype=param_root.attrib.get("ftype", None),
+            dbkey=param_root.attrib.get("dbkey", None),
         )
+        self._pass_through_children(param, param_root)
+        test_root.append(param)
 
     def _load_output(self, test_root, output_root):
         """
@@ -705,20 +1591,20 @@ class TestsParser(object):
         :param repeat_root: root of <output> tag.
         :param repeat_root: :class:`xml.etree._Element`
         """
-        test_root.append(
-            gxtp.TestOutput(
-                name=output_root.attrib.get("name", None),
-                file=output_root.attrib.get("file", None),
-                ftype=output_root.attrib.get("ftype", None),
-                sort=output_root.attrib.get("sort", None),
-                value=output_root.attrib.get("value", None),
-                md5=output_root.attrib.get("md5", None),
-                checksum=output_root.attrib.get("checksum", None),
-                compare=output_root.attrib.get("compare", None),
-                lines_diff=output_root.attrib.get("lines_diff", None),
-                delta=output_root.attrib.get("delta", None),
-            )
+        output = gxtp.TestOutput(
+            name=output_root.attrib.get("name", None),
+            file=output_root.attrib.get("file", None),
+            ftype=output_root.attrib.get("ftype", None),
+            sort=output_root.attrib.get("sort", None),
+            value=output_root.attrib.get("value", None),
+            md5=output_root.attrib.get("md5", None),
+            checksum=output_root.attrib.get("checksum", None),
+            compare=output_root.attrib.get("compare", None),
+            lines_diff=output_root.attrib.get("lines_diff", None),
+            delta=output_root.attrib.get("delta", None),
         )
+        self._pass_through_children(output, output_root)
+        test_root.append(output)
 
     def _load_output_collection(self, test_root, output_root):
         """
@@ -749,13 +1635,13 @@ class TestsParser(object):
         :param repeat_root: root of <output_collection> tag.
         :param repeat_root: :class:`xml.etree._Element`
         """
-        test_root.append(
-            gxtp.TestOCElement(
-                name=element_root.attrib.get("name", None),
-                ftype=element_root.attrib.get("ftype", None),
-                file=element_root.attrib.get("file", None),
-            )
+        element = gxtp.TestOCElement(
+            name=element_root.attrib.get("name", None),
+            ftype=element_root.attrib.get("ftype", None),
+            file=element_root.attrib.get("file", None),
         )
+        self._pass_through_children(element, element_root)
+        test_root.append(element)
 
     def _load_repeat(self, test_root, repeat_root):
         """
@@ -785,15 +1671,14 @@ class TestsParser(object):
         :type repeat_root: :class:`xml.etree._Element`
         """
         for rep_child in repeat_root:
-            try:
-                getattr(self, "_load_{}".format(rep_child.tag))(repeat, rep_child)
-            except AttributeError:
+            if not self._dispatch("test", rep_child.tag, repeat, rep_child):
                 logger.warning(
                     rep_child.tag
                     + " tag is not processed for <"
                     + repeat_root.tag
                     + "> tag."
                 )
+                self._pass_through(repeat, rep_child)
 
     def load_tests(self, root, tests_root):
         """
@@ -806,10 +1691,20 @@ class TestsParser(object):
         for test_root in tests_root:
             test = gxtp.Test()
             for test_child in test_root:
-                try:
-                    getattr(self, "_load_{}".format(test_child.tag))(test, test_child)
-                except AttributeError:
+                if not self._dispatch("test", test_child.tag, test, test_child):
                     logger.warning(
                         test_child.tag + " tag is not processed within <test>."
                     )
+                    self._pass_through(test, test_child)
             root.append(test)
+
+    handlers = {
+        # children of <test>, <repeat> and <output_collection>
+        "test": {
+            "param": _load_param,
+            "output": _load_output,
+            "output_collection": _load_output_collection,
+            "element": _load_element,
+            "repeat": _load_repeat,
+        }
+    }
@@ -0,0 +1,253 @@
+"""
+Expansion of Galaxy macros (<expand macro="..."> and @TOKEN@) in parsed tool
+XML, following lib/galaxy/util/xml_macros.py.
+
+Imported macro files are parsed once and kept in a cache keyed by path and
+modification time, so that the tools of a suite sharing a macros.xml do not
+parse it again, and an edited macro file is parsed again.
+"""
+import copy
+import functools
+import logging
+import os
+
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+# parser of the macro files (and of tools whose macros are expanded):
+# comments are dropped since they are not valid children of most sections
+MACRO_PARSER = etree.XMLParser(
+    remove_blank_text=True,
+    remove_comments=True,
+    resolve_entities=False,
+    strip_cdata=False,
+)
+
+# maximum number of nested macro expansions, exceeded by recursive macros
+MAX_NESTING = 50
+
+
+@functools.lru_cache(maxsize=128)
+def _parse_macro_file(path, mtime):
+    return etree.parse(path, MACRO_PARSER).getroot()
+
+
+def load_macro_file(path):
+    """
+    Get the root (<macros>) of a parsed macro file from the cache.
+
+    The returned element is shared and must not be modified.
+
+    :param path: Path of the macro file.
+    :type path: STRING
+    """
+    path = os.path.abspath(path)
+    return _parse_macro_file(path, os.stat(path).st_mtime_ns)
+
+
+def clear_macro_cache():
+    """
+    Drop all parsed macro files from the cache.
+    """
+    _parse_macro_file.cache_clear()
+
+
+def macro_cache_info():
+    """
+    Get the statistics (hits, misses, maxsize, currsize) of the cache.
+    """
+    return _parse_macro_file.cache_info()
+
+
+def _replace(element, replacements):
+    """
+    Replace element by (copies of) the replacements in its parent.
+    """
+    for replacement in replacements:
+        element.addprevious(copy.deepcopy(replacement))
+    element.getparent().remove(element)
+
+
+def _expand_tokens_str(text, tokens):
+    for name, value in tokens.items():
+        if name in text:
+            text = text.replace(name, value)
+    return text
+
+
+def _is_cdata(element):
+    """
+    Check whether the text of element is a CDATA section (as kept by the
+    parsers with strip_cdata=False).
+    """
+    xml = etree.tostring(element, with_tail=False)
+    # attribute values are serialised with escaped ">"
+    return xml.startswith(b"<![CDATA[", xml.index(b">") + 1)
+
+
+def _expand_tokens_el(element, tokens):
+    """
+    Expand the tokens in the text, tail and attribute values of element.
+    Text in a CDATA section stays in one.
+    """
+    if element.text and "@" in element.text:
+        text = _expand_tokens_str(element.text, tokens)
+        if text != element.text:
+            if (
+                isinstance(element.tag, str)
+                and "]]>" not in text
+                and _is_cdata(element)
+            ):
+                text = etree.CDATA(text)
+            element.text = text
+    if element.tail and "@" in element.tail:
+        element.tail = _expand_tokens_str(element.tail, tokens)
+    if not isinstance(element.tag, str):
+        return
+    for key, value in element.attrib.items():
+        if "@" in value:
+            element.set(key, _expand_tokens_str(value, tokens))
+
+
+class MacroExpander(object):
+    """
+    Expands the macros and tokens defined in the <macros> section of a tool
+    and in the macro files it imports.
+    """
+
+    def __init__(self, macros_root, base_dir):
+        """
+        :param macros_root: the <macros> element of the tool.
+        :type macros_root: :class:`lxml.etree._Element`
+        :param base_dir: directory the imports are relative to (the one of
+            the tool, also for imports in imported files).
+        :type base_dir: STRING
+        """
+        self.xml_macros = {}
+        self.tokens = {}
+        self._load(macros_root, base_dir, set())
+        self._expand_nested_tokens()
+
+    def _load(self, macros_root, base_dir, seen):
+        # imported definitions come first, so that the ones of the
+        # importing file take precedence
+        for import_el in macros_root.findall("import"):
+            path = os.path.abspath(os.path.join(base_dir, import_el.text.strip()))
+            if path in seen:
+                continue
+            seen.add(path)
+            self._load(load_macro_file(path), base_dir, seen)
+        for child in macros_root:
+            if child.tag == "xml" or (
+                child.tag == "macro" and child.get("type", "xml") == "xml"
+            ):
+                self.xml_macros[child.get("name")] = child
+            elif child.tag == "token":
+                self.tokens[child.get("name")] = child.text or ""
+
+    def _expand_nested_tokens(self):
+        for name in self.tokens:
+            for other, value in self.tokens.items():
+                if name in value:
+                    if name == other:
+                        raise ValueError("Token '%s' cannot contain itself" % name)
+                    self.tokens[other] = value.replace(name, self.tokens[name])
+
+    def _macro_tokens(self, macro, expand_el):
+        """
+        Get the tokens for the parameters of a macro: the names given in
+        the tokens attribute are required, token_NAME attributes give
+        optional parameters with a default.
+        """
+        quote = macro.get("token_quote", "@")
+        parameters = {}
+        for key, value in macro.attrib.items():
+            if key == "tokens":
+                for name in value.split(","):
+                    parameters[name] = None
+            elif key.startswith("token_") and key != "token_quote":
+                parameters[key.split("_", 1)[1]] = value
+        tokens = {}
+        for name, default in parameters.items():
+            value = expand_el.get(name, default)
+            if value is None:
+                raise ValueError(
+                    "Failed to expand macro %s - missing required parameter [%s]."
+                    % (macro.get("name"), name)
+                )
+            tokens[quote + name.upper() + quote] = value
+        return tokens
+
+    def _instantiate(self, macro, expand_el):
+        """
+        Get a copy of the macro with the yields replaced by the content of
+        expand_el and the parameters of the macro replaced.
+        """
+        macro_el = copy.deepcopy(macro)
+        for token_el in expand_el.findall("token"):
+            name = token_el.get("name")
+            for yield_el in macro_el.findall(".//yield[@name='%s']" % name):
+                _replace(yield_el, token_el)
+        content = [child for child in expand_el if child.tag != "token"]
+        for yield_el in macro_el.findall(".//yield"):
+            if yield_el.get("name") is None:
+                _replace(yield_el, content)
+        tokens = self._macro_tokens(macro, expand_el)
+        if tokens:
+            for element in macro_el.iterdescendants():
+                _expand_tokens_el(element, tokens)
+        return list(macro_el)
+
+    def expand(self, element, nesting=0):
+        """
+        Expand the macros and tokens in element and its descendants (in
+        place). Macros that are not defined are left unexpanded.
+
+        :param element: element to expand, if it is an <expand> element it
+            needs to have a parent.
+        :type element: :class:`lxml.etree._Element`
+        :return: the elements element is replaced by, i.e. [element] unless
+            it is an <expand> element.
+        :rtype: LIST
+        """
+        if nesting > MAX_NESTING:
+            raise ValueError("Macros nested too deeply (recursive macro?)")
+        if element.tag == "expand":
+            macro = self.xml_macros.get(element.get("macro"))
+            if macro is not None:
+                replacements = self._instantiate(macro, element)
+                for replacement in replacements:
+                    element.addprevious(replacement)
+                element.getparent().remove(element)
+                expanded = []
+                for replacement in replacements:
+                    expanded.extend(self.expand(replacement, nesting + 1))
+                return expanded
+            logger.warning("macro %s is not defined." % element.get("macro"))
+        _expand_tokens_el(element, self.tokens)
+        for child in list(element):
+            self.expand(child, nesting)
+        return [element]
+
+
+def expand_macros(xml_root, base_dir):
+    """
+    Expand the macros of a parsed tool in place. The <macros> section is
+    removed.
+
+    :param xml_root: the <tool> element.
+    :type xml_root: :class:`lxml.etree._Element`
+    :param base_dir: directory of the tool (the imports are relative to).
+    :type base_dir: STRING
+    :return: the expander.
+    :rtype: :class:`MacroExpander`
+    """
+    macros_root = xml_root.find("macros")
+    if macros_root is None:
+        macros_root = etree.Element("macros")
+    else:
+        xml_root.remove(macros_root)
+    expander = MacroExpander(macros_root, base_dir)
+    expander.expand(xml_root)
+    return expander
@@ -1,3 +1,4 @@
+import functools
 import logging
 from builtins import object, str
 from typing import Optional
@@ -5,23 +6,266 @@ from typing import Optional
 from galaxy.tool_util.parser.util import _parse_name
 from lxml import etree
 
-from galaxyxml import Util
+from galaxyxml import PICKLE_PARSER, Util
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def _memoize(render):
+    """
+    Decorator caching the result of a command line rendering method on the node.
+
+    The cached rendering is reused as long as neither the node (including its
+    descendants, see :meth:`XMLParam.invalidate`) nor its mako path changed.
+    Nodes whose elements were handed out are always rendered (see
+    :meth:`XMLParam._cacheable`).
+    """
+
+    @functools.wraps(render)
+    def wrapper(self, *args, **kwargs):
+        if not self._cacheable():
+            return render(self, *args, **kwargs)
+        key = (
+            render.__name__,
+            args,
+            tuple(kwargs.items()),
+            self._revision,
+            self._mako_prefix,
+        )
+        cached = self._rendered
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        rendered = render(self, *args, **kwargs)
+        self._rendered = (key, rendered)
+        return rendered
+
+    return wrapper
+
+
 class XMLParam(object):
+    # attributes are stored in slots to keep the objects small; additional
+    # attributes can be set on the instance which then gets a __dict__
+    __slots__ = (
+        # the lxml element, created on first access of self.node
+        "_node",
+        # attributes and text of the node as long as the element is not created
+        "_attrib",
+        "_text",
+        "children",
+        "parent",
+        # mako identifiers of the ancestors, maintained on attachment
+        "_mako_prefix",
+        # incremented whenever the node or one of its descendants changes
+        "_revision",
+        # (key, value) of the last command line rendering, see _memoize
+        "_rendered",
+        # whether the element of the node or of a descendant was handed out
+        # (see node), set on the ancestors too
+        "_exposed",
+        "__dict__",
+    )
     node_name = "node"
+    # whether the text of the node is written as CDATA section
+    cdata = False
+
+    def __new__(cls, *args, **kwargs):
+        # initialise the internal attributes before any __init__ runs
+        # (also for copies and unpickled objects)
+        self = super(XMLParam, cls).__new__(cls)
+        object.__setattr__(self, "_node", None)
+        object.__setattr__(self, "_attrib", None)
+        object.__setattr__(self, "_text", None)
+        # childless nodes share an empty tuple, a list is created on append
+        object.__setattr__(self, "children", ())
+        object.__setattr__(self, "parent", None)
+        object.__setattr__(self, "_mako_prefix", ())
+        object.__setattr__(self, "_revision", 0)
+        object.__setattr__(self, "_rendered", None)
+        object.__setattr__(self, "_exposed", False)
+        return self
 
     def __init__(self, *args, **kwargs):
         # http://stackoverflow.com/a/12118700
-        self.children = []
-        self.parent = None
         kwargs = {k: v for k, v in list(kwargs.items()) if v is not None}
         kwargs = Util.coerce(kwargs, kill_lists=True)
         kwargs = Util.clean_kwargs(kwargs, final=True)
-        self.node = etree.Element(self.node_name, **kwargs)
+        object.__setattr__(self, "_attrib", kwargs)
+
+    @classmethod
+    def from_node(cls, node):
+        """
+        Create an object wrapping an existing lxml element (e.g. of a parsed
+        XML) without copying it.
+
+        Only the Python state of the object is derived from the element,
+        children are wrapped separately and attached with :meth:`append`.
+        The element (and the ones of its descendants that are not wrapped)
+        may be modified directly, i.e. renderings of the object are not
+        cached.
+        """
+        self = cls.__new__(cls)
+        object.__setattr__(self, "_node", node)
+        object.__setattr__(self, "_exposed", True)
+        # the new object is neither attached nor rendered, i.e. there is
+        # nothing to invalidate
+        for name, value in self._node_state().items():
+            object.__setattr__(self, name, value)
+        return self
+
+    def _node_state(self):
+        """
+        Get the Python state of the object (attribute name -> value) derived
+        from self.node, the counterpart of __init__ for :meth:`from_node`.
+        """
+        return {}
+
+    @property
+    def node(self):
+        """
+        The lxml element of the node.
+
+        The attributes and the text of the node are kept in Python until
+        the element is needed (e.g. for export), only then the element is
+        created (together with the elements of all descendants).
+
+        The element may be modified directly, hence once it was accessed
+        the command lines and serialisations of the node, its ancestors
+        and its descendants are not cached any more.
+        """
+        self._expose()
+        return self._element()
+
+    @node.setter
+    def node(self, node):
+        self._expose()
+        self._node = node
+        self._attrib = None
+        self._text = None
+
+    def _element(self):
+        """
+        Get the lxml element of the node (see :attr:`node`) for internal
+        use, i.e. without disabling the caches.
+        """
+        if self._node is None:
+            node = etree.Element(self.node_name, self._attrib)
+            if self._text is not None:
+                node.text = etree.CDATA(self._text) if self.cdata else self._text
+            for child in self.children:
+                node.append(child._element())
+            self._node = node
+            self._attrib = None
+            self._text = None
+        return self._node
+
+    def _expose(self):
+        """
+        Mark the node and its ancestors as modifiable through lxml.
+        """
+        node = self
+        while node is not None and not node._exposed:
+            object.__setattr__(node, "_exposed", True)
+            node = node.parent
+
+    def _cacheable(self):
+        """
+        Check whether renderings of the node can be cached, i.e. no element
+        of the tree of objects it belongs to was handed out.
+        """
+        node = self
+        while node.parent is not None:
+            node = node.parent
+        return not node._exposed
+
+    def __getstate__(self):
+        # lxml elements can not be pickled: an element is pickled as XML by
+        # the object it belongs to unless it is in the element of the parent
+        # object, then only its index there is recorded
+        state = dict(vars(self))
+        for cls in type(self).__mro__:
+            for name in cls.__dict__.get("__slots__", ()):
+                if name in ("__dict__", "_node"):
+                    continue
+                try:
+                    state[name] = object.__getattribute__(self, name)
+                except AttributeError:
+                    pass
+        node = self._node
+        if node is not None:
+            parent = self.parent
+            if (
+                parent is not None
+                and parent._node is not None
+                and node.getparent() is parent._node
+            ):
+                state["_node_index"] = parent._node.index(node)
+            else:
+                state["_node_xml"] = etree.tostring(node)
+        return state
+
+    def __setstate__(self, state):
+        state = dict(state)
+        xml = state.pop("_node_xml", None)
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+        if xml is not None:
+            self._node = etree.fromstring(xml, PICKLE_PARSER)
+        else:
+            # the parent might be restored before its children or after
+            self._resolve_node_index()
+        if self._node is not None:
+            for child in self.children:
+                child._resolve_node_index()
+
+    def _resolve_node_index(self):
+        """
+        Look up the element of an unpickled object in the element of the
+        parent (see __getstate__), once both are restored.
+        """
+        index = vars(self).get("_node_index")
+        if index is None or self.parent is None or self.parent._node is None:
+            return
+        del self._node_index
+        self._node = self.parent._node[index]
+        for child in self.children:
+            child._resolve_node_index()
+
+    @property
+    def attrib(self):
+        """
+        The attributes of the node, without creating the lxml element.
+        """
+        if self._node is None:
+            return self._attrib
+        return self._node.attrib
+
+    def get_text(self):
+        """
+        Get the text of the node, without creating the lxml element.
+        """
+        if self._node is None:
+            return self._text
+        return self._node.text
+
+    def set_text(self, text):
+        """
+        Set the text of the node, without creating the lxml element.
+        """
+        if self._node is None:
+            self._text = text
+        elif text is not None and self.cdata:
+            self._node.text = etree.CDATA(text)
+        else:
+            self._node.text = text
+        self.invalidate()
+
+    def set_attribute(self, name, value):
+        """
+        Set an attribute of the node, without creating the lxml element.
+        """
+        self.attrib[name] = value
+        self.invalidate()
 
     def __getattr__(self, name):
         """
@@ -31,18 +275,73 @@ class XMLParam(object):
         # https://stackoverflow.com/questions/47299243/recursionerror-when-python-copy-deepcopy
         if name == "__setstate__":
             raise AttributeError(name)
+        attrib = self.attrib
+        if attrib is None:
+            raise AttributeError(name)
         try:
-            return self.node.attrib[name]
+            return attrib[name]
         except KeyError:
             raise AttributeError(name)
 
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name[0] != "_":
+            self.invalidate()
+            if name == "mako_identifier":
+                for child in self.children:
+                    child._update_mako_prefix()
+
+    def invalidate(self):
+        """
+        Mark the node and all its ancestors as changed, such that cached
+        renderings are recomputed.
+
+        Appending children and setting attributes of the object do this
+        automatically (also :meth:`set_text` and :meth:`set_attribute`).
+        Modifications of self.node need no call of this function, renderings
+        are not cached once the element was accessed.
+        """
+        node = self
+        while node is not None:
+            object.__setattr__(node, "_revision", node._revision + 1)
+            node = node.parent
+
+    def _update_mako_prefix(self):
+        """
+        Compute the mako identifiers of the ancestors from the parent and
+        propagate them to the descendants.
+        """
+        parent = self.parent
+        if parent is not None and hasattr(parent, "mako_identifier"):
+            prefix = parent._mako_prefix
+            # exclude None identifiers -- e.g. <when> tags
+            if parent.mako_identifier is not None:
+                prefix = prefix + (parent.mako_identifier,)
+        else:
+            prefix = ()
+        if prefix != self._mako_prefix:
+            self._mako_prefix = prefix
+            for child in self.children:
+                child._update_mako_prefix()
+
     def append(self, sub_node):
         if self.acceptable_child(sub_node):
             # If one of ours, they aren't etree nodes, they're custom objects
             if issubclass(type(sub_node), XMLParam):
-                self.node.append(sub_node.node)
+                # the element of an adopted child is already in place
+                if self._node is not None and (
+                    sub_node._node is None
+                    or sub_node._node.getparent() is not self._node
+                ):
+                    self._node.append(sub_node._element())
+                if not self.children:
+                    object.__setattr__(self, "children", [])
                 self.children.append(sub_node)
+                if sub_node._exposed:
+                    self._expose()
                 self.children[-1].parent = self
+                sub_node._update_mako_prefix()
+                self.invalidate()
             else:
                 raise Exception(
                     "Child was unacceptable to parent (%s is not appropriate for %s)"
@@ -67,10 +366,13 @@ class XMLParam(object):
                 return False
         return True
 
+    @_memoize
     def cli(self):
         lines = []
         for child in self.children:
-            lines.append(child.command_line())
+            line = child.command_line()
+            if line is not None:
+                lines.append(line)
         return "\n".join(lines)
 
     def command_line(self, mako_path=None):
@@ -83,6 +385,7 @@ class XMLParam(object):
 
 
 class Command(XMLParam):
+    __slots__ = ()
     node_name = "command"
 
     def __init__(self, detect_errors=None, **kwargs):
@@ -91,6 +394,7 @@ class Command(XMLParam):
 
 
 class Stdios(XMLParam):
+    __slots__ = ()
     node_name = "stdio"
 
     def acceptable_child(self, child):
@@ -98,6 +402,7 @@ class Stdios(XMLParam):
 
 
 class Stdio(XMLParam):
+    __slots__ = ()
     node_name = "exit_code"
 
     def __init__(self, range="1:", level="fatal", **kwargs):
@@ -106,13 +411,15 @@ class Stdio(XMLParam):
 
 
 class Macros(XMLParam):
+    __slots__ = ()
     node_name = "macros"
 
     def acceptable_child(self, child):
-        return isinstance(child, (Macro, Import))
+        return isinstance(child, (Macro, Import, Token))
 
 
 class Macro(XMLParam):
+    __slots__ = ()
     node_name = "xml"
 
     def __init__(self, name):
@@ -126,21 +433,38 @@ class Macro(XMLParam):
 
 
 class Import(XMLParam):
+    __slots__ = ()
     node_name = "import"
 
     def __init__(self, value):
         super(Import, self).__init__()
-        self.node.text = value
+        self.set_text(value)
 
     def acceptable_child(self, child):
         return issubclass(type(child), XMLParam) and not isinstance(child, Macro)
 
 
+class Token(XMLParam):
+    """
+    <token name="...">value</token>
+    """
+
+    __slots__ = ()
+    node_name = "token"
+    cdata = True
+
+    def __init__(self, name, value):
+        super(Token, self).__init__(name=name)
+        self.set_text(value)
+
+
 class Expand(XMLParam):
     """
     <expand macro="...">
     """
 
+    __slots__ = ()
+
     node_name = "expand"
 
     def __init__(self, macro):
@@ -164,6 +488,8 @@ class ExpandIO(Expand):
     the command section. can only be used in Inputs and Outputs
     """
 
+    __slots__ = ()
+
     node_name = "expand"
 
     def __init__(self, macro):
@@ -173,10 +499,11 @@ class ExpandIO(Expand):
         super(Expand, self).__init__(**passed_kwargs)
 
     def command_line(self, mako_path=None):
-        return "@%s@" % self.node.attrib["macro"].upper()
+        return "@%s@" % self.attrib["macro"].upper()
 
 
 class RequestParamTranslation(XMLParam):
+    __slots__ = ()
     node_name = "request_param_translation"
 
     def __init__(self, **kwargs):
@@ -187,6 +514,7 @@ class RequestParamTranslation(XMLParam):
 
 
 class RequestParam(XMLParam):
+    __slots__ = ("galaxy_name",)
     node_name = "request_param"
 
     def __init__(self, galaxy_name, remote_name, missing, **kwargs):
@@ -205,6 +533,7 @@ class RequestParam(XMLParam):
 
 
 class AppendParam(XMLParam):
+    __slots__ = ()
     node_name = "append_param"
 
     def __init__(self, separator="&amp;", first_separator="?", join="=", **kwargs):
@@ -216,6 +545,7 @@ class AppendParam(XMLParam):
 
 
 class AppendParamValue(XMLParam):
+    __slots__ = ()
     node_name = "value"
 
     def __init__(self, name="_export", missing="1", **kwargs):
@@ -227,6 +557,7 @@ class AppendParamValue(XMLParam):
 
 
 class EdamOperations(XMLParam):
+    __slots__ = ()
     node_name = "edam_operations"
 
     def acceptable_child(self, child):
@@ -239,20 +570,22 @@ class EdamOperations(XMLParam):
         :type edam_operation: STRING
         """
         for operation in self.children:
-            if operation.node.text == edam_operation:
+            if operation.get_text() == edam_operation:
                 return True
         return False
 
 
 class EdamOperation(XMLParam):
+    __slots__ = ()
     node_name = "edam_operation"
 
     def __init__(self, value):
         super(EdamOperation, self).__init__()
-        self.node.text = str(value)
+        self.set_text(str(value))
 
 
 class EdamTopics(XMLParam):
+    __slots__ = ()
     node_name = "edam_topics"
 
     def acceptable_child(self, child):
@@ -265,20 +598,22 @@ class EdamTopics(XMLParam):
         :type edam_topic: STRING
         """
         for topic in self.children:
-            if topic.node.text == edam_topic:
+            if topic.get_text() == edam_topic:
                 return True
         return False
 
 
 class EdamTopic(XMLParam):
+    __slots__ = ()
     node_name = "edam_topic"
 
     def __init__(self, value):
         super(EdamTopic, self).__init__()
-        self.node.text = str(value)
+        self.set_text(str(value))
 
 
 class Requirements(XMLParam):
+    __slots__ = ()
     node_name = "requirements"
     # This bodes to be an issue -__-
 
@@ -291,6 +626,7 @@ class Requirements(XMLParam):
 
 
 class Requirement(XMLParam):
+    __slots__ = ()
     node_name = "requirement"
 
     def __init__(self, type, value, version=None, **kwargs):
@@ -299,10 +635,11 @@ class Requirement(XMLParam):
         passed_kwargs["version"] = params["version"]
         passed_kwargs["type"] = params["type"]
         super(Requirement, self).__init__(**passed_kwargs)
-        self.node.text = str(value)
+        self.set_text(str(value))
 
 
 class Container(XMLParam):
+    __slots__ = ()
     node_name = "container"
 
     def __init__(self, type, value, **kwargs):
@@ -310,10 +647,11 @@ class Container(XMLParam):
         passed_kwargs = {}
         passed_kwargs["type"] = params["type"]
         super(Container, self).__init__(**passed_kwargs)
-        self.node.text = str(value)
+        self.set_text(str(value))
 
 
 class Configfiles(XMLParam):
+    __slots__ = ()
     node_name = "configfiles"
 
     def acceptable_child(self, child):
@@ -325,17 +663,20 @@ class Configfiles(XMLParam):
 
 
 class Configfile(XMLParam):
+    __slots__ = ()
     node_name = "configfile"
+    cdata = True
 
     def __init__(self, name, text, **kwargs):
         params = Util.clean_kwargs(locals().copy())
         passed_kwargs = {}
         passed_kwargs["name"] = params["name"]
         super(Configfile, self).__init__(**passed_kwargs)
-        self.node.text = etree.CDATA(str(text))
+        self.set_text(str(text))
 
 
 class ConfigfileDefaultInputs(XMLParam):
+    __slots__ = ()
     node_name = "inputs"
 
     def __init__(self, name, **kwargs):
@@ -345,7 +686,186 @@ class ConfigfileDefaultInputs(XMLParam):
         super(ConfigfileDefaultInputs, self).__init__(**passed_kwargs)
 
 
-class Inputs(XMLParam):
+class ParamRecords(object):
+    """
+    Mixin for the nodes params are appended to (Inputs, Section, Repeat and
+    When), adds the bulk creation of params from records.
+    """
+
+    __slots__ = ()
+
+    def extend_from_records(self, records):
+        """
+        Create params from flat records and append them.
+
+        A record is a mapping of the type of the param (text, integer,
+        float, boolean, data, select, hidden or hidden_data) and the
+        arguments of its class, e.g. name, argument, value, label, help and
+        for select params options (a dict value -> text) and default. Keys
+        with the value None are ignored.
+
+        The result is the same as creating the params with their
+        constructors and appending them one by one. But only the first
+        param of each shape (type and keys of the record) is created with
+        the constructor, the attributes of the following ones are filled in
+        along its attributes.
+
+        :param records: the records.
+        :type records: ITERABLE of DICT
+        """
+        if hasattr(self, "mako_identifier") and self.mako_identifier is not None:
+            prefix = self._mako_prefix + (self.mako_identifier,)
+        else:
+            prefix = self._mako_prefix
+        templates = {}
+        params = []
+        for record in records:
+            kwargs = {key: value for key, value in record.items() if value is not None}
+            try:
+                cls = _RECORD_TYPES[kwargs.pop("type")]
+            except KeyError as e:
+                raise ValueError("Unknown param type %s" % e)
+            state = _record_state(kwargs)
+            flag = "-" * state[3] + (state[0] or "")
+            shape = (cls, tuple(kwargs), len(flag) > 0)
+            template = templates.get(shape, _NO_TEMPLATE)
+            if template is _NO_TEMPLATE:
+                param = cls(**kwargs)
+                templates[shape] = _record_template(param, kwargs, flag)
+            elif template is None:
+                param = cls(**kwargs)
+            else:
+                param = _record_param(cls, template, kwargs, state, flag, prefix)
+            object.__setattr__(param, "parent", self)
+            if template is _NO_TEMPLATE or template is None:
+                param._update_mako_prefix()
+            params.append(param)
+        if not params:
+            return
+        if self._node is not None:
+            for param in params:
+                self._node.append(param._element())
+        if not self.children:
+            object.__setattr__(self, "children", [])
+        self.children.extend(params)
+        self.invalidate()
+
+
+# marker for shapes of records not seen yet, see ParamRecords
+_NO_TEMPLATE = object()
+# source of an attribute filled in from the flag of the param
+_FLAG = object()
+# record keys that are not attributes of the param
+_RECORD_ARGUMENTS = ("num_dashes", "positional", "options", "default")
+
+
+def _record_state(kwargs):
+    """
+    Get the Python state (flag_identifier, mako_identifier, positional,
+    num_dashes, space_between_arg) of the param of a record, as set by
+    InputParameter.__init__.
+    """
+    name = kwargs.get("name")
+    argument = kwargs.get("argument")
+    if argument:
+        flag_identifier = argument.lstrip()
+        mako_identifier = _parse_name(name, argument)
+    else:
+        flag_identifier = name
+        mako_identifier = name
+    return (
+        flag_identifier,
+        mako_identifier,
+        kwargs.get("positional", False),
+        kwargs.get("num_dashes", 0),
+        kwargs.get("space_between_arg", " "),
+    )
+
+
+def _record_template(param, kwargs, flag):
+    """
+    Get how the attributes of params of the same shape as the param of a
+    record are filled in as a list of (attribute, source, value), source is
+    True for attributes given by the record, _FLAG for the flag and False
+    for the constant value.
+
+    None is returned if the params of the shape need to be created with
+    the constructor, i.e. the param depends on the record otherwise (e.g.
+    by children created for some arguments).
+    """
+    attrib = param.attrib
+    for key in kwargs:
+        if key not in attrib and key not in _RECORD_ARGUMENTS:
+            return None
+    if isinstance(param, SelectParam):
+        if len(param.children) != len(kwargs.get("options", ())):
+            return None
+    elif param.children:
+        return None
+    template = []
+    for key, value in attrib.items():
+        if key in kwargs:
+            if Util.coerce(kwargs[key], kill_lists=True) != value:
+                return None
+            template.append((key, True, None))
+        elif isinstance(param, BooleanParam) and key == "truevalue" and value == flag:
+            template.append((key, _FLAG, None))
+        else:
+            template.append((key, False, value))
+    return template
+
+
+def _record_param(cls, template, kwargs, state, flag, prefix):
+    """
+    Create the param of a record from the template of its shape.
+    """
+    param = cls.__new__(cls)
+    object.__setattr__(param, "flag_identifier", state[0])
+    object.__setattr__(param, "mako_identifier", state[1])
+    object.__setattr__(param, "positional", state[2])
+    object.__setattr__(param, "num_dashes", state[3])
+    object.__setattr__(param, "space_between_arg", state[4])
+    object.__setattr__(param, "_mako_prefix", prefix)
+    attrib = {}
+    for key, source, value in template:
+        if source is True:
+            value = kwargs[key]
+            if type(value) is not str:
+                value = Util.coerce(value, kill_lists=True)
+        elif source is _FLAG:
+            value = flag
+        attrib[key] = value
+    object.__setattr__(param, "_attrib", attrib)
+    options = kwargs.get("options")
+    if options:
+        default = kwargs.get("default")
+        if default is not None and default not in options:
+            raise Exception("Specified a default that isn't in options")
+        if state[1] is not None:
+            prefix = prefix + (state[1],)
+        children = []
+        for value, text in options.items():
+            option = SelectOption.__new__(SelectOption)
+            object.__setattr__(option, "flag_identifier", None)
+            object.__setattr__(option, "mako_identifier", None)
+            object.__setattr__(option, "positional", False)
+            object.__setattr__(option, "num_dashes", 0)
+            object.__setattr__(option, "space_between_arg", " ")
+            object.__setattr__(option, "_mako_prefix", prefix)
+            if value == default:
+                attrib = {"selected": "true", "value": Util.coerce_value(value)}
+            else:
+                attrib = {"value": Util.coerce_value(value)}
+            object.__setattr__(option, "_attrib", attrib)
+            object.__setattr__(option, "_text", str(text))
+            object.__setattr__(option, "parent", param)
+            children.append(option)
+        object.__setattr__(param, "children", children)
+    return param
+
+
+class Inputs(XMLParam, ParamRecords):
+    __slots__ = ()
     node_name = "inputs"
     # This bodes to be an issue -__-
 
@@ -370,6 +890,17 @@ class Inputs(XMLParam):
 
 
 class InputParameter(XMLParam):
+    __slots__ = (
+        "flag_identifier",
+        "mako_identifier",
+        "num_dashes",
+        "positional",
+        "space_between_arg",
+    )
+
+    # command line to use instead of the generated one
+    command_line_override = None
+
     def __init__(self, name, **kwargs):
         # TODO: look at
         if "argument" in kwargs and kwargs["argument"]:
@@ -401,6 +932,24 @@ class InputParameter(XMLParam):
                     ] = "Author did not provide help for this parameter... "
         super(InputParameter, self).__init__(**kwargs)
 
+    def _node_state(self):
+        name = self._node.get("name")
+        argument = self._node.get("argument")
+        if argument:
+            flag_identifier = argument.lstrip()
+            mako_identifier = _parse_name(name, argument)
+        else:
+            flag_identifier = name
+            mako_identifier = name
+        return {
+            "flag_identifier": flag_identifier,
+            "mako_identifier": mako_identifier,
+            "positional": False,
+            "num_dashes": 0,
+            "space_between_arg": " ",
+        }
+
+    @_memoize
     def command_line(self, mako_path=None):
         before = self.command_line_before(mako_path)
         cli = self.command_line_actual(mako_path)
@@ -416,36 +965,28 @@ class InputParameter(XMLParam):
         return None
 
     def command_line_actual(self, mako_path=None):
-        try:
+        if self.command_line_override is not None:
             return self.command_line_override
-        except Exception:
-            if self.positional:
-                return self.mako_name(mako_path)
-            else:
-                return "%s%s%s" % (
-                    self.flag(),
-                    self.space_between_arg,
-                    self.mako_name(mako_path),
-                )
+        elif self.positional:
+            return self.mako_name(mako_path)
+        else:
+            return "%s%s%s" % (
+                self.flag(),
+                self.space_between_arg,
+                self.mako_name(mako_path),
+            )
 
     def mako_name(self, mako_path: Optional[str] = None) -> str:
         """
 
         mako_path overwrites the path
         """
-        path = []
         if mako_path:
-            path.append(mako_path)
+            path = (mako_path,)
         else:
-            p = self.parent
-            while p is not None and hasattr(p, "mako_identifier"):
-                # exclude None identifiers -- e.g. <when> tags
-                if p.mako_identifier is not None:
-                    path.append(p.mako_identifier)
-                p = p.parent
-            path.reverse()
+            path = self._mako_prefix
         if hasattr(self, "mako_identifier") and self.mako_identifier is not None:
-            path.append(self.mako_identifier)
+            path = path + (self.mako_identifier,)
         return f"${'.'.join(path)}"
 
     def flag(self):
@@ -453,13 +994,15 @@ class InputParameter(XMLParam):
         return flag + self.flag_identifier
 
 
-class Section(InputParameter):
+class Section(InputParameter, ParamRecords):
+    __slots__ = ()
     node_name = "section"
 
     def __init__(self, name, title, expanded=None, help=None, **kwargs):
         params = Util.clean_kwargs(locals().copy())
         super(Section, self).__init__(**params)
 
+    @_memoize
     def command_line(self, mako_path=None):
         cli = []
         for child in self.children:
@@ -470,7 +1013,8 @@ class Section(InputParameter):
         return issubclass(type(child), InputParameter) or isinstance(child, Expand)
 
 
-class Repeat(InputParameter):
+class Repeat(InputParameter, ParamRecords):
+    __slots__ = ()
     node_name = "repeat"
 
     def __init__(self, name, title, min=None, max=None, default=None, **kwargs):
@@ -480,15 +1024,13 @@ class Repeat(InputParameter):
         # name of the loop variable
         self.mako_identifier = f"i_{self.name}"
 
-    def command_line_before(self, mako_path):
-        parent = self.parent
-        while not (isinstance(parent, Inputs) or hasattr(parent, "mako_identifier")):
-            parent = parent.parent
+    def _node_state(self):
+        state = super(Repeat, self)._node_state()
+        state["mako_identifier"] = f"i_{self._node.get('name')}"
+        return state
 
-        if isinstance(parent, Inputs) or not hasattr(parent, "mako_identifier"):
-            repeat_name = f"${self.name}"
-        else:
-            repeat_name = f"{parent.mako_name()}.{self.name}"
+    def command_line_before(self, mako_path):
+        repeat_name = "$%s" % ".".join(self._mako_prefix + (self.name,))
         return f"#for $i_{self.name} in {repeat_name}"
 
     def command_line_after(self):
@@ -505,6 +1047,7 @@ class Repeat(InputParameter):
 
 
 class Conditional(InputParameter):
+    __slots__ = ()
     node_name = "conditional"
 
     def __init__(
@@ -527,6 +1070,7 @@ class Conditional(InputParameter):
 
     #         return issubclass(type(child), InputParameter) and not isinstance(child, Conditional)
 
+    @_memoize
     def command_line(self, mako_path=None):
         lines = []
         for c in self.children[1:]:
@@ -547,7 +1091,8 @@ class Conditional(InputParameter):
         return self._whens.get(option)
 
 
-class When(InputParameter):
+class When(InputParameter, ParamRecords):
+    __slots__ = ()
     node_name = "when"
 
     def __init__(self, value):
@@ -559,6 +1104,7 @@ class When(InputParameter):
 
 
 class Param(InputParameter):
+    __slots__ = ()
     node_name = "param"
 
     # This...isn't really valid as-is, and shouldn't be used.
@@ -600,6 +1146,7 @@ class Param(InputParameter):
 
 
 class HiddenParam(Param):
+    __slots__ = ()
     type = "hidden"
 
     def __init__(self, name, value):
@@ -609,6 +1156,7 @@ class HiddenParam(Param):
 
 
 class HiddenDataParam(Param):
+    __slots__ = ()
     type = "hidden_data"
 
     def __init__(self, name, value):
@@ -618,6 +1166,7 @@ class HiddenDataParam(Param):
 
 
 class TextParam(Param):
+    __slots__ = ()
     type = "text"
 
     def __init__(
@@ -644,16 +1193,17 @@ class TextParam(Param):
 
     def command_line_actual(self, mako_path=None):
         # TODO same as parent class
-        try:
+        if self.command_line_override is not None:
             return self.command_line_override
-        except Exception:
-            if self.positional:
-                return self.mako_name(mako_path)
-            else:
-                return f"{self.flag()}{self.space_between_arg}'{self.mako_name()}'"
+        elif self.positional:
+            return self.mako_name(mako_path)
+        else:
+            return f"{self.flag()}{self.space_between_arg}'{self.mako_name()}'"
 
 
 class _NumericParam(Param):
+    __slots__ = ()
+
     def __init__(
         self,
         name=None,
@@ -671,14 +1221,17 @@ class _NumericParam(Param):
 
 
 class IntegerParam(_NumericParam):
+    __slots__ = ()
     type = "integer"
 
 
 class FloatParam(_NumericParam):
+    __slots__ = ()
     type = "float"
 
 
 class BooleanParam(Param):
+    __slots__ = ()
     type = "boolean"
 
     def __init__(
@@ -705,19 +1258,20 @@ class BooleanParam(Param):
             # Unfortunately, mako_identifier is set as a result of the super
             # call, which we shouldn't call TWICE, so we'll just hack around this :(
             # params['truevalue'] = '%s%s' % (self.)
-            self.node.attrib["truevalue"] = self.flag()
+            self.set_attribute("truevalue", self.flag())
 
         if falsevalue is None:
-            self.node.attrib["falsevalue"] = ""
+            self.set_attribute("falsevalue", "")
 
     def command_line_actual(self, mako_path=None):
-        if hasattr(self, "command_line_override"):
+        if self.command_line_override is not None:
             return self.command_line_override
         else:
             return "%s" % self.mako_name(mako_path)
 
 
 class DataParam(Param):
+    __slots__ = ()
     type = "data"
 
     def __init__(
@@ -736,6 +1290,7 @@ class DataParam(Param):
 
 
 class SelectParam(Param):
+    __slots__ = ()
     type = "select"
 
     def __init__(
@@ -776,7 +1331,21 @@ class SelectParam(Param):
         )
 
 
+# type of the param of a record -> class, see ParamRecords
+_RECORD_TYPES = {
+    "text": TextParam,
+    "data": DataParam,
+    "boolean": BooleanParam,
+    "integer": IntegerParam,
+    "float": FloatParam,
+    "select": SelectParam,
+    "hidden": HiddenParam,
+    "hidden_data": HiddenDataParam,
+}
+
+
 class SelectOption(InputParameter):
+    __slots__ = ()
     node_name = "option"
 
     def __init__(self, value, text, selected=False, **kwargs):
@@ -788,10 +1357,11 @@ class SelectOption(InputParameter):
         passed_kwargs["value"] = params["value"]
 
         super(SelectOption, self).__init__(None, **passed_kwargs)
-        self.node.text = str(text)
+        self.set_text(str(text))
 
 
 class Options(InputParameter):
+    __slots__ = ()
     node_name = "options"
 
     def __init__(
@@ -814,6 +1384,7 @@ class Options(InputParameter):
 
 
 class Column(InputParameter):
+    __slots__ = ()
     node_name = "column"
 
     def __init__(self, name, index, **kwargs):
@@ -822,6 +1393,7 @@ class Column(InputParameter):
 
 
 class Filter(InputParameter):
+    __slots__ = ()
     node_name = "filter"
 
     def __init__(
@@ -844,7 +1416,9 @@ class Filter(InputParameter):
 
 
 class ValidatorParam(XMLParam):
+    __slots__ = ()
     node_name = "validator"
+    cdata = True
 
     def __init__(
         self,
@@ -863,10 +1437,11 @@ class ValidatorParam(XMLParam):
         del params["text"]
         super(ValidatorParam, self).__init__(**params)
         if text:
-            self.node.text = etree.CDATA(str(text))
+            self.set_text(str(text))
 
 
 class Outputs(XMLParam):
+    __slots__ = ()
     node_name = "outputs"
 
     def acceptable_child(self, child):
@@ -881,7 +1456,15 @@ class Outputs(XMLParam):
 class OutputData(XMLParam):
     """Copypasta of InputParameter, needs work"""
 
+    __slots__ = (
+        "mako_identifier",
+        "num_dashes",
+        "space_between_arg",
+    )
+
     node_name = "data"
+    # command line to use instead of the generated one
+    command_line_override = None
 
     def __init__(
         self,
@@ -907,8 +1490,16 @@ class OutputData(XMLParam):
 
         super(OutputData, self).__init__(**params)
 
+    def _node_state(self):
+        return {
+            "mako_identifier": self._node.get("name"),
+            "num_dashes": 0,
+            "space_between_arg": " ",
+        }
+
+    @_memoize
     def command_line(self, mako_path=None):
-        if hasattr(self, "command_line_override"):
+        if self.command_line_override is not None:
             return self.command_line_override
         else:
             return "%s%s%s" % (
@@ -917,7 +1508,7 @@ class OutputData(XMLParam):
                 self.mako_name(mako_path),
             )
 
-    def mako_name(self):
+    def mako_name(self, mako_path=None):
         return "'$" + self.mako_identifier + "'"
 
     def flag(self):
@@ -934,19 +1525,21 @@ class OutputData(XMLParam):
 
 
 class OutputFilter(XMLParam):
+    __slots__ = ()
     node_name = "filter"
 
     def __init__(self, text, **kwargs):
         params = Util.clean_kwargs(locals().copy())
         del params["text"]
         super(OutputFilter, self).__init__(**params)
-        self.node.text = text
+        self.set_text(text)
 
     def acceptable_child(self, child):
         return False
 
 
 class ChangeFormat(XMLParam):
+    __slots__ = ()
     node_name = "change_format"
 
     def __init__(self, **kwargs):
@@ -958,6 +1551,7 @@ class ChangeFormat(XMLParam):
 
 
 class ChangeFormatWhen(XMLParam):
+    __slots__ = ()
     node_name = "when"
 
     def __init__(self, input, format, value, **kwargs):
@@ -969,6 +1563,7 @@ class ChangeFormatWhen(XMLParam):
 
 
 class OutputCollection(XMLParam):
+    __slots__ = ()
     node_name = "collection"
 
     def __init__(
@@ -1004,8 +1599,13 @@ class OutputCollection(XMLParam):
             lines.append(child.command_line())
         return "\n".join(lines)
 
+    def command_line(self, mako_path=None):
+        # collections are discovered by Galaxy, i.e. they have no command line
+        return None
+
 
 class DiscoverDatasets(XMLParam):
+    __slots__ = ()
     node_name = "discover_datasets"
 
     def __init__(
@@ -1016,6 +1616,7 @@ class DiscoverDatasets(XMLParam):
 
 
 class Tests(XMLParam):
+    __slots__ = ()
     node_name = "tests"
 
     def acceptable_child(self, child):
@@ -1023,6 +1624,7 @@ class Tests(XMLParam):
 
 
 class Test(XMLParam):
+    __slots__ = ()
     node_name = "test"
 
     def acceptable_child(self, child):
@@ -1036,6 +1638,7 @@ class Test(XMLParam):
 
 
 class TestParam(XMLParam):
+    __slots__ = ()
     node_name = "param"
 
     def __init__(self, name, value=None, ftype=None, dbkey=None, **kwargs):
@@ -1044,6 +1647,7 @@ class TestParam(XMLParam):
 
 
 class TestOutput(XMLParam):
+    __slots__ = ()
     node_name = "output"
 
     def __init__(
@@ -1065,6 +1669,7 @@ class TestOutput(XMLParam):
 
 
 class TestOCElement(XMLParam):
+    __slots__ = ()
     node_name = "element"
 
     def __init__(self, name=None, file=None, ftype=None, **kwargs):
@@ -1073,6 +1678,7 @@ class TestOCElement(XMLParam):
 
 
 class TestOutputCollection(XMLParam):
+    __slots__ = ()
     node_name = "output_collection"
 
     def __init__(
@@ -1106,6 +1712,7 @@ class TestOutputCollection(XMLParam):
 
 
 class TestRepeat(XMLParam):
+    __slots__ = ()
     node_name = "repeat"
 
     def __init__(
@@ -1143,6 +1750,7 @@ class TestRepeat(XMLParam):
 
 
 class Citations(XMLParam):
+    __slots__ = ()
     node_name = "citations"
 
     def acceptable_child(self, child):
@@ -1156,16 +1764,17 @@ class Citations(XMLParam):
         :type value: STRING
         """
         for citation in self.children:
-            if citation.node.attrib["type"] == type and citation.node.text == value:
+            if citation.attrib["type"] == type and citation.get_text() == value:
                 return True
         return False
 
 
 class Citation(XMLParam):
+    __slots__ = ()
     node_name = "citation"
 
     def __init__(self, type, value):
         passed_kwargs = {}
         passed_kwargs["type"] = type
         super(Citation, self).__init__(**passed_kwargs)
-        self.node.text = str(value)
+        self.set_text(str(value))
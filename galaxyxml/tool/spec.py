@@ -0,0 +1,427 @@
+"""
+Declarative tool specifications (JSON or YAML) compiled into builders.
+
+A specification is a mapping of the arguments of :class:`galaxyxml.tool.Tool`
+and the sections of the tool::
+
+    {
+        "name": "Sort", "id": "sort", "version": "1.0",
+        "description": "a file", "executable": "sort",
+        "help": "Sorts a file.",
+        "requirements": [{"type": "package", "value": "coreutils"}],
+        "inputs": [
+            {"type": "data", "name": "input", "format": "txt"},
+            {"type": "integer", "name": "key", "value": 1, "num_dashes": 1},
+            {"type": "section", "name": "adv", "title": "Advanced", "inputs": []},
+            {"type": "repeat", "name": "r", "title": "Repeat", "inputs": []},
+            {
+                "type": "conditional", "name": "mode",
+                "param": {"type": "select", "name": "sel",
+                          "options": {"a": "A", "b": "B"}, "default": "a"},
+                "whens": [{"value": "a", "inputs": []}],
+            },
+        ],
+        "outputs": [
+            {"type": "data", "name": "output", "format": "txt"},
+            {"type": "collection", "name": "split", "collection_type": "list"},
+        ],
+        "tests": [
+            {"params": [{"name": "input", "value": "1.txt"}],
+             "outputs": [{"name": "output", "file": "1.out"}]},
+        ],
+        "citations": [{"type": "doi", "value": "10.1000/1"}],
+    }
+
+The entries of inputs, outputs, tests, requirements and citations give the
+arguments of the corresponding classes of :mod:`galaxyxml.tool.parameters`.
+A value {"$var": "NAME"} is a variable whose value is given when a tool is
+built, e.g. from a row of an argument table. Variables can be used for the
+arguments of the tool and the attributes of the nodes, but not for names.
+An attribute whose variable has the value None is omitted.
+
+A specification is compiled once (the objects of the nodes are created with
+their constructors), the builder then creates the objects of each tool by
+copying their state, without going through the keyword argument handling of
+the constructors.
+"""
+import json
+import os
+from builtins import str
+
+import galaxyxml.tool as gxt
+import galaxyxml.tool.parameters as gxtp
+from galaxyxml import Util
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+# type of an input -> class
+_INPUT_TYPES = {
+    "text": gxtp.TextParam,
+    "data": gxtp.DataParam,
+    "boolean": gxtp.BooleanParam,
+    "integer": gxtp.IntegerParam,
+    "float": gxtp.FloatParam,
+    "select": gxtp.SelectParam,
+    "hidden": gxtp.HiddenParam,
+    "hidden_data": gxtp.HiddenDataParam,
+    "section": gxtp.Section,
+    "repeat": gxtp.Repeat,
+    "conditional": gxtp.Conditional,
+}
+
+# requirement types that are containers
+_CONTAINER_TYPES = ("docker", "singularity")
+
+# arguments of the Tool constructor
+_TOOL_ARGUMENTS = (
+    "name",
+    "id",
+    "version",
+    "description",
+    "executable",
+    "hidden",
+    "tool_type",
+    "URL_method",
+    "workflow_compatible",
+    "interpreter",
+    "version_command",
+    "command_override",
+    "macros",
+    "profile",
+)
+
+# slots of the nodes that are not copied from the prototype
+_STRUCTURE_SLOTS = (
+    "__dict__",
+    "_node",
+    "_attrib",
+    "children",
+    "parent",
+    "_revision",
+    "_rendered",
+)
+
+
+class _Variable(str):
+    """
+    Placeholder for a variable in the arguments of a node, strings are
+    passed through the constructors unchanged.
+    """
+
+    def __new__(cls, name):
+        self = super(_Variable, cls).__new__(cls, "{%s}" % name)
+        self.name = name
+        return self
+
+    def __getnewargs__(self):
+        return (self.name,)
+
+
+def _is_variable(value):
+    return isinstance(value, dict) and list(value) == ["$var"]
+
+
+def _placeholders(spec):
+    """
+    Get the arguments of a node spec with variables replaced by placeholders.
+    """
+    kwargs = {}
+    for key, value in spec.items():
+        if _is_variable(value):
+            value = _Variable(value["$var"])
+        kwargs[key] = value
+    return kwargs
+
+
+def _variables(spec):
+    return {value["$var"] for value in spec.values() if _is_variable(value)}
+
+
+class _Prototype(object):
+    """
+    The state of a node object and the prototypes of its children, from
+    which new objects of the node are created without running the
+    constructor.
+    """
+
+    __slots__ = ("cls", "state", "attrib", "variables", "text", "children")
+
+    def __init__(self, obj):
+        self.cls = type(obj)
+        state = {}
+        for cls in type(obj).__mro__:
+            for name in cls.__dict__.get("__slots__", ()):
+                if name in _STRUCTURE_SLOTS:
+                    continue
+                try:
+                    state[name] = object.__getattribute__(obj, name)
+                except AttributeError:
+                    pass
+        # additional attributes, e.g. command_line_override
+        state.update(vars(obj))
+        text = state.pop("_text")
+        self.state = tuple(state.items())
+        self.attrib = dict(obj.attrib)
+        # (attribute, variable) of the attributes given by variables
+        self.variables = tuple(
+            (key, value.name)
+            for key, value in self.attrib.items()
+            if isinstance(value, _Variable)
+        )
+        self.text = text
+        self.children = tuple(_Prototype(child) for child in obj.children)
+
+    def names(self):
+        """
+        Get the names of the variables used by the node and its descendants.
+        """
+        names = {name for key, name in self.variables}
+        if isinstance(self.text, _Variable):
+            names.add(self.text.name)
+        for child in self.children:
+            names |= child.names()
+        return names
+
+    def build(self, values, parent=None):
+        """
+        Create a new object of the node.
+
+        :param values: variable name -> value.
+        :type values: DICT
+        :param parent: object the new object is a child of.
+        """
+        obj = self.cls.__new__(self.cls)
+        for name, value in self.state:
+            object.__setattr__(obj, name, value)
+        attrib = dict(self.attrib)
+        for key, name in self.variables:
+            value = values[name]
+            if value is None:
+                del attrib[key]
+            else:
+                attrib[key] = Util.coerce_value(value)
+        object.__setattr__(obj, "_attrib", attrib)
+        text = self.text
+        if isinstance(text, _Variable):
+            text = values[text.name]
+            text = None if text is None else str(text)
+        object.__setattr__(obj, "_text", text)
+        object.__setattr__(obj, "parent", parent)
+        if self.children:
+            object.__setattr__(
+                obj, "children", [child.build(values, obj) for child in self.children]
+            )
+        return obj
+
+
+def _node(cls, spec):
+    """
+    Create the object of a node spec (with placeholders for the variables).
+    """
+    kwargs = _placeholders(spec)
+    for key in ("name", "argument"):
+        if isinstance(kwargs.get(key), _Variable) and issubclass(
+            cls, (gxtp.InputParameter, gxtp.OutputData)
+        ):
+            raise ValueError("The %s of a %s can not be a variable" % (key, cls))
+    obj = cls(**kwargs)
+    found = {
+        value.name for value in obj.attrib.values() if isinstance(value, _Variable)
+    }
+    if isinstance(obj.get_text(), _Variable):
+        found.add(obj.get_text().name)
+    unused = _variables(spec) - found
+    if unused:
+        raise ValueError(
+            "Variables %s can not be used for a %s" % (", ".join(sorted(unused)), cls)
+        )
+    return obj
+
+
+def _input(spec):
+    spec = dict(spec)
+    try:
+        cls = _INPUT_TYPES[spec.pop("type")]
+    except KeyError as e:
+        raise ValueError("Unknown input type %s" % e)
+    inputs = spec.pop("inputs", [])
+    validators = spec.pop("validators", [])
+    select = spec.pop("param", None)
+    whens = spec.pop("whens", [])
+    override = spec.pop("command_line_override", None)
+    if cls is gxtp.SelectParam:
+        options = spec.get("options")
+        if isinstance(options, list):
+            spec["options"] = dict(options)
+        if options is not None and any(
+            _is_variable(value) for value in spec["options"].values()
+        ):
+            raise ValueError("The options of a select can not be variables")
+    obj = _node(cls, spec)
+    if override is not None:
+        obj.command_line_override = override
+    for validator in validators:
+        obj.append(_node(gxtp.ValidatorParam, validator))
+    if select is not None:
+        obj.append(_input(select))
+    for when in whens:
+        when = dict(when)
+        when_inputs = when.pop("inputs", [])
+        when_obj = _node(gxtp.When, when)
+        for child in when_inputs:
+            when_obj.append(_input(child))
+        obj.append(when_obj)
+    for child in inputs:
+        obj.append(_input(child))
+    return obj
+
+
+def _output(spec):
+    spec = dict(spec)
+    kind = spec.pop("type", "data")
+    filters = spec.pop("filters", [])
+    discover_datasets = spec.pop("discover_datasets", [])
+    outputs = spec.pop("outputs", [])
+    override = spec.pop("command_line_override", None)
+    if kind == "data":
+        obj = _node(gxtp.OutputData, spec)
+    elif kind == "collection":
+        if "collection_type" in spec:
+            spec["type"] = spec.pop("collection_type")
+        obj = _node(gxtp.OutputCollection, spec)
+    else:
+        raise ValueError("Unknown output type %s" % kind)
+    if override is not None:
+        obj.command_line_override = override
+    for child in outputs:
+        obj.append(_output(child))
+    for text in filters:
+        obj.append(gxtp.OutputFilter(text))
+    for child in discover_datasets:
+        obj.append(_node(gxtp.DiscoverDatasets, child))
+    return obj
+
+
+def _test(spec):
+    test = gxtp.Test()
+    for param in spec.get("params", []):
+        test.append(_node(gxtp.TestParam, param))
+    for output in spec.get("outputs", []):
+        test.append(_node(gxtp.TestOutput, output))
+    for collection in spec.get("output_collections", []):
+        collection = dict(collection)
+        elements = collection.pop("elements", [])
+        obj = _node(gxtp.TestOutputCollection, collection)
+        for element in elements:
+            obj.append(_node(gxtp.TestOCElement, element))
+        test.append(obj)
+    return test
+
+
+def _requirement(spec):
+    if spec.get("type") in _CONTAINER_TYPES:
+        return _node(gxtp.Container, spec)
+    return _node(gxtp.Requirement, spec)
+
+
+# section -> (class, function creating the object of an entry)
+_SECTIONS = {
+    "requirements": (gxtp.Requirements, _requirement),
+    "inputs": (gxtp.Inputs, _input),
+    "outputs": (gxtp.Outputs, _output),
+    "tests": (gxtp.Tests, _test),
+    "citations": (gxtp.Citations, lambda spec: _node(gxtp.Citation, spec)),
+}
+
+
+class ToolBuilder(object):
+    """
+    Creates tools from a compiled specification, see :func:`compile_spec`.
+    """
+
+    def __init__(self, spec):
+        """
+        :param spec: the specification.
+        :type spec: DICT
+        """
+        unknown = set(spec) - set(_TOOL_ARGUMENTS) - set(_SECTIONS) - {"help"}
+        if unknown:
+            raise ValueError("Unknown keys %s" % ", ".join(sorted(unknown)))
+        self.tool_arguments = {
+            key: value for key, value in spec.items() if key in _TOOL_ARGUMENTS
+        }
+        self.help = spec.get("help")
+        self.sections = []
+        for name, (cls, load) in _SECTIONS.items():
+            if name in spec:
+                section = cls()
+                for entry in spec[name]:
+                    section.append(load(entry))
+                self.sections.append((name, _Prototype(section)))
+        self.variables = {
+            value["$var"]
+            for value in list(self.tool_arguments.values()) + [self.help]
+            if _is_variable(value)
+        }
+        for name, prototype in self.sections:
+            self.variables |= prototype.names()
+
+    def build(self, **values):
+        """
+        Create a tool.
+
+        :param values: the values of the variables.
+        :return: the tool.
+        :rtype: :class:`galaxyxml.tool.Tool`
+        """
+        missing = self.variables.difference(values)
+        if missing:
+            raise ValueError("Missing variables %s" % ", ".join(sorted(missing)))
+        kwargs = {
+            key: values[value["$var"]] if _is_variable(value) else value
+            for key, value in self.tool_arguments.items()
+        }
+        tool = gxt.Tool(**kwargs)
+        if self.help is not None:
+            tool.help = (
+                values[self.help["$var"]] if _is_variable(self.help) else self.help
+            )
+        for name, prototype in self.sections:
+            setattr(tool, name, prototype.build(values))
+        return tool
+
+    def __call__(self, **values):
+        return self.build(**values)
+
+
+def load_spec(path):
+    """
+    Read a specification from a JSON or (if PyYAML is installed) a YAML file.
+
+    :param path: path of the file, files ending with .yml or .yaml are read
+        as YAML.
+    :type path: STRING
+    :rtype: DICT
+    """
+    with open(path) as fh:
+        if os.path.splitext(path)[1] in (".yml", ".yaml"):
+            if yaml is None:
+                raise ImportError("PyYAML is required to read YAML specifications")
+            return yaml.safe_load(fh)
+        return json.load(fh)
+
+
+def compile_spec(spec):
+    """
+    Compile a specification into a builder creating the tools.
+
+    :param spec: the specification or the path of a file containing it.
+    :type spec: DICT or STRING
+    :rtype: :class:`ToolBuilder`
+    """
+    if isinstance(spec, str):
+        spec = load_spec(spec)
+    return ToolBuilder(spec)
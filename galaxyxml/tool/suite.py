@@ -0,0 +1,202 @@
+"""
+Extraction of the blocks shared by the tools of a suite into a macro file.
+
+Input blocks (sections, repeats, conditionals and select params) and the
+requirements and citations sections that are identical in several tools
+are moved into <xml> macros of a shared macro file and replaced by <expand>
+in the tools. Input blocks are expanded with :class:`ExpandIO`, i.e. their
+command line is written as a token of the macro file.
+"""
+import hashlib
+
+from lxml import etree
+
+import galaxyxml.tool as gxt
+import galaxyxml.tool.parameters as gxtp
+
+# classes of the input blocks that are extracted
+BLOCKS = (gxtp.Section, gxtp.Repeat, gxtp.Conditional, gxtp.SelectParam)
+# sections of the tool that are extracted as a whole
+SECTIONS = ("requirements", "citations")
+
+
+class _Occurrence(object):
+    """
+    An occurrence of a block (or section) in a tool.
+    """
+
+    __slots__ = ("key", "node", "parent", "tool", "size", "descendants", "covered")
+
+    def __init__(self, key, node, parent, tool):
+        self.key = key
+        self.node = node
+        # the parent object, for sections the name of the section
+        self.parent = parent
+        self.tool = tool
+        self.size = sum(1 for _ in node._element().iter())
+        # occurrences of blocks within the block
+        self.descendants = []
+        # whether the occurrence is within an extracted block
+        self.covered = False
+
+
+def _digest(element, digests):
+    """
+    Get the hash of the content of an element (tag, attributes, text and
+    the children), the hashes of the descendants are kept in digests.
+    """
+    digest = digests.get(element)
+    if digest is None:
+        if isinstance(element.tag, str):
+            data = repr((element.tag, list(element.attrib.items()), element.text))
+        else:
+            # comments, processing instructions
+            data = etree.tostring(element, with_tail=False).decode()
+        sha = hashlib.sha256(data.encode())
+        for child in element:
+            sha.update(_digest(child, digests))
+            sha.update(repr(child.tail).encode())
+        digest = sha.digest()
+        digests[element] = digest
+    return digest
+
+
+def _collect(node, tool, occurrences, digests, ancestors):
+    """
+    Collect the occurrences of the blocks in the descendants of node.
+    """
+    for index, child in enumerate(node.children):
+        # the select of a conditional is referred to by the conditional
+        if isinstance(child, BLOCKS) and not (
+            index == 0 and isinstance(node, gxtp.Conditional)
+        ):
+            key = (_digest(child._element(), digests), child.command_line())
+            occurrence = _Occurrence(key, child, node, tool)
+            for ancestor in ancestors:
+                ancestor.descendants.append(occurrence)
+            occurrences.append(occurrence)
+            _collect(child, tool, occurrences, digests, ancestors + [occurrence])
+        else:
+            _collect(child, tool, occurrences, digests, ancestors)
+
+
+def _macro_name(node, names):
+    """
+    Get an unused name for the macro of a block.
+    """
+    if isinstance(node, gxtp.SelectParam):
+        base = "select_%s" % node.mako_identifier
+    elif isinstance(node, gxtp.InputParameter):
+        base = "%s_%s" % (node.node_name, node.attrib.get("name"))
+    else:
+        base = node.node_name
+    name = base
+    i = 1
+    while name in names:
+        i += 1
+        name = "%s_%d" % (base, i)
+    names.add(name)
+    return name
+
+
+def _replace(parent, old, new):
+    """
+    Replace the child old of parent by new.
+    """
+    index = parent.children.index(old)
+    parent.children[index] = new
+    object.__setattr__(new, "parent", parent)
+    object.__setattr__(old, "parent", None)
+    new._update_mako_prefix()
+    if parent._node is not None:
+        parent._node.replace(old._element(), new._element())
+    parent.invalidate()
+
+
+def extract_macros(tools, macro_file="macros.xml", min_count=2):
+    """
+    Move the blocks that occur in several tools into shared macros.
+
+    The tools are modified in place: the blocks are replaced by <expand>
+    and the macro file is imported. Blocks are compared by their content
+    (XML and command line), larger blocks take precedence over the blocks
+    they contain.
+
+    The returned <macros> is written e.g. with::
+
+        with open("macros.xml", "wb") as fh:
+            fh.write(etree.tostring(macros.node, pretty_print=True))
+
+    :param tools: the tools of the suite.
+    :type tools: LIST of :class:`galaxyxml.tool.Tool`
+    :param macro_file: path of the macro file imported by the tools.
+    :type macro_file: STRING
+    :param min_count: minimal number of occurrences of an extracted block.
+    :type min_count: INTEGER
+    :return: the root of the macro file.
+    :rtype: :class:`galaxyxml.tool.parameters.Macros`
+    """
+    digests = {}
+    occurrences = []
+    for tool in tools:
+        if isinstance(tool, gxt.MacrosTool):
+            raise ValueError("Macros can not be extracted from a MacrosTool")
+        for name in SECTIONS:
+            section = tool._section(name)
+            if isinstance(section, gxtp.XMLParam) and not isinstance(
+                section, gxtp.Expand
+            ):
+                key = (_digest(section._element(), digests), None)
+                occurrences.append(_Occurrence(key, section, name, tool))
+        inputs = tool._section("inputs")
+        if inputs is not None:
+            _collect(inputs, tool, occurrences, digests, [])
+
+    by_key = {}
+    for occurrence in occurrences:
+        by_key.setdefault(occurrence.key, []).append(occurrence)
+    # the largest blocks are extracted first, the blocks they contain are
+    # then only extracted if they occur often enough elsewhere
+    extracted = []
+    for key in sorted(by_key, key=lambda key: -by_key[key][0].size):
+        live = [occurrence for occurrence in by_key[key] if not occurrence.covered]
+        if len(live) < min_count:
+            continue
+        extracted.append(live)
+        for occurrence in live:
+            for descendant in occurrence.descendants:
+                descendant.covered = True
+
+    macros = gxtp.Macros()
+    names = set()
+    # id -> tool, for the tools using the macros
+    tools_with_macros = {}
+    # macros in the order of the first occurrence
+    positions = {id(occurrence): i for i, occurrence in enumerate(occurrences)}
+    extracted.sort(key=lambda live: positions[id(live[0])])
+    for live in extracted:
+        block = live[0].node
+        name = _macro_name(block, names)
+        for occurrence in live:
+            if isinstance(occurrence.parent, str):
+                setattr(occurrence.tool, occurrence.parent, gxtp.Expand(name))
+            else:
+                _replace(occurrence.parent, occurrence.node, gxtp.ExpandIO(name))
+            tools_with_macros[id(occurrence.tool)] = occurrence.tool
+        command_line = live[0].key[1]
+        if command_line is not None:
+            macros.append(gxtp.Token("@%s@" % name.upper(), command_line))
+        macro = gxtp.Macro(name)
+        macro.append(block)
+        macros.append(macro)
+
+    for tool in tools_with_macros.values():
+        tool_macros = tool._section("macros")
+        if tool_macros is None:
+            tool.macros = tool_macros = gxtp.Macros()
+        if not any(
+            isinstance(child, gxtp.Import) and child.get_text() == macro_file
+            for child in tool_macros.children
+        ):
+            tool_macros.append(gxtp.Import(macro_file))
+    return macros
@@ -1,11 +1,16 @@
+import re
+
 from setuptools import setup
 
 with open("README.rst") as fh:
     readme = fh.read()
 
+with open("galaxyxml/__init__.py") as fh:
+    version = re.search(r'^__version__ = "(.*)"$', fh.read(), re.M).group(1)
+
 setup(
     name="galaxyxml",
-    version="0.5.5",
+    version=version,
     description="Galaxy XML generation library",
     author="Helena Rasche",
     author_email="hexylena@galaxians.org",
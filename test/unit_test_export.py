@@ -0,0 +1,403 @@
+"""
+Unit tests for the export of galaxyxml tools.
+"""
+
+import asyncio
+import functools
+import io
+import os
+import stat
+import tempfile
+import unittest
+from unittest import mock
+
+from lxml import etree
+
+import galaxyxml.tool as gxt
+import galaxyxml.tool.parameters as gxtp
+from galaxyxml.tool.import_xml import GalaxyXmlParser
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.tool = gxt.Tool(
+            "export",
+            "export_test",
+            "1.0",
+            "description",
+            "export.py",
+            version_command="export.py --version",
+        )
+        self.tool.requirements = gxtp.Requirements()
+        self.tool.requirements.append(gxtp.Requirement("package", "samtools"))
+        section = gxtp.Section("sec", "Section")
+        section.append(gxtp.IntegerParam("int", value=1, num_dashes=2))
+        self.tool.inputs.append(section)
+        self.tool.inputs.append(
+            gxtp.SelectParam("sel", options={"a": "A", "b": "B"}, num_dashes=2)
+        )
+        self.tool.outputs.append(gxtp.OutputData("out", format="txt", num_dashes=2))
+        self.tool.help = "help"
+
+
+class TestCopyFreeExport(TestExport):
+    def test_export_is_repeatable(self):
+        self.assertEqual(self.tool.export(), self.tool.export())
+
+    def test_export_leaves_tool_unchanged(self):
+        root_children = list(self.tool.root)
+        self.tool.export()
+        self.assertEqual(list(self.tool.root), root_children)
+        self.assertIsNone(self.tool.inputs.node.getparent())
+        self.assertIsNone(self.tool.requirements.node.getparent())
+        self.assertIsNone(self.tool.command.node.text)
+
+    def test_export_content(self):
+        exml = self.tool.export()
+        self.assertIn("<requirement", exml)
+        self.assertIn("--int $sec.int", exml)
+        self.assertTrue(exml.index("<command") < exml.index("<inputs>"))
+
+
+class TestExportTo(TestExport):
+    def test_export_to_file_object(self):
+        out = io.BytesIO()
+        self.tool.export_to(out)
+        self.assertEqual(out.getvalue().decode("utf-8"), self.tool.export())
+
+    def test_export_to_path(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "tool.xml")
+            self.tool.export_to(path)
+            with open(path) as fh:
+                self.assertEqual(fh.read(), self.tool.export())
+
+    def test_export_to_modes(self):
+        for kwargs in (
+            {"pretty_print": False},
+            {"xml_declaration": True},
+            {"xml_declaration": True, "pretty_print": False},
+        ):
+            out = io.BytesIO()
+            self.tool.export_to(out, **kwargs)
+            self.assertEqual(
+                out.getvalue(), self.tool.export(encoding="utf-8", **kwargs)
+            )
+
+
+class TestCachedExport(TestExport):
+    def test_nested_append_invalidates(self):
+        self.tool.export()
+        section = self.tool.inputs.children[0]
+        section.append(gxtp.FloatParam("flt", value=1.0, num_dashes=2))
+        exml = self.tool.export()
+        self.assertIn('name="flt"', exml)
+        self.assertIn("--flt $sec.flt", exml)
+
+    def test_section_replacement_invalidates(self):
+        self.tool.export()
+        self.tool.requirements = gxtp.Requirements()
+        self.tool.requirements.append(gxtp.Requirement("package", "bwa"))
+        exml = self.tool.export()
+        self.assertIn("bwa", exml)
+        self.assertNotIn("samtools", exml)
+
+    def test_unchanged_sections_are_reused(self):
+        self.tool.export()
+        requirements = self.tool._fragments[("requirements", "unicode", True)]
+        inputs = self.tool._fragments[("inputs", "unicode", True)]
+        self.tool.inputs.append(gxtp.TextParam("txt", num_dashes=2))
+        self.tool.export()
+        self.assertIs(
+            self.tool._fragments[("requirements", "unicode", True)], requirements
+        )
+        self.assertIsNot(self.tool._fragments[("inputs", "unicode", True)], inputs)
+
+    def test_node_modification(self):
+        # modifications of the element of a param are exported (also after
+        # the element was accessed before the previous export)
+        param = self.tool.inputs.children[0].children[0]
+        node = param.node
+        self.tool.export()
+        node.set("value", "5")
+        self.assertIn('value="5"', self.tool.export())
+        # also the command line, here of an expanded macro
+        expand = gxtp.ExpandIO("a")
+        self.tool.inputs.append(expand)
+        self.assertIn("@A@", self.tool.export())
+        expand.node.set("macro", "b")
+        self.assertIn("@B@", self.tool.export())
+
+    def test_adopted_node_modification(self):
+        tool = GalaxyXmlParser().import_string(self.tool.export(), adopt=True)
+        tool.export()
+        tool.requirements.node[0].text = "bwa"
+        self.assertIn(">bwa</requirement>", tool.export())
+
+    def test_macros_tool_fragments_are_reused(self):
+        tool = gxt.MacrosTool(
+            "macros", "macros", "1.0", "description", "macros.py", macros=["a.xml"]
+        )
+        tool.macros.append(gxtp.Import("b.xml"))
+        tool.export()
+        fragments = [
+            tool._fragments[(("macros", i), "unicode", True)] for i in range(2)
+        ]
+        self.assertIn("b.xml", fragments[1][1])
+        tool.inputs.append(gxtp.TextParam("txt"))
+        tool.export()
+        for i, fragment in enumerate(fragments):
+            self.assertIs(tool._fragments[(("macros", i), "unicode", True)], fragment)
+
+    def test_help_change(self):
+        self.tool.export()
+        self.tool.help = "new help"
+        self.assertIn("<![CDATA[new help]]>", self.tool.export())
+
+
+class TestSerializationModes(TestExport):
+    def test_bytes(self):
+        exml = self.tool.export(encoding="utf-8")
+        self.assertIsInstance(exml, bytes)
+        self.assertEqual(exml, self.tool.export().encode("utf-8"))
+
+    def test_compact(self):
+        exml = self.tool.export(pretty_print=False)
+        self.assertNotIn("\n  <", exml)
+        parser = etree.XMLParser(remove_blank_text=True, strip_cdata=False)
+        pretty = etree.fromstring(self.tool.export(encoding="utf-8"), parser)
+        self.assertEqual(exml, etree.tostring(pretty, encoding="unicode"))
+
+    def test_xml_declaration(self):
+        exml = self.tool.export(encoding="utf-8", xml_declaration=True)
+        self.assertTrue(exml.startswith(b"<?xml version='1.0' encoding='utf-8'?>\n"))
+        out = io.BytesIO()
+        self.tool.export_to(out, pretty_print=False, xml_declaration=True)
+        self.assertEqual(
+            out.getvalue(),
+            self.tool.export(
+                encoding="utf-8", pretty_print=False, xml_declaration=True
+            ),
+        )
+
+
+class TestSections(TestExport):
+    def test_section_order(self):
+        self.tool.edam_operations = gxtp.EdamOperations()
+        self.tool.edam_operations.append(gxtp.EdamOperation("operation_0004"))
+        self.tool.edam_topics = gxtp.EdamTopics()
+        self.tool.edam_topics.append(gxtp.EdamTopic("topic_0003"))
+        exml = self.tool.export()
+        tags = [
+            "<edam_topics>",
+            "<edam_operations>",
+            "<requirements>",
+            "<version_command>",
+            "<command>",
+            "<inputs>",
+            "<outputs>",
+            "<expand macro=",
+            "<help>",
+        ]
+        positions = [exml.index(tag) for tag in tags]
+        self.assertEqual(positions, sorted(positions))
+
+    def test_default_macros(self):
+        exml = self.tool.export()
+        self.assertIn('<expand macro="export_test_tests"/>', exml)
+        self.assertIn('<expand macro="citations"/>', exml)
+        self.assertNotIn('<expand macro="requirements"/>', exml)
+
+    def test_outputs_in_command(self):
+        self.assertIn("--out '$out'", self.tool.export())
+
+    def test_optional_sections(self):
+        self.tool.version_command = None
+        self.tool.help = None
+        exml = self.tool.export()
+        self.assertIn("<version_command/>", exml)
+        self.assertIn("<help/>", exml)
+
+    def test_errors_are_not_swallowed(self):
+        self.tool.outputs.append(gxtp.OutputData(None, format="txt"))
+        with self.assertRaises(TypeError):
+            self.tool.export()
+
+
+def make_tool(i):
+    tool = gxt.Tool("generated", "generated_%d" % i, "1.0", "description", "gen.py")
+    tool.inputs.append(gxtp.IntegerParam("int", value=i, num_dashes=2))
+    return tool
+
+
+def make_other_tool():
+    # a different tool with the id of make_tool(0)
+    tool = make_tool(0)
+    tool.help = "other"
+    return tool
+
+
+def make_broken_tool():
+    raise ValueError("broken spec")
+
+
+def default_mode():
+    umask = os.umask(0o022)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+class TestGenerateMany(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.specs = [functools.partial(make_tool, i) for i in range(5)]
+        self.specs.insert(2, make_broken_tool)
+
+    def check_results(self, results):
+        self.assertEqual(len(results), 6)
+        self.assertIsNone(results[2].path)
+        self.assertIn("ValueError: broken spec", results[2].error)
+        for i, result in enumerate(results[:2] + results[3:]):
+            self.assertIsNone(result.error)
+            self.assertGreater(result.time, 0)
+            self.assertEqual(
+                result.path, os.path.join(self.tmpdir.name, "generated_%d.xml" % i)
+            )
+            with open(result.path) as fh:
+                self.assertEqual(fh.read(), make_tool(i).export())
+            self.assertEqual(stat.S_IMODE(os.stat(result.path).st_mode), default_mode())
+        self.assertEqual(len(os.listdir(self.tmpdir.name)), 5)
+
+    def test_keeps_mode(self):
+        path = os.path.join(self.tmpdir.name, "generated_0.xml")
+        with open(path, "w") as fh:
+            fh.write("previous")
+        os.chmod(path, 0o640)
+        result = gxt.generate_many(self.specs[:1], self.tmpdir.name, workers=1)[0]
+        self.assertEqual(result.path, path)
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o640)
+
+    def test_generate_many(self):
+        self.check_results(gxt.generate_many(self.specs, self.tmpdir.name, workers=1))
+
+    def test_generate_many_parallel(self):
+        self.check_results(gxt.generate_many(self.specs, self.tmpdir.name, workers=2))
+
+    def test_duplicate_id(self):
+        for workers in (1, 2):
+            results = gxt.generate_many(
+                [functools.partial(make_tool, 0), make_other_tool],
+                self.tmpdir.name,
+                workers=workers,
+            )
+            self.assertIsNone(results[0].error)
+            self.assertIsNone(results[1].path)
+            self.assertIn("ValueError", results[1].error)
+            with open(results[0].path) as fh:
+                self.assertEqual(fh.read(), make_tool(0).export())
+            self.assertEqual(os.listdir(self.tmpdir.name), ["generated_0.xml"])
+
+    def test_failed_export_keeps_file(self):
+        path = os.path.join(self.tmpdir.name, "generated_0.xml")
+        with open(path, "w") as fh:
+            fh.write("previous")
+        tool = make_tool(0)
+        tool.outputs.append(gxtp.OutputData(None, format="txt"))
+        result = gxt.generate_many([lambda: tool], self.tmpdir.name, workers=1)[0]
+        self.assertIsNotNone(result.error)
+        with open(path) as fh:
+            self.assertEqual(fh.read(), "previous")
+        self.assertEqual(os.listdir(self.tmpdir.name), ["generated_0.xml"])
+
+
+class TestAsyncExport(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    async def test_aexport_to_path(self):
+        path = os.path.join(self.tmpdir.name, "tool.xml")
+        await make_tool(0).aexport_to(path)
+        with open(path) as fh:
+            self.assertEqual(fh.read(), make_tool(0).export())
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), default_mode())
+        os.chmod(path, 0o640)
+        await make_tool(1).aexport_to(path)
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o640)
+
+    async def test_aexport_to_file(self):
+        fh = io.BytesIO()
+        await make_tool(0).aexport_to(fh, pretty_print=False)
+        self.assertEqual(
+            fh.getvalue().decode(), make_tool(0).export(pretty_print=False)
+        )
+
+    async def test_aexport_to_closes_file(self):
+        path = os.path.join(self.tmpdir.name, "tool.xml")
+        fds = len(os.listdir("/proc/self/fd"))
+        with mock.patch("os.fdopen", side_effect=OSError("fdopen")):
+            with self.assertRaises(OSError):
+                await make_tool(0).aexport_to(path)
+        self.assertEqual(len(os.listdir("/proc/self/fd")), fds)
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+    async def test_export_stream(self):
+        tools = [make_tool(i) for i in range(6)]
+        tools[2].outputs.append(gxtp.OutputData(None, format="txt"))
+        results = [
+            result
+            async for result in gxt.export_stream(
+                tools, self.tmpdir.name, concurrency=2
+            )
+        ]
+        self.assertEqual(len(results), 6)
+        self.assertEqual(sum(result.error is not None for result in results), 1)
+        paths = sorted(result.path for result in results if result.error is None)
+        self.assertEqual(
+            paths,
+            [
+                os.path.join(self.tmpdir.name, "generated_%d.xml" % i)
+                for i in (0, 1, 3, 4, 5)
+            ],
+        )
+        with open(paths[-1]) as fh:
+            self.assertEqual(fh.read(), make_tool(5).export())
+        for path in paths:
+            self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), default_mode())
+
+    async def test_export_stream_duplicate_id(self):
+        tools = [make_tool(0), make_tool(1), make_tool(0)]
+        tools[2].help = "other"
+        results = [
+            result async for result in gxt.export_stream(tools, self.tmpdir.name)
+        ]
+        self.assertEqual(sum(result.error is not None for result in results), 1)
+        self.assertIn("duplicate tool id generated_0", results[0].error)
+        with open(os.path.join(self.tmpdir.name, "generated_0.xml")) as fh:
+            self.assertEqual(fh.read(), make_tool(0).export())
+
+    async def test_export_stream_backpressure(self):
+        produced = []
+
+        async def tools():
+            for i in range(10):
+                produced.append(i)
+                yield make_tool(i)
+                await asyncio.sleep(0)
+
+        consumed = 0
+        async for result in gxt.export_stream(tools(), self.tmpdir.name, concurrency=3):
+            consumed += 1
+            # at most concurrency tools are taken ahead of the consumer
+            self.assertLessEqual(len(produced) - consumed, 3)
+        self.assertEqual(consumed, 10)
+
+    async def test_export_stream_break(self):
+        stream = gxt.export_stream(
+            (make_tool(i) for i in range(10)), self.tmpdir.name, concurrency=2
+        )
+        async for result in stream:
+            break
+        await stream.aclose()
+        self.assertIsNone(result.error)
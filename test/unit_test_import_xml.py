@@ -2,9 +2,24 @@
 Unit tests for the import of existing Galaxy XML to galaxyxml.
 """
 
+import gc
+import io
+import mmap
+import os
+import pickle
+import shutil
+import tarfile
+import tempfile
 import unittest
+import warnings
+import xml.etree.ElementTree as ET
+import zipfile
 
-from galaxyxml.tool.import_xml import GalaxyXmlParser
+from lxml import etree
+
+from galaxyxml.tool.import_xml import GalaxyXmlParser, InputsParser
+from galaxyxml.tool.macros import clear_macro_cache, macro_cache_info
+from galaxyxml.tool.parameters import Inputs, IntegerParam
 
 
 class TestImport(unittest.TestCase):
@@ -231,3 +246,608 @@ class TestTestsParser(TestImport):
         self.assertEqual(element.attrib["name"], "elementary")
         self.assertEqual(element.attrib["file"], "efile")
         self.assertEqual(element.attrib["ftype"], "txt")
+
+
+class TestAdoptImport(unittest.TestCase):
+    def setUp(self):
+        gxp = GalaxyXmlParser()
+        self.tool = gxp.import_xml("test/import_xml.xml", adopt=True)
+
+
+# run the tests above also for the import adopting the parsed elements
+class TestAdoptStdios(TestAdoptImport, TestStdios):
+    pass
+
+
+class TestAdoptOverrides(TestAdoptImport, TestOverrides):
+    pass
+
+
+class TestAdoptCommand(TestAdoptImport, TestCommand):
+    pass
+
+
+class TestAdoptImportXml(TestAdoptImport, TestImportXml):
+    pass
+
+
+class TestAdoptInputsParser(TestAdoptImport, TestInputsParser):
+    pass
+
+
+class TestAdoptOutputsParser(TestAdoptImport, TestOutputsParser):
+    pass
+
+
+class TestAdoptTestsParser(TestAdoptImport, TestTestsParser):
+    pass
+
+
+class TestStreamImport(unittest.TestCase):
+    def setUp(self):
+        gxp = GalaxyXmlParser()
+        self.tool = gxp.import_xml("test/import_xml.xml", stream=True)
+
+
+# run the tests above also for the streaming import
+class TestStreamStdios(TestStreamImport, TestStdios):
+    pass
+
+
+class TestStreamOverrides(TestStreamImport, TestOverrides):
+    pass
+
+
+class TestStreamCommand(TestStreamImport, TestCommand):
+    pass
+
+
+class TestStreamImportXml(TestStreamImport, TestImportXml):
+    pass
+
+
+class TestStreamInputsParser(TestStreamImport, TestInputsParser):
+    pass
+
+
+class TestStreamOutputsParser(TestStreamImport, TestOutputsParser):
+    pass
+
+
+class TestStreamTestsParser(TestStreamImport, TestTestsParser):
+    pass
+
+
+class TestStream(TestStreamImport):
+    def test_same_as_import(self):
+        tool = GalaxyXmlParser().import_xml("test/import_xml.xml")
+        self.assertEqual(self.tool.export(), tool.export())
+        self.assertEqual(self.tool.version_command, "v_command")
+
+    def test_not_with_adopt(self):
+        with self.assertRaises(ValueError):
+            GalaxyXmlParser().import_xml("test/import_xml.xml", adopt=True, stream=True)
+
+
+class TestAdopt(TestAdoptImport):
+    def test_elements_are_adopted(self):
+        inputs = self.tool.inputs
+        self.assertIs(inputs.children[0].node.getparent(), inputs.node)
+        # the sections stay in the parsed tree
+        self.assertEqual(inputs.node.getparent().tag, "tool")
+
+    def test_cli(self):
+        tool = GalaxyXmlParser().import_xml("test/import_xml.xml")
+        self.assertEqual(self.tool.inputs.cli(), tool.inputs.cli())
+
+    def test_attributes_are_kept(self):
+        self.assertEqual(self.tool.inputs.children[8].attrib["size"], "30")
+        self.assertIn('size="30"', self.tool.export())
+
+    def test_append(self):
+        section = self.tool.inputs.children[6]
+        section.append(IntegerParam("added", value=1))
+        self.assertIn("added $adv.added", self.tool.inputs.cli())
+        self.assertIn('name="added"', self.tool.export())
+
+
+class TestHandlerRegistry(unittest.TestCase):
+    def test_register_handler(self):
+        class CustomParser(GalaxyXmlParser):
+            pass
+
+        def load_help(parser, tool, help_root):
+            tool.help = help_root.text.upper()
+
+        CustomParser.register_handler("tool", "help", load_help)
+        tool = CustomParser().import_xml("test/import_xml.xml")
+        self.assertEqual(tool.help, "HELP")
+        # the base class is not affected
+        tool = GalaxyXmlParser().import_xml("test/import_xml.xml")
+        self.assertEqual(tool.help, "help")
+
+    def test_handler_errors_surface(self):
+        class BrokenParser(InputsParser):
+            pass
+
+        def load_broken(parser, root, param_root):
+            root.not_a_method()
+
+        BrokenParser.register_handler("param", "text", load_broken)
+        inputs_root = ET.parse("test/import_xml.xml").getroot().find("inputs")
+        with self.assertRaises(AttributeError):
+            BrokenParser().load_inputs(Inputs(), inputs_root)
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.tmpdir, "sub"))
+        shutil.copy("test/import_xml.xml", os.path.join(self.tmpdir, "b.xml"))
+        shutil.copy("test/import_xml.xml", os.path.join(self.tmpdir, "sub", "a.xml"))
+        with open(os.path.join(self.tmpdir, "macros.xml"), "w") as fh:
+            fh.write("<macros><token name='@TOKEN@'>1</token></macros>")
+        with open(os.path.join(self.tmpdir, "a.xml"), "w") as fh:
+            fh.write("<tool")
+        with open(os.path.join(self.tmpdir, "readme.txt"), "w") as fh:
+            fh.write("not an XML")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def check_results(self, results):
+        paths = [os.path.relpath(result.path, self.tmpdir) for result in results]
+        self.assertEqual(paths, ["a.xml", "b.xml", os.path.join("sub", "a.xml")])
+        self.assertIsNone(results[0].tool)
+        self.assertIn("ParseError", results[0].error)
+        for result in results[1:]:
+            self.assertIsNone(result.error)
+            self.assertEqual(result.tool.root.attrib["id"], "import_test")
+            self.assertIn("--bool", result.tool.export())
+
+    def test_import_directory(self):
+        gxp = GalaxyXmlParser()
+        self.check_results(list(gxp.import_directory(self.tmpdir, workers=1)))
+
+    def test_import_directory_stop_early(self):
+        for i in range(20):
+            shutil.copy("test/import_xml.xml", os.path.join(self.tmpdir, "c%d.xml" % i))
+        results = GalaxyXmlParser().import_directory(self.tmpdir, workers=2)
+        self.assertEqual(os.path.basename(next(results).path), "a.xml")
+        results.close()
+
+    def test_import_directory_closes_files(self):
+        gxp = GalaxyXmlParser()
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always", ResourceWarning)
+            self.check_results(list(gxp.import_directory(self.tmpdir, workers=1)))
+            gc.collect()
+        self.assertEqual(
+            [w for w in caught if issubclass(w.category, ResourceWarning)], []
+        )
+
+    def test_import_directory_parallel(self):
+        gxp = GalaxyXmlParser()
+        results = list(gxp.import_directory(self.tmpdir, workers=2, adopt=True))
+        self.check_results(results)
+        inputs = results[1].tool.inputs
+        self.assertIs(inputs.children[0].node.getparent(), inputs.node)
+
+
+class TestPickle(TestAdoptImport):
+    def test_pickle(self):
+        exml = self.tool.export()
+        tool = pickle.loads(pickle.dumps(self.tool))
+        self.assertEqual(tool.export(), exml)
+        self.assertEqual(tool.inputs.cli(), self.tool.inputs.cli())
+        section = tool.inputs.children[6]
+        self.assertIs(section.node.getparent(), tool.inputs.node)
+        self.assertIs(section.children[0].node.getparent(), section.node)
+
+    def test_pickle_child_first(self):
+        section, inputs = pickle.loads(
+            pickle.dumps([self.tool.inputs.children[6], self.tool.inputs])
+        )
+        self.assertIs(section.parent, inputs)
+        self.assertIs(section.node.getparent(), inputs.node)
+        self.assertIs(section.children[0].node.getparent(), section.node)
+
+
+class TestExpandMacros(unittest.TestCase):
+    def setUp(self):
+        clear_macro_cache()
+
+    def test_token_in_cdata(self):
+        xml = """<tool id="t" name="T" version="1">
+  <macros><token name="@BIN@">bin &lt;1&gt;</token></macros>
+  <command><![CDATA[@BIN@ --a '$a' > out]]></command>
+  <configfiles>
+    <configfile name="c"><![CDATA[@BIN@ <x>]]></configfile>
+  </configfiles>
+  <help>@BIN@</help>
+</tool>"""
+        tool = GalaxyXmlParser().import_string(xml, adopt=True, expand=True)
+        exml = tool.export(keep_old_command=True)
+        self.assertIn("<![CDATA[bin <1> --a '$a' > out]]>", exml)
+        self.assertIn('<configfile name="c"><![CDATA[bin <1> <x>]]></configfile>', exml)
+
+    def check_tool(self, tool):
+        self.assertEqual(tool.root.attrib["version"], "2.1+galaxy3")
+        self.assertEqual(tool.root.find("description").text, "does foo 2.1")
+        self.assertFalse(hasattr(tool, "macros"))
+        requirements = tool.requirements.node
+        self.assertEqual(requirements[0].attrib["version"], "2.1")
+        self.assertEqual(requirements[1].text, "bar")
+        self.assertEqual(tool.inputs.children[0].node.attrib["value"], "5")
+        section = tool.inputs.children[1]
+        names = [child.node.attrib["name"] for child in section.children]
+        self.assertEqual(names, ["t", "inner", "b"])
+        self.assertEqual(section.children[1].node.attrib["value"], "1")
+        self.assertEqual(tool.citations.node[0].text, "10.1/foo")
+
+    def test_expand(self):
+        gxp = GalaxyXmlParser()
+        self.check_tool(gxp.import_xml("test/import_xml_macros.xml", expand=True))
+
+    def test_expand_stream(self):
+        gxp = GalaxyXmlParser()
+        self.check_tool(
+            gxp.import_xml("test/import_xml_macros.xml", expand=True, stream=True)
+        )
+
+    def test_expand_adopt(self):
+        gxp = GalaxyXmlParser()
+        self.check_tool(
+            gxp.import_xml("test/import_xml_macros.xml", expand=True, adopt=True)
+        )
+
+    def test_macro_file_is_cached(self):
+        gxp = GalaxyXmlParser()
+        for _ in range(3):
+            gxp.import_xml("test/import_xml_macros.xml", expand=True)
+        info = macro_cache_info()
+        self.assertEqual((info.misses, info.hits), (1, 2))
+
+    def test_modified_macro_file_is_parsed_again(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        shutil.copy("test/import_xml_macros.xml", os.path.join(tmpdir, "tool.xml"))
+        macros_path = os.path.join(tmpdir, "import_macros.xml")
+        shutil.copy("test/import_macros.xml", macros_path)
+        gxp = GalaxyXmlParser()
+        gxp.import_xml(os.path.join(tmpdir, "tool.xml"), expand=True)
+        with open(macros_path) as fh:
+            content = fh.read()
+        with open(macros_path, "w") as fh:
+            fh.write(content.replace(">2.1<", ">2.2<"))
+        stat = os.stat(macros_path)
+        os.utime(macros_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        tool = gxp.import_xml(os.path.join(tmpdir, "tool.xml"), expand=True)
+        self.assertEqual(tool.root.attrib["version"], "2.2+galaxy3")
+        self.assertEqual(macro_cache_info().misses, 2)
+
+    def test_without_macros(self):
+        gxp = GalaxyXmlParser()
+        tool = gxp.import_xml("test/import_xml.xml", expand=True)
+        self.assertEqual(tool.export(), gxp.import_xml("test/import_xml.xml").export())
+
+
+class CountingParser(GalaxyXmlParser):
+    imports = 0
+
+    def _import_xml(self, *args):
+        CountingParser.imports += 1
+        return super()._import_xml(*args)
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.cache_dir = os.path.join(self.tmpdir, "cache")
+        for name in ("import_xml_macros.xml", "import_macros.xml"):
+            shutil.copy(os.path.join("test", name), self.tmpdir)
+        self.tool_path = os.path.join(self.tmpdir, "import_xml_macros.xml")
+        CountingParser.imports = 0
+
+    def import_xml(self, **kwargs):
+        return CountingParser(cache_dir=self.cache_dir).import_xml(
+            self.tool_path, **kwargs
+        )
+
+    def test_cached(self):
+        imported = self.import_xml(expand=True)
+        tool = self.import_xml(expand=True)
+        self.assertEqual(CountingParser.imports, 1)
+        self.assertEqual(tool.inputs.cli(), imported.inputs.cli())
+        self.assertEqual(tool.export(), imported.export())
+
+    def test_options_are_part_of_the_key(self):
+        self.import_xml(expand=True)
+        self.import_xml(expand=True, stream=True)
+        self.import_xml(expand=True, adopt=True)
+        self.assertEqual(CountingParser.imports, 2)
+
+    def test_modified_macro_file(self):
+        self.import_xml(expand=True)
+        with open(os.path.join(self.tmpdir, "import_macros.xml"), "a") as fh:
+            fh.write("\n")
+        self.import_xml(expand=True)
+        self.assertEqual(CountingParser.imports, 2)
+
+    def rewrite_import(self, markup):
+        with open(self.tool_path) as fh:
+            xml = fh.read()
+        with open(self.tool_path, "w") as fh:
+            fh.write(xml.replace("<import>import_macros.xml</import>", markup))
+        with open(os.path.join(self.tmpdir, "other_macros.xml"), "w") as fh:
+            fh.write("<macros/>")
+
+    def modify_macro_file(self, name):
+        with open(os.path.join(self.tmpdir, name), "a") as fh:
+            fh.write("\n")
+
+    def test_import_markup(self):
+        # imports are read like in the import, commented-out ones are ignored
+        self.rewrite_import(
+            "<import><![CDATA[import_macros.xml]]></import>"
+            "<!-- <import>other_macros.xml</import> -->"
+        )
+        self.import_xml()
+        self.modify_macro_file("other_macros.xml")
+        self.import_xml()
+        self.assertEqual(CountingParser.imports, 1)
+        self.modify_macro_file("import_macros.xml")
+        self.import_xml()
+        self.assertEqual(CountingParser.imports, 2)
+
+    def test_file_object(self):
+        # the file object is read again for the import after hashing it
+        for _ in range(2):
+            with open(self.tool_path, "rb") as fh:
+                tool = CountingParser(cache_dir=self.cache_dir).import_xml(fh)
+        self.assertEqual(CountingParser.imports, 1)
+        self.assertEqual(tool.export(), self.import_xml().export())
+
+    def test_lazy_is_not_stored(self):
+        tool = self.import_xml(lazy=True)
+        self.assertNotIn("inputs", vars(tool))
+        self.assertEqual(os.listdir(self.cache_dir), [])
+        self.import_xml()
+        tool = self.import_xml(lazy=True)
+        self.assertEqual(CountingParser.imports, 2)
+        self.assertIn("inputs", vars(tool))
+
+    def test_unpicklable_tool(self):
+        class Parser(CountingParser):
+            def _import_xml(self, *args):
+                tool = super()._import_xml(*args)
+                tool.custom = lambda: None
+                return tool
+
+        with self.assertLogs("galaxyxml.tool.import_xml", "WARNING"):
+            tool = Parser(cache_dir=self.cache_dir).import_xml(self.tool_path)
+        self.assertEqual(tool.root.attrib["id"], "foo")
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_broken_cache_file(self):
+        self.import_xml()
+        for name in os.listdir(self.cache_dir):
+            with open(os.path.join(self.cache_dir, name), "wb") as fh:
+                fh.write(b"broken")
+        tool = self.import_xml()
+        self.assertEqual(CountingParser.imports, 2)
+        self.assertEqual(tool.root.attrib["id"], "foo")
+
+
+class TestLazy(unittest.TestCase):
+    def check_lazy(self, **kwargs):
+        gxp = GalaxyXmlParser()
+        tool = gxp.import_xml("test/import_xml.xml", lazy=True, **kwargs)
+        for name in ("inputs", "outputs", "tests"):
+            self.assertNotIn(name, vars(tool))
+        self.assertEqual(tool.root.attrib["id"], "import_test")
+        self.assertEqual(tool.requirements.node[0].text, "magic_package")
+        self.assertEqual(
+            tool.export(), gxp.import_xml("test/import_xml.xml", **kwargs).export()
+        )
+        return tool
+
+    def test_lazy(self):
+        tool = self.check_lazy()
+        self.assertEqual(tool.inputs.children[0].node.attrib["name"], "interval_file")
+
+    def test_lazy_adopt(self):
+        self.check_lazy(adopt=True)
+
+    def test_load_on_access(self):
+        tool = GalaxyXmlParser().import_xml("test/import_xml.xml", lazy=True)
+        inputs = tool.inputs
+        self.assertIn("inputs", vars(tool))
+        self.assertIs(tool.inputs, inputs)
+        self.assertNotIn("outputs", vars(tool))
+
+    def test_assign_before_access(self):
+        tool = GalaxyXmlParser().import_xml("test/import_xml.xml", lazy=True)
+        inputs = Inputs()
+        tool.inputs = inputs
+        tool.export()
+        self.assertIs(tool.inputs, inputs)
+
+    def test_pickle(self):
+        gxp = GalaxyXmlParser()
+        tool = pickle.loads(
+            pickle.dumps(gxp.import_xml("test/import_xml.xml", lazy=True))
+        )
+        self.assertEqual(tool.export(), gxp.import_xml("test/import_xml.xml").export())
+
+    def test_assign_and_pickle(self):
+        gxp = GalaxyXmlParser()
+        tool = gxp.import_xml("test/import_xml.xml", lazy=True)
+        tool.inputs = Inputs()
+        tool.inputs.append(IntegerParam("num", value=1))
+        self.assertNotIn("inputs", tool._lazy_sections)
+        exml = pickle.loads(pickle.dumps(tool)).export()
+        self.assertEqual(exml, tool.export())
+        self.assertIn('<param name="num" type="integer" value="1"', exml)
+
+    def test_lazy_stream(self):
+        with self.assertRaises(ValueError):
+            GalaxyXmlParser().import_xml("test/import_xml.xml", lazy=True, stream=True)
+
+
+class TestSources(unittest.TestCase):
+    def setUp(self):
+        self.gxp = GalaxyXmlParser()
+        self.exml = self.gxp.import_xml("test/import_xml.xml").export()
+        with open("test/import_xml.xml", "rb") as fh:
+            self.content = fh.read()
+
+    def test_bytes(self):
+        self.assertEqual(self.gxp.import_string(self.content).export(), self.exml)
+
+    def test_str(self):
+        tool = self.gxp.import_string(self.content.decode(), adopt=True)
+        self.assertEqual(tool.root.attrib["id"], "import_test")
+
+    def test_mmap(self):
+        with open("test/import_xml.xml", "rb") as fh:
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                tool = self.gxp.import_string(mm, stream=True)
+        self.assertEqual(tool.export(), self.exml)
+
+    def test_file_object(self):
+        with open("test/import_xml_macros.xml", "rb") as fh:
+            tool = self.gxp.import_xml(fh, expand=True)
+        self.assertEqual(tool.root.attrib["version"], "2.1+galaxy3")
+
+    def check_archive(self, archive):
+        results = list(self.gxp.import_archive(archive))
+        self.assertEqual([r.path for r in results], ["tools/a.xml", "tools/b.xml"])
+        self.assertIsNone(results[0].tool)
+        self.assertIn("ParseError", results[0].error)
+        self.assertEqual(results[1].tool.export(), self.exml)
+
+    def test_tar(self):
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode="w:gz") as tf:
+            for name, content in (
+                ("tools/a.xml", b"<tool"),
+                ("tools/b.xml", self.content),
+                ("tools/macros.xml", b"<macros/>"),
+            ):
+                info = tarfile.TarInfo(name)
+                info.size = len(content)
+                tf.addfile(info, io.BytesIO(content))
+        archive.seek(0)
+        self.check_archive(archive)
+
+    def test_zip(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("tools/a.xml", b"<tool")
+            zf.writestr("tools/b.xml", self.content)
+            zf.writestr("tools/readme.txt", b"")
+        self.check_archive(archive)
+
+
+class TestFields(unittest.TestCase):
+    def test_fields(self):
+        tool = GalaxyXmlParser().import_xml(
+            "test/import_xml.xml", fields={"requirements", "edam_topics"}
+        )
+        self.assertEqual(tool.root.attrib["id"], "import_test")
+        self.assertEqual(tool.requirements.node[0].text, "magic_package")
+        self.assertEqual(tool.edam_topics.node[0].text, "topic_0003")
+        self.assertEqual(len(tool.inputs.children), 0)
+        self.assertFalse(hasattr(tool, "tests"))
+        self.assertIn("<command><![CDATA[]]></command>", tool.export())
+
+    def test_closes_file(self):
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always", ResourceWarning)
+            GalaxyXmlParser().import_xml("test/import_xml.xml", fields={"macros"})
+            gc.collect()
+        self.assertEqual(
+            [w for w in caught if issubclass(w.category, ResourceWarning)], []
+        )
+
+    def test_stops_parsing(self):
+        xml = (
+            b'<tool id="a" name="A" version="1"><requirements>'
+            b'<requirement type="package">a</requirement></requirements>'
+            b"<inputs><not well formed</tool>"
+        )
+        tool = GalaxyXmlParser().import_string(xml, fields={"requirements"})
+        self.assertEqual(tool.requirements.node[0].text, "a")
+
+    def test_fields_adopt(self):
+        with self.assertRaises(ValueError):
+            GalaxyXmlParser().import_xml(
+                "test/import_xml.xml", adopt=True, fields={"requirements"}
+            )
+
+
+class TestPassThrough(unittest.TestCase):
+    def setUp(self):
+        gxp = GalaxyXmlParser()
+        self.tool = gxp.import_xml("test/import_xml_unknown.xml")
+
+    def test_unknown_tags_are_kept(self):
+        exml = self.tool.export()
+        for markup in (
+            '<code file="code.py"/>',
+            '<resource type="cores_min">2</resource>',
+            '<valid initial="string.letters"/>',
+            '<param name="color" type="color" value="#ff0000" label="Color"/>',
+            '<validator type="empty_field"/>',
+            '<action type="metadata" name="dbkey" default="hg19"/>',
+            '<has_text text="foo"/>',
+            "<assert_stdout>",
+        ):
+            self.assertIn(markup, exml)
+        self.assertEqual(self.tool.macros.node[0].text, "macros.xml")
+
+    def test_modify(self):
+        self.tool.inputs.append(IntegerParam("num", value=1))
+        exml = self.tool.export()
+        self.assertIn('<validator type="empty_field"/>', exml)
+        self.assertIn('<param name="num" type="integer" value="1"', exml)
+
+    def test_stream(self):
+        gxp = GalaxyXmlParser()
+        tool = gxp.import_xml("test/import_xml_unknown.xml", stream=True)
+        self.assertEqual(tool.export(), self.tool.export())
+
+    def test_pickle(self):
+        tool = pickle.loads(pickle.dumps(self.tool))
+        self.assertEqual(tool.export(), self.tool.export())
+
+    def test_order(self):
+        xml = """<tool id="order" name="Order" version="1.0">
+  <description>description</description>
+  <requirements><requirement type="package">a</requirement></requirements>
+  <code file="code.py"/>
+  <version_command>a --version</version_command>
+  <command>a</command>
+  <environment_variables>
+    <environment_variable name="A">1</environment_variable>
+  </environment_variables>
+  <inputs/>
+  <outputs/>
+  <custom/>
+  <tests/>
+  <help>help</help>
+  <citations/>
+</tool>"""
+        tags = [child.tag for child in etree.fromstring(xml)]
+        for kwargs in ({}, {"stream": True}, {"adopt": True}, {"lazy": True}):
+            tool = GalaxyXmlParser().import_string(xml, **kwargs)
+            exml = tool.export()
+            self.assertEqual([child.tag for child in etree.fromstring(exml)], tags)
+            self.assertIn('<environment_variable name="A">1</', exml)
+            # extras added to a tool are placed by Galaxy's tag order
+            tool.append_extra(etree.Element("xrefs"))
+            exml = tool.export()
+            self.assertEqual(
+                [child.tag for child in etree.fromstring(exml)][:3],
+                ["description", "xrefs", "requirements"],
+            )
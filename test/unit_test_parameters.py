@@ -0,0 +1,219 @@
+"""
+Unit tests for the parameters of galaxyxml.
+"""
+
+import copy
+import tracemalloc
+import unittest
+
+from lxml import etree
+
+import galaxyxml.tool.parameters as gxtp
+
+
+class TestParameters(unittest.TestCase):
+    def setUp(self):
+        self.inputs = gxtp.Inputs()
+        self.section = gxtp.Section("sec", "Section")
+        self.section.append(gxtp.IntegerParam("int", value=1, num_dashes=2))
+        self.inputs.append(self.section)
+        self.conditional = gxtp.Conditional("cond")
+        self.conditional.append(gxtp.SelectParam("sel", options={"a": "A", "b": "B"}))
+        self.when = gxtp.When("a")
+        self.when.append(gxtp.TextParam("txt", num_dashes=2))
+        self.conditional.append(self.when)
+        self.inputs.append(self.conditional)
+
+
+class TestMemoizedCli(TestParameters):
+    def test_cli(self):
+        self.assertEqual(
+            self.inputs.cli(),
+            "--int $sec.int\n"
+            '#if str($cond.sel) == "a"\n'
+            "--txt '$cond.txt'\n"
+            "#end if",
+        )
+
+    def test_cli_is_cached(self):
+        cli = self.inputs.cli()
+        self.assertIs(self.inputs.cli(), cli)
+
+    def test_append_invalidates(self):
+        self.inputs.cli()
+        self.section.append(gxtp.FloatParam("flt", value=1.0, num_dashes=2))
+        self.assertIn("--flt $sec.flt", self.inputs.cli())
+
+    def test_attribute_change_invalidates(self):
+        self.inputs.cli()
+        self.section.children[0].command_line_override = "--override"
+        self.assertIn("--override", self.inputs.cli())
+
+    def test_ancestor_change_invalidates(self):
+        param = self.section.children[0]
+        self.assertEqual(param.command_line(), "--int $sec.int")
+        self.section.mako_identifier = "other"
+        self.assertEqual(param.command_line(), "--int $other.int")
+
+    def test_reparent_invalidates(self):
+        param = gxtp.IntegerParam("moved", value=1, num_dashes=2)
+        self.assertEqual(param.command_line(), "--moved $moved")
+        self.section.append(param)
+        self.assertEqual(param.command_line(), "--moved $sec.moved")
+
+
+class TestMakoPath(TestParameters):
+    def test_mako_name(self):
+        self.assertEqual(self.section.children[0].mako_name(), "$sec.int")
+        self.assertEqual(self.when.children[0].mako_name(), "$cond.txt")
+        self.assertEqual(self.when.children[0].mako_name("other"), "$other.txt")
+
+    def test_reparent_subtree(self):
+        repeat = gxtp.Repeat("rep", "Repeat")
+        inner = gxtp.Section("inner", "Inner")
+        inner.append(gxtp.IntegerParam("deep", value=1))
+        repeat.append(inner)
+        self.assertEqual(inner.children[0].mako_name(), "$i_rep.inner.deep")
+        self.section.append(repeat)
+        self.assertEqual(inner.children[0].mako_name(), "$sec.i_rep.inner.deep")
+        self.assertEqual(
+            repeat.command_line().split("\n")[0], "#for $i_rep in $sec.rep"
+        )
+
+
+class TestSlots(TestParameters):
+    def test_node_attributes(self):
+        param = self.section.children[0]
+        self.assertEqual(param.name, "int")
+        self.assertEqual(param.value, "1")
+        self.assertIsNone(param.command_line_override)
+        with self.assertRaises(AttributeError):
+            param.not_an_attribute
+
+    def test_leaf_children(self):
+        param = gxtp.IntegerParam("int", value=1)
+        self.assertEqual(len(param.children), 0)
+        param.append(gxtp.ValidatorParam("in_range", min=0))
+        self.assertEqual(len(param.children), 1)
+
+    def test_custom_attribute(self):
+        param = gxtp.IntegerParam("int", value=1)
+        param.custom = "custom"
+        self.assertEqual(param.custom, "custom")
+
+    def test_memory(self):
+        # Python 3.11: about 480 bytes per IntegerParam (with the dict of
+        # its attributes and their strings), see benchmarks/param_memory.py
+        gxtp.IntegerParam("int", value=1)
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            params = [
+                gxtp.IntegerParam("int_%d" % i, value=i, label="label", help="help")
+                for i in range(1000)
+            ]
+            size = tracemalloc.get_traced_memory()[0] - before
+        finally:
+            tracemalloc.stop()
+        self.assertLess(size / len(params), 550)
+        self.assertIsNone(params[0]._node)
+
+    def test_deepcopy(self):
+        section = copy.deepcopy(self.section)
+        self.assertEqual(section.cli(), self.section.cli())
+        self.assertIs(section.children[0].parent, section)
+
+
+class TestLazyNode(TestParameters):
+    def test_element_is_created_on_access(self):
+        param = gxtp.IntegerParam("int", value=1, label="label")
+        self.assertIsNone(param._node)
+        self.assertEqual(param.label, "label")
+        self.assertEqual(param.attrib["value"], "1")
+        self.assertEqual(param.node.attrib["label"], "label")
+        self.assertIsNotNone(param._node)
+
+    def test_children_are_created_with_parent(self):
+        node = self.inputs.node
+        self.assertEqual(node[0].tag, "section")
+        self.assertEqual(node[0][0].attrib["name"], "int")
+        self.assertEqual(node[1][1].tag, "when")
+        self.assertIs(node[0], self.section.node)
+
+    def test_append_to_created_element(self):
+        self.inputs.node
+        self.section.append(gxtp.FloatParam("flt", value=1.0))
+        self.assertEqual(self.section.node[1].attrib["name"], "flt")
+
+    def test_text(self):
+        configfile = gxtp.Configfile("config", "Hello <> World")
+        self.assertEqual(configfile.get_text(), "Hello <> World")
+        self.assertIn(b"<![CDATA[Hello <> World]]>", etree.tostring(configfile.node))
+        configfile.set_text("Bye")
+        self.assertEqual(configfile.get_text(), "Bye")
+        self.assertIn(b"<![CDATA[Bye]]>", etree.tostring(configfile.node))
+
+
+RECORDS = [
+    {"type": "integer", "name": "int_a", "value": 1, "num_dashes": 2, "min": 0},
+    {"type": "integer", "name": "int_b", "value": 2, "num_dashes": 2, "min": 1},
+    {"type": "float", "name": None, "argument": "--float-a", "value": 0.5},
+    {"type": "float", "name": None, "argument": "--float-b", "value": 1.5},
+    {"type": "text", "name": "txt_a", "label": "Text", "positional": True},
+    {"type": "text", "name": "txt_b", "label": "Text", "positional": True},
+    {"type": "text", "name": "txt_c", "require_non_empty": True},
+    {"type": "text", "name": "txt_d", "require_non_empty": False},
+    {"type": "boolean", "name": "bool_a", "num_dashes": 1},
+    {"type": "boolean", "name": "bool_b", "num_dashes": 1},
+    {"type": "select", "name": "sel_a", "options": {"a": "A", "b": "B"}},
+    {"type": "select", "name": "sel_b", "options": {"c": "C"}, "default": "c"},
+    {"type": "data", "name": "data_a", "format": "txt", "multiple": True},
+    {"type": "data", "name": "data_b", "format": "bam", "multiple": False},
+    {"type": "hidden", "name": "hidden", "value": "x"},
+]
+
+
+class TestRecords(TestParameters):
+    def append_records(self, node, records):
+        for record in records:
+            kwargs = {key: value for key, value in record.items() if value is not None}
+            cls = gxtp._RECORD_TYPES[kwargs.pop("type")]
+            node.append(cls(**kwargs))
+
+    def test_same_as_append(self):
+        expected = copy.deepcopy(self.inputs)
+        for node in (self.inputs, self.section, self.when):
+            node.extend_from_records(RECORDS)
+        for node in (expected, expected.children[0], expected.children[1].children[1]):
+            self.append_records(node, RECORDS)
+        self.assertEqual(self.inputs.cli(), expected.cli())
+        self.assertEqual(
+            etree.tostring(self.inputs.node), etree.tostring(expected.node)
+        )
+
+    def test_repeat(self):
+        repeat = gxtp.Repeat("rep", "Repeat")
+        repeat.extend_from_records(RECORDS[:2])
+        self.assertEqual(repeat.children[1].mako_name(), "$i_rep.int_b")
+        self.assertIs(repeat.children[1].parent, repeat)
+
+    def test_select_options(self):
+        self.section.extend_from_records(RECORDS[10:12])
+        options = self.section.children[2].children
+        self.assertEqual(options[0].attrib, {"selected": "true", "value": "c"})
+        self.assertEqual(options[0].get_text(), "C")
+        self.assertEqual(options[0]._mako_prefix, ("sec", "sel_b"))
+
+    def test_invalidates(self):
+        cli = self.inputs.cli()
+        self.section.extend_from_records(RECORDS[:2])
+        self.assertNotEqual(self.inputs.cli(), cli)
+
+    def test_created_element(self):
+        self.inputs.node
+        self.section.extend_from_records(RECORDS[:2])
+        self.assertEqual(self.section.node[2].attrib["name"], "int_b")
+
+    def test_unknown_type(self):
+        with self.assertRaises(ValueError):
+            self.inputs.extend_from_records([{"type": "color", "name": "c"}])
@@ -0,0 +1,216 @@
+"""
+Unit tests for building galaxyxml tools from specifications.
+"""
+
+import json
+import os
+import pickle
+import tempfile
+import unittest
+
+import galaxyxml.tool as gxt
+import galaxyxml.tool.parameters as gxtp
+from galaxyxml.tool.spec import compile_spec, load_spec
+
+SPEC = {
+    "name": "spec",
+    "id": {"$var": "id"},
+    "version": "1.0",
+    "description": "description",
+    "executable": "spec.py",
+    "version_command": "spec.py --version",
+    "help": "help",
+    "requirements": [
+        {"type": "package", "value": "samtools", "version": "1.0"},
+        {"type": "docker", "value": "image"},
+    ],
+    "inputs": [
+        {"type": "data", "name": "input", "format": "txt", "label": {"$var": "label"}},
+        {"type": "integer", "name": "int", "value": 1, "min": 0, "num_dashes": 2},
+        {"type": "text", "name": "text", "require_non_empty": True},
+        {
+            "type": "section",
+            "name": "sec",
+            "title": "Section",
+            "inputs": [{"type": "boolean", "name": "flag", "num_dashes": 1}],
+        },
+        {
+            "type": "repeat",
+            "name": "rep",
+            "title": "Repeat",
+            "inputs": [{"type": "float", "name": "float", "value": 0.5}],
+        },
+        {
+            "type": "conditional",
+            "name": "cond",
+            "param": {
+                "type": "select",
+                "name": "sel",
+                "options": [["a", "A"], ["b", "B"]],
+                "default": "b",
+            },
+            "whens": [
+                {"value": "a"},
+                {
+                    "value": "b",
+                    "inputs": [
+                        {"type": "integer", "name": "n", "value": {"$var": "n"}}
+                    ],
+                },
+            ],
+        },
+    ],
+    "outputs": [
+        {"name": "out", "format": "txt", "num_dashes": 2, "filters": ["n > 0"]},
+        {
+            "type": "collection",
+            "name": "split",
+            "collection_type": "list",
+            "discover_datasets": [{"pattern": "__name__"}],
+        },
+    ],
+    "tests": [
+        {
+            "params": [{"name": "int", "value": 2}],
+            "outputs": [{"name": "out", "file": {"$var": "expected"}}],
+        }
+    ],
+    "citations": [{"type": "doi", "value": "10.1000/1"}],
+}
+
+
+def make_tool(id, label, n, expected):
+    """
+    Build the tool of SPEC with the constructors.
+    """
+    tool = gxt.Tool(
+        "spec",
+        id,
+        "1.0",
+        "description",
+        "spec.py",
+        version_command="spec.py --version",
+    )
+    tool.help = "help"
+    tool.requirements = gxtp.Requirements()
+    tool.requirements.append(gxtp.Requirement("package", "samtools", version="1.0"))
+    tool.requirements.append(gxtp.Container("docker", "image"))
+    tool.inputs.append(gxtp.DataParam("input", format="txt", label=label))
+    tool.inputs.append(gxtp.IntegerParam("int", value=1, min=0, num_dashes=2))
+    tool.inputs.append(gxtp.TextParam("text", require_non_empty=True))
+    section = gxtp.Section("sec", "Section")
+    section.append(gxtp.BooleanParam("flag", num_dashes=1))
+    tool.inputs.append(section)
+    repeat = gxtp.Repeat("rep", "Repeat")
+    repeat.append(gxtp.FloatParam("float", value=0.5))
+    tool.inputs.append(repeat)
+    conditional = gxtp.Conditional("cond")
+    conditional.append(
+        gxtp.SelectParam("sel", options={"a": "A", "b": "B"}, default="b")
+    )
+    conditional.append(gxtp.When("a"))
+    when = gxtp.When("b")
+    when.append(gxtp.IntegerParam("n", value=n))
+    conditional.append(when)
+    tool.inputs.append(conditional)
+    output = gxtp.OutputData("out", format="txt", num_dashes=2)
+    output.append(gxtp.OutputFilter("n > 0"))
+    tool.outputs.append(output)
+    collection = gxtp.OutputCollection("split", type="list")
+    collection.append(gxtp.DiscoverDatasets("__name__"))
+    tool.outputs.append(collection)
+    tool.tests = gxtp.Tests()
+    test = gxtp.Test()
+    test.append(gxtp.TestParam("int", value=2))
+    test.append(gxtp.TestOutput(name="out", file=expected))
+    tool.tests.append(test)
+    tool.citations = gxtp.Citations()
+    tool.citations.append(gxtp.Citation("doi", "10.1000/1"))
+    return tool
+
+
+class TestSpec(unittest.TestCase):
+    def setUp(self):
+        self.builder = compile_spec(SPEC)
+        self.values = {"id": "spec_1", "label": "Input", "n": 3, "expected": "1.txt"}
+
+    def test_variables(self):
+        self.assertEqual(self.builder.variables, {"id", "label", "n", "expected"})
+
+    def test_build(self):
+        tool = self.builder.build(**self.values)
+        self.assertEqual(tool.export(), make_tool(**self.values).export())
+
+    def test_build_many(self):
+        # the tools built from one builder are independent
+        first = self.builder.build(**self.values)
+        values = {"id": "spec_2", "label": "Other", "n": 4, "expected": "2.txt"}
+        second = self.builder.build(**values)
+        self.assertEqual(second.export(), make_tool(**values).export())
+        self.assertEqual(first.export(), make_tool(**self.values).export())
+        self.assertIsNot(first.inputs.children[0], second.inputs.children[0])
+
+    def test_none_value(self):
+        tool = self.builder.build(**dict(self.values, label=None))
+        self.assertNotIn("label", tool.inputs.children[0].attrib)
+
+    def test_modify_built_tool(self):
+        tool = self.builder.build(**self.values)
+        tool.inputs.append(gxtp.IntegerParam("other", value=1))
+        conditional = tool.inputs.children[5]
+        self.assertEqual(conditional.children[2].children[0].mako_name(), "$cond.n")
+        self.assertIn("other", tool.export())
+        # the prototype is not changed
+        tool = self.builder.build(**self.values)
+        self.assertNotIn("other", tool.export())
+
+    def test_command_line_override(self):
+        spec = dict(
+            SPEC,
+            inputs=[{"type": "integer", "name": "i", "command_line_override": "-i $i"}],
+        )
+        tool = compile_spec(spec).build(**self.values)
+        self.assertEqual(tool.inputs.cli(), "-i $i")
+
+    def test_missing_variable(self):
+        with self.assertRaises(ValueError):
+            self.builder.build(id="spec_1")
+
+    def test_name_variable(self):
+        spec = dict(SPEC, inputs=[{"type": "integer", "name": {"$var": "name"}}])
+        with self.assertRaises(ValueError):
+            compile_spec(spec)
+
+    def test_unknown_type(self):
+        spec = dict(SPEC, inputs=[{"type": "color", "name": "c"}])
+        with self.assertRaises(ValueError):
+            compile_spec(spec)
+
+    def test_unknown_key(self):
+        with self.assertRaises(ValueError):
+            compile_spec(dict(SPEC, stdio=[]))
+
+    def test_pickle(self):
+        builder = pickle.loads(pickle.dumps(self.builder))
+        tool = builder.build(**self.values)
+        self.assertEqual(tool.export(), make_tool(**self.values).export())
+
+    def test_load_json(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "spec.json")
+            with open(path, "w") as fh:
+                json.dump(SPEC, fh)
+            self.assertEqual(load_spec(path), SPEC)
+            tool = compile_spec(path).build(**self.values)
+        self.assertEqual(tool.export(), make_tool(**self.values).export())
+
+    def test_load_yaml(self):
+        try:
+            import yaml
+        except ImportError:
+            self.skipTest("PyYAML is not installed")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "spec.yml")
+            with open(path, "w") as fh:
+                yaml.safe_dump(SPEC, fh)
+            self.assertEqual(load_spec(path), SPEC)
@@ -0,0 +1,126 @@
+"""
+Unit tests for the extraction of shared macros from the tools of a suite.
+"""
+
+import os
+import tempfile
+import unittest
+
+from lxml import etree
+
+import galaxyxml.tool as gxt
+import galaxyxml.tool.parameters as gxtp
+from galaxyxml.tool.macros import MACRO_PARSER, expand_macros
+from galaxyxml.tool.suite import extract_macros
+
+
+def make_tool(i):
+    tool = gxt.Tool("suite %d" % i, "suite_%d" % i, "1.0", "description", "suite.py")
+    tool.requirements = gxtp.Requirements()
+    tool.requirements.append(gxtp.Requirement("package", "samtools", version="1.9"))
+    tool.citations = gxtp.Citations()
+    tool.citations.append(gxtp.Citation("doi", "10.1000/%d" % (i % 2)))
+    tool.tests = gxtp.Tests()
+    tool.inputs.append(gxtp.DataParam("input", format="txt"))
+    section = gxtp.Section("adv", "Advanced")
+    section.append(gxtp.IntegerParam("k", value=1, num_dashes=2))
+    section.append(gxtp.SelectParam("fmt", options={"a": "A", "b": "B"}))
+    tool.inputs.append(section)
+    conditional = gxtp.Conditional("mode")
+    conditional.append(gxtp.SelectParam("m", options={"x": "X", "y": "Y"}))
+    when = gxtp.When("x")
+    when.append(gxtp.SelectParam("fmt", options={"a": "A", "b": "B"}))
+    conditional.append(when)
+    conditional.append(gxtp.When("y"))
+    tool.inputs.append(conditional)
+    tool.inputs.append(gxtp.IntegerParam("own_%d" % i, value=i))
+    tool.outputs.append(gxtp.OutputData("out", format="txt"))
+    return tool
+
+
+def canonical(xml):
+    return etree.tostring(
+        etree.fromstring(xml, etree.XMLParser(remove_blank_text=True))
+    )
+
+
+class TestExtractMacros(unittest.TestCase):
+    def setUp(self):
+        self.tools = [make_tool(i) for i in range(4)]
+        self.exports = [tool.export() for tool in self.tools]
+
+    def test_macros(self):
+        macros = extract_macros(self.tools)
+        names = [child.attrib["name"] for child in macros.children]
+        self.assertEqual(
+            names,
+            [
+                "requirements",
+                "citations",
+                "@SECTION_ADV@",
+                "section_adv",
+                "@CONDITIONAL_MODE@",
+                "conditional_mode",
+                "citations_2",
+            ],
+        )
+        self.assertEqual(macros.children[2].get_text(), "--k $adv.k\nfmt $adv.fmt")
+
+    def test_tools(self):
+        extract_macros(self.tools)
+        for tool in self.tools:
+            self.assertEqual(
+                [child.get_text() for child in tool.macros.children], ["macros.xml"]
+            )
+            self.assertEqual(
+                [child.attrib.get("macro") for child in tool.inputs.children],
+                [None, "section_adv", "conditional_mode", None],
+            )
+            self.assertIn("@SECTION_ADV@\n@CONDITIONAL_MODE@", tool.export())
+        self.assertLess(
+            sum(len(tool.export()) for tool in self.tools),
+            sum(len(xml) for xml in self.exports) / 2,
+        )
+
+    def test_expanded_tools_are_unchanged(self):
+        macros = extract_macros(self.tools)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with open(os.path.join(tmpdir, "macros.xml"), "wb") as fh:
+                fh.write(etree.tostring(macros.node, pretty_print=True))
+            for tool, xml in zip(self.tools, self.exports):
+                root = etree.fromstring(tool.export().encode(), MACRO_PARSER)
+                expand_macros(root, tmpdir)
+                self.assertEqual(canonical(etree.tostring(root)), canonical(xml))
+
+    def test_contained_blocks(self):
+        # a block occurring often enough elsewhere is extracted too
+        tool = make_tool(4)
+        tool.inputs.append(gxtp.SelectParam("fmt", options={"a": "A", "b": "B"}))
+        other = make_tool(5)
+        other.inputs.append(gxtp.SelectParam("fmt", options={"a": "A", "b": "B"}))
+        macros = extract_macros(self.tools + [tool, other])
+        self.assertIn("select_fmt", [child.attrib["name"] for child in macros.children])
+        self.assertEqual(tool.inputs.children[-1].attrib["macro"], "select_fmt")
+        self.assertEqual(len(macros.children[3].children), 1)
+
+    def test_min_count(self):
+        macros = extract_macros(self.tools, min_count=5)
+        self.assertEqual(macros.children, ())
+        self.assertFalse(hasattr(self.tools[0], "macros"))
+        self.assertEqual(self.tools[0].export(), self.exports[0])
+
+    def test_existing_import(self):
+        tool = gxt.Tool(
+            "suite", "suite", "1.0", "description", "suite.py", macros=["macros.xml"]
+        )
+        tool.inputs.append(gxtp.SelectParam("sel", options={"a": "A"}))
+        other = gxt.Tool("other", "other", "1.0", "description", "other.py")
+        other.inputs.append(gxtp.SelectParam("sel", options={"a": "A"}))
+        extract_macros([tool, other])
+        self.assertEqual(len(tool.macros.children), 1)
+        self.assertEqual(len(other.macros.children), 1)
+
+    def test_macros_tool(self):
+        tool = gxt.MacrosTool("suite", "suite", "1.0", "description", "suite.py")
+        with self.assertRaises(ValueError):
+            extract_macros([tool])